@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from bson import ObjectId
+
+from database import get_collection, Collections
+import models
+
+# Activity types that count as a real contact with the lead
+CONTACT_ACTIVITY_TYPES = [
+    models.ActivityType.CALL.value,
+    models.ActivityType.EMAIL.value,
+    models.ActivityType.MEETING.value,
+]
+
+
+def is_contact_activity(activity_type) -> bool:
+    """Check whether an activity type counts as contacting the lead"""
+    if hasattr(activity_type, "value"):
+        activity_type = activity_type.value
+    return activity_type in CONTACT_ACTIVITY_TYPES
+
+
+async def record_first_contact(lead_id: ObjectId, activity_id: ObjectId, contacted_at: datetime) -> bool:
+    """Stamp the lead's first contact if it has not been contacted yet.
+
+    The update is conditional on `first_contact_at` being absent, so only the
+    earliest contact activity ever wins, even with concurrent writers.
+    """
+    collection = get_collection(Collections.MAIN_DATA)
+    result = await collection.update_one(
+        {"_id": lead_id, "first_contact_at": {"$exists": False}},
+        {"$set": {
+            "first_contact_at": contacted_at,
+            "first_contact_activity_id": activity_id
+        }}
+    )
+    return result.modified_count > 0
+
+
+def status_value(status) -> Optional[str]:
+    """Normalize a LeadStatus enum or raw string to its stored value"""
+    if status is None:
+        return None
+    if hasattr(status, "value"):
+        return status.value
+    try:
+        return models.LeadStatus(status).value
+    except ValueError:
+        return str(status)
+
+
+def build_status_change_activity(
+    lead_id: ObjectId,
+    user_id: Optional[ObjectId],
+    from_status,
+    to_status,
+    assigned_agent_id: Optional[ObjectId] = None
+) -> dict:
+    """Build a status change activity with structured transition fields"""
+    from_value = status_value(from_status)
+    to_value = status_value(to_status)
+    return {
+        "lead_id": lead_id,
+        "user_id": user_id,
+        "assigned_agent_id": assigned_agent_id,
+        "activity_type": models.ActivityType.STATUS_CHANGE.value,
+        "title": "Status Changed",
+        "description": f"Status changed from {from_value} to {to_value}",
+        "from_status": from_value,
+        "to_status": to_value,
+        "created_at": datetime.now(timezone.utc)
+    }
+
+
+async def restamp_lead_activities(lead_ids: List[ObjectId], agent_id: Optional[ObjectId]) -> int:
+    """Re-stamp the owning agent on every activity of the given leads.
+
+    Activities carry a denormalized `assigned_agent_id` so agent-scoped
+    analytics can filter on it directly; this keeps it in sync after a
+    (re)assignment with a single multi-document update.
+    """
+    if not lead_ids:
+        return 0
+    activities_collection = get_collection(Collections.ACTIVITIES)
+    result = await activities_collection.update_many(
+        {"lead_id": {"$in": lead_ids}, "assigned_agent_id": {"$ne": agent_id}},
+        {"$set": {"assigned_agent_id": agent_id}}
+    )
+    return result.modified_count
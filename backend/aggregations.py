@@ -0,0 +1,65 @@
+from typing import Dict, Any, Iterable, Optional
+
+
+def status_equals(status: str) -> dict:
+    """Aggregation expression that is true when a lead has the given status"""
+    return {"$eq": ["$status", status]}
+
+
+async def group_by_dimension(
+    collection,
+    match: dict,
+    dimension: str,
+    buckets: Optional[Iterable[str]] = None,
+    counts: Optional[Dict[str, dict]] = None,
+    sums: Optional[Dict[str, str]] = None,
+    averages: Optional[Dict[str, str]] = None
+) -> Dict[Any, Dict[str, Any]]:
+    """Group documents by one field and compute every metric in a single pass.
+
+    Args:
+        collection: Motor collection to aggregate.
+        match: Filter applied before grouping.
+        dimension: Field name to group on (e.g. "status", "source").
+        buckets: Known bucket values; missing ones are returned zero-filled.
+        counts: Name -> aggregation expression, counted where it is true.
+        sums: Name -> field to sum.
+        averages: Name -> field to average (None when no numeric values).
+
+    Returns:
+        Mapping of bucket value to its metrics; every bucket has a `total`.
+    """
+    counts = counts or {}
+    sums = sums or {}
+    averages = averages or {}
+
+    group = {"_id": f"${dimension}", "total": {"$sum": 1}}
+    for name, condition in counts.items():
+        group[name] = {"$sum": {"$cond": [condition, 1, 0]}}
+    for name, field in sums.items():
+        group[name] = {"$sum": f"${field}"}
+    for name, field in averages.items():
+        group[name] = {"$avg": f"${field}"}
+
+    pipeline = [
+        {"$match": match},
+        {"$group": group}
+    ]
+
+    results = {}
+    async for doc in collection.aggregate(pipeline):
+        key = doc.pop("_id")
+        results[key] = doc
+
+    empty = {"total": 0, **{name: 0 for name in counts}, **{name: 0 for name in sums}}
+    empty.update({name: None for name in averages})
+    for bucket in buckets or []:
+        if bucket not in results:
+            results[bucket] = dict(empty)
+
+    return results
+
+
+def grand_total(groups: Dict[Any, Dict[str, Any]]) -> int:
+    """Total document count across every group, including unknown buckets"""
+    return sum(group["total"] for group in groups.values())
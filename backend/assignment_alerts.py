@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from bson import ObjectId
+from decouple import config
+
+from database import get_collection, Collections
+from email_utils import send_agent_new_lead_alert, send_agent_assignment_summary
+
+logger = logging.getLogger(__name__)
+
+# Seconds an agent's alerts are coalesced before one summary email goes out
+ASSIGNMENT_ALERT_WINDOW = config('ASSIGNMENT_ALERT_WINDOW', default=300, cast=int)
+
+# Lead details held across all agents; beyond this alerts are only counted
+# and the oldest windows are flushed early
+ASSIGNMENT_ALERT_MAX_PENDING = config('ASSIGNMENT_ALERT_MAX_PENDING', default=10000, cast=int)
+
+# Leads listed in one summary email (the total is always reported)
+ASSIGNMENT_ALERT_MAX_LISTED = 50
+
+# SMTP connections opened at once while flushing
+ASSIGNMENT_ALERT_MAX_CONCURRENT_SENDS = 4
+
+# How often the flusher wakes up to look for expired windows
+FLUSH_POLL_SECONDS = 5
+
+LINE_LABELS = {
+    "personal_lines": "Personal Lines",
+    "commercial_lines": "Commercial Lines",
+    "life_and_health": "Life & Health",
+}
+
+# Lead fields an alert needs; add these to projections on bulk paths
+ALERT_LEAD_FIELDS = ["first_name", "last_name", "email", *LINE_LABELS]
+
+
+class AssignmentAlertBuffer:
+    """Per-agent coalescing buffer for "new lead assigned" emails.
+
+    `emit()` is synchronous and O(1), so request handlers and bulk jobs can
+    call it for every lead they assign. A background flusher sends one
+    summary per agent once that agent's window (opened by its first pending
+    alert) expires.
+    """
+
+    def __init__(self):
+        self._pending: Dict[ObjectId, dict] = {}
+        self._pending_details = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {
+            "alerts_emitted": 0,
+            "alerts_truncated": 0,
+            "emails_sent": 0,
+            "emails_failed": 0,
+            "early_flushes": 0,
+        }
+
+    def emit(self, agent_id: Optional[ObjectId], lead: dict):
+        """Queue an alert that `lead` was assigned to `agent_id`"""
+        if not agent_id:
+            return
+        self.counters["alerts_emitted"] += 1
+        entry = self._pending.get(agent_id)
+        if entry is None:
+            entry = self._pending[agent_id] = {"opened_at": time.monotonic(), "total": 0, "leads": []}
+        entry["total"] += 1
+
+        # Backpressure: keep counting, but stop holding details past the cap
+        if len(entry["leads"]) >= ASSIGNMENT_ALERT_MAX_LISTED or self._pending_details >= ASSIGNMENT_ALERT_MAX_PENDING:
+            self.counters["alerts_truncated"] += 1
+        else:
+            entry["leads"].append({
+                "name": f"{lead.get('first_name', '')} {lead.get('last_name', '')}".strip(),
+                "email": lead.get("email", ""),
+                "interests": [label for field, label in LINE_LABELS.items() if lead.get(field)]
+            })
+            self._pending_details += 1
+
+        if self._pending_details >= ASSIGNMENT_ALERT_MAX_PENDING:
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "pending_agents": len(self._pending),
+            "pending_alerts": sum(entry["total"] for entry in self._pending.values()),
+            "window_seconds": ASSIGNMENT_ALERT_WINDOW
+        }
+
+    def _take_due(self, flush_all: bool = False) -> Dict[ObjectId, dict]:
+        now = time.monotonic()
+        if flush_all:
+            due = list(self._pending)
+        else:
+            due = [agent_id for agent_id, entry in self._pending.items() if now - entry["opened_at"] >= ASSIGNMENT_ALERT_WINDOW]
+            # Over the cap: flush the oldest windows until back under half of it
+            if self._pending_details >= ASSIGNMENT_ALERT_MAX_PENDING:
+                self.counters["early_flushes"] += 1
+                remaining = self._pending_details - sum(len(self._pending[agent_id]["leads"]) for agent_id in due)
+                for agent_id, entry in sorted(self._pending.items(), key=lambda item: item[1]["opened_at"]):
+                    if remaining < ASSIGNMENT_ALERT_MAX_PENDING // 2:
+                        break
+                    if agent_id not in due:
+                        due.append(agent_id)
+                        remaining -= len(entry["leads"])
+        taken = {agent_id: self._pending.pop(agent_id) for agent_id in due}
+        self._pending_details -= sum(len(entry["leads"]) for entry in taken.values())
+        return taken
+
+    async def flush(self, flush_all: bool = False):
+        """Send one email per agent whose window has expired"""
+        taken = self._take_due(flush_all)
+        if not taken:
+            return
+
+        users_collection = get_collection(Collections.USERS)
+        agents = await users_collection.find(
+            {"_id": {"$in": list(taken)}, "is_active": True},
+            {"email": 1, "full_name": 1}
+        ).to_list(length=None)
+
+        semaphore = asyncio.Semaphore(ASSIGNMENT_ALERT_MAX_CONCURRENT_SENDS)
+
+        async def send(agent):
+            entry = taken[agent["_id"]]
+            async with semaphore:
+                if entry["total"] == 1 and entry["leads"]:
+                    lead = entry["leads"][0]
+                    ok = await asyncio.to_thread(send_agent_new_lead_alert, agent["email"], lead["name"], lead["email"], lead["interests"])
+                else:
+                    ok = await asyncio.to_thread(
+                        send_agent_assignment_summary, agent["email"], agent.get("full_name", "there"), entry["leads"], entry["total"]
+                    )
+            self.counters["emails_sent" if ok else "emails_failed"] += 1
+
+        await asyncio.gather(*(send(agent) for agent in agents))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(FLUSH_POLL_SECONDS, ASSIGNMENT_ALERT_WINDOW))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Assignment alert flush failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and send whatever is still pending"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush(flush_all=True)
+        except Exception as e:
+            logger.error(f"Assignment alert flush on shutdown failed: {e}")
+
+
+# Process-wide buffer used by every assignment path
+assignment_alerts = AssignmentAlertBuffer()
@@ -0,0 +1,202 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional, Tuple
+
+from bson import ObjectId
+from decouple import config
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import get_database, get_collection, Collections
+
+# Largest accepted upload
+MAX_ATTACHMENT_BYTES = config('MAX_ATTACHMENT_MB', default=25, cast=int) * 1024 * 1024
+
+# GridFS chunk size; also the most an upload or download holds in memory
+ATTACHMENT_CHUNK_SIZE = 255 * 1024
+
+# Attachment reference fields returned by listings; file chunks are never read
+ATTACHMENT_LIST_PROJECTION = {
+    "filename": 1, "content_type": 1, "length": 1, "sha256": 1,
+    "lead_id": 1, "quote_id": 1, "uploaded_by": 1, "created_at": 1
+}
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+def get_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(get_database(), bucket_name=Collections.ATTACHMENT_FILES, chunk_size_bytes=ATTACHMENT_CHUNK_SIZE)
+
+
+def download_url(attachment_id) -> str:
+    return f"/api/attachments/{attachment_id}/download"
+
+
+def _files_collection():
+    return get_collection(f"{Collections.ATTACHMENT_FILES}.files")
+
+
+async def _dedupe(file_id: ObjectId, sha256: str) -> ObjectId:
+    """Keep one stored file per content hash; returns the id to reference.
+
+    Each stored file counts its references in `metadata.ref_count`. A new
+    reference is only ever taken with an `$inc` on a file whose count is
+    still positive, so a file that is being deleted is never reused.
+    """
+    files_collection = _files_collection()
+    while True:
+        existing = await files_collection.find_one_and_update(
+            {"metadata.sha256": sha256, "metadata.ref_count": {"$gt": 0}},
+            {"$inc": {"metadata.ref_count": 1}},
+            projection={"_id": 1}
+        )
+        if existing is not None:
+            await get_bucket().delete(file_id)
+            return existing["_id"]
+        try:
+            # The unique index on metadata.sha256 settles concurrent identical uploads
+            await files_collection.update_one(
+                {"_id": file_id}, {"$set": {"metadata.sha256": sha256, "metadata.ref_count": 1}}
+            )
+            return file_id
+        except DuplicateKeyError:
+            # Either another upload won (its copy is referenced next time round) or
+            # the stored copy dropped to zero references and is being deleted;
+            # take the hash off the dying copy so this upload can claim it
+            await files_collection.update_one(
+                {"metadata.sha256": sha256, "metadata.ref_count": {"$lte": 0}},
+                {"$unset": {"metadata.sha256": ""}}
+            )
+
+
+async def _release_file(file_id: ObjectId):
+    """Drop one reference to a stored file, deleting it with the last one"""
+    files_collection = _files_collection()
+    stored = await files_collection.find_one_and_update(
+        {"_id": file_id},
+        {"$inc": {"metadata.ref_count": -1}},
+        projection={"metadata.ref_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if stored is None or stored["metadata"]["ref_count"] > 0:
+        return
+    # Unreferenced: no upload can take it any more, so free its hash and delete it
+    await files_collection.update_one(
+        {"_id": file_id, "metadata.ref_count": {"$lte": 0}}, {"$unset": {"metadata.sha256": ""}}
+    )
+    try:
+        await get_bucket().delete(file_id)
+    except NoFile:
+        pass
+
+
+async def store_attachment(
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    content_type: str,
+    lead_id: ObjectId,
+    quote_id: Optional[ObjectId],
+    user_id: ObjectId
+) -> dict:
+    """Stream an upload into GridFS and record an attachment reference.
+
+    Chunks are hashed and written as they arrive, so memory use is bounded
+    by the GridFS chunk size. Once the hash is known, an identical file
+    that is already stored is referenced instead and the new copy dropped.
+    """
+    digest = hashlib.sha256()
+    length = 0
+    grid_in = get_bucket().open_upload_stream(filename, metadata={"content_type": content_type})
+    try:
+        async for chunk in chunks:
+            length += len(chunk)
+            if length > MAX_ATTACHMENT_BYTES:
+                raise AttachmentTooLarge()
+            digest.update(chunk)
+            await grid_in.write(chunk)
+    except BaseException:
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+
+    sha256 = digest.hexdigest()
+    file_id = await _dedupe(grid_in._id, sha256)
+
+    attachment = {
+        "file_id": file_id,
+        "filename": filename,
+        "content_type": content_type,
+        "length": length,
+        "sha256": sha256,
+        "lead_id": lead_id,
+        "quote_id": quote_id,
+        "uploaded_by": user_id,
+        "created_at": datetime.now(timezone.utc)
+    }
+    result = await get_collection(Collections.ATTACHMENTS).insert_one(attachment)
+    attachment["_id"] = result.inserted_id
+    return attachment
+
+
+async def delete_attachments(query: dict) -> int:
+    """Delete attachment references, and stored files no longer referenced.
+
+    References are removed one at a time so that each file's count is
+    decremented once per reference this call actually deleted.
+    """
+    collection = get_collection(Collections.ATTACHMENTS)
+    deleted = 0
+    async for attachment in collection.find(query, {"_id": 1}):
+        removed = await collection.find_one_and_delete({"_id": attachment["_id"]}, projection={"file_id": 1})
+        if removed is None:
+            continue
+        deleted += 1
+        await _release_file(removed["file_id"])
+    return deleted
+
+
+def parse_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single `bytes=` range; None means the whole file.
+
+    Raises ValueError for a range that cannot be satisfied. Multi-range
+    requests are answered with the whole file, which RFC 9110 allows.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0 or length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(length - suffix, 0), length - 1
+    start = int(first)
+    end = min(int(last), length - 1) if last else length - 1
+    if start >= length or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+async def stream_range(file_id: ObjectId, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive) of a stored file, one chunk at a time"""
+    grid_out = await get_bucket().open_download_stream(file_id)
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await grid_out.read(min(ATTACHMENT_CHUNK_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
@@ -0,0 +1,286 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from decouple import config
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import get_collection, Collections
+import models
+from jobs import register_job, JobContext
+from lead_utils import build_lead_filter
+from dedupe import normalize_email
+from email_templates import template_engine
+from email_utils import SMTPConnection
+
+SEND_CAMPAIGN_JOB = "send_campaign"
+
+# Messages per second across all of a campaign's connections (0 = unlimited)
+CAMPAIGN_SEND_RATE = config('CAMPAIGN_SEND_RATE', default=10, cast=float)
+
+# SMTP sessions a campaign keeps open at once
+CAMPAIGN_MAX_CONNECTIONS = config('CAMPAIGN_MAX_CONNECTIONS', default=4, cast=int)
+
+# Recipients claimed, sent and checkpointed together
+CAMPAIGN_BATCH_SIZE = 200
+
+# Leads read per round trip while snapshotting the segment
+SNAPSHOT_BATCH_SIZE = 1000
+
+LINE_FIELDS = ["personal_lines", "commercial_lines", "life_and_health"]
+
+# Lead fields copied into each recipient's template context
+RECIPIENT_CONTEXT_FIELDS = ["first_name", "last_name", "email", "city", "state", "zip_code"]
+
+_DUPLICATE_KEY = 11000
+
+
+def build_segment_filter(segment: dict, user: dict) -> dict:
+    """Lead query for a campaign segment: the list filters plus state and lines"""
+    query_filter = build_lead_filter(
+        user,
+        segment.get("status"),
+        segment.get("source"),
+        segment.get("assigned_agent_id"),
+        segment.get("priority"),
+        segment.get("search"),
+        full_access_roles=(models.UserRole.ADMIN.value, models.UserRole.MANAGER.value)
+    )
+    if segment.get("state"):
+        query_filter["state"] = segment["state"].upper()
+    lines = [line for line in segment.get("lines") or [] if line in LINE_FIELDS]
+    if lines:
+        # `search` may already own $or, so the lines go under $and
+        query_filter["$and"] = [{"$or": [{line: True} for line in lines]}]
+    query_filter["email"] = {"$nin": [None, ""]}
+    return query_filter
+
+
+class RateLimiter:
+    """Token bucket shared by every sender of one campaign"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(1.0, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def campaign_metrics(campaign: dict) -> dict:
+    """Delivery counts and throughput for the campaign API"""
+    stats = campaign.get("stats") or {}
+    delivered = stats.get("sent", 0) + stats.get("failed", 0)
+    send_seconds = stats.get("send_seconds", 0)
+    return {
+        **stats,
+        "remaining": max(stats.get("recipients", 0) - delivered - stats.get("interrupted", 0), 0),
+        "messages_per_second": round(delivered / send_seconds, 2) if send_seconds else None
+    }
+
+
+async def snapshot_recipients(campaign: dict) -> int:
+    """Copy the segment's leads into campaign_recipients.
+
+    Streams a projected cursor and inserts in batches; the unique
+    (campaign_id, email) index drops repeat addresses, and makes a snapshot
+    that is re-run after a crash insert only what it had not reached.
+    """
+    leads_collection = get_collection(Collections.MAIN_DATA)
+    recipients_collection = get_collection(Collections.CAMPAIGN_RECIPIENTS)
+    users_collection = get_collection(Collections.USERS)
+
+    creator = await users_collection.find_one({"_id": campaign["created_by"]}, {"role": 1})
+    if not creator:
+        raise ValueError("Campaign creator no longer exists")
+    query_filter = build_segment_filter(campaign["segment"], creator)
+
+    projection = {field: 1 for field in RECIPIENT_CONTEXT_FIELDS}
+
+    async def insert(batch):
+        try:
+            await recipients_collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != _DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+
+    batch = []
+    async for lead in leads_collection.find(query_filter, projection).batch_size(SNAPSHOT_BATCH_SIZE):
+        email = normalize_email(lead.get("email"))
+        if not email:
+            continue
+        batch.append({
+            "campaign_id": campaign["_id"],
+            "lead_id": lead["_id"],
+            "email": email,
+            "context": {field: lead.get(field) for field in RECIPIENT_CONTEXT_FIELDS},
+            "status": models.RecipientStatus.PENDING.value
+        })
+        if len(batch) >= SNAPSHOT_BATCH_SIZE:
+            await insert(batch)
+            batch = []
+    if batch:
+        await insert(batch)
+
+    total = await recipients_collection.count_documents({"campaign_id": campaign["_id"]})
+    await get_collection(Collections.CAMPAIGNS).update_one(
+        {"_id": campaign["_id"]},
+        {"$set": {"snapshot_at": datetime.now(timezone.utc), "stats.recipients": total}}
+    )
+    return total
+
+
+async def _deliver_batch(template_name: str, batch: list, pool: asyncio.Queue, limiter: RateLimiter) -> list:
+    """Render and send a batch through the connection pool; returns (id, error) pairs"""
+
+    async def deliver(recipient):
+        await limiter.acquire()
+        connection = await pool.get()
+        try:
+            rendered = template_engine.render(template_name, recipient["context"])
+            await asyncio.to_thread(connection.send, recipient["email"], rendered.to_mime(recipient["email"]))
+            return recipient["_id"], None
+        except Exception as e:
+            # Start the next message on a fresh session
+            connection.close()
+            return recipient["_id"], str(e)
+        finally:
+            pool.put_nowait(connection)
+
+    return await asyncio.gather(*(deliver(recipient) for recipient in batch))
+
+
+@register_job(SEND_CAMPAIGN_JOB)
+async def send_campaign(job: JobContext) -> dict:
+    """Snapshot a campaign's segment, then deliver it in checkpointed batches.
+
+    Each batch is claimed (pending -> sending, tagged with a claim id)
+    before it is sent and checkpointed (sent/failed) with one bulk_write
+    after. The job's lease keeps a second process from running it
+    concurrently. When the job is resumed after a crash, recipients still
+    marked sending may or may not have been mailed; they are marked
+    interrupted and never sent again.
+    """
+    campaign_id = ObjectId(job.params["campaign_id"])
+    campaigns_collection = get_collection(Collections.CAMPAIGNS)
+    recipients_collection = get_collection(Collections.CAMPAIGN_RECIPIENTS)
+
+    campaign = await campaigns_collection.find_one({"_id": campaign_id})
+    if not campaign or campaign["status"] != models.CampaignStatus.SENDING.value:
+        return {"skipped": "Campaign is not sending"}
+
+    try:
+        if template_engine.get(campaign["template_name"]) is None:
+            raise ValueError(f"Unknown email template: {campaign['template_name']}")
+        if not campaign.get("snapshot_at"):
+            await snapshot_recipients(campaign)
+
+        interrupted = await recipients_collection.update_many(
+            {"campaign_id": campaign_id, "status": models.RecipientStatus.SENDING.value},
+            {"$set": {"status": models.RecipientStatus.INTERRUPTED.value}}
+        )
+        if interrupted.modified_count:
+            await campaigns_collection.update_one(
+                {"_id": campaign_id}, {"$inc": {"stats.interrupted": interrupted.modified_count}}
+            )
+    except Exception as e:
+        await campaigns_collection.update_one(
+            {"_id": campaign_id},
+            {"$set": {"status": models.CampaignStatus.FAILED.value, "error": str(e), "finished_at": datetime.now(timezone.utc)}}
+        )
+        raise
+
+    pool: asyncio.Queue = asyncio.Queue()
+    for _ in range(max(CAMPAIGN_MAX_CONNECTIONS, 1)):
+        pool.put_nowait(SMTPConnection())
+    limiter = RateLimiter(CAMPAIGN_SEND_RATE)
+
+    sent = failed = 0
+    cancelled = False
+    try:
+        while True:
+            # Cancellation through the API is noticed between batches
+            current = await campaigns_collection.find_one({"_id": campaign_id}, {"status": 1, "stats": 1})
+            if current["status"] != models.CampaignStatus.SENDING.value:
+                cancelled = True
+                break
+
+            candidates = await recipients_collection.find(
+                {"campaign_id": campaign_id, "status": models.RecipientStatus.PENDING.value}, {"_id": 1}
+            ).sort("_id", 1).limit(CAMPAIGN_BATCH_SIZE).to_list(length=CAMPAIGN_BATCH_SIZE)
+            if not candidates:
+                break
+
+            # Claim with a conditional update and send only what this claim won,
+            # so a recipient is never picked up by two senders
+            claim_id = ObjectId()
+            candidate_ids = [recipient["_id"] for recipient in candidates]
+            await recipients_collection.update_many(
+                {"_id": {"$in": candidate_ids}, "status": models.RecipientStatus.PENDING.value},
+                {"$set": {"status": models.RecipientStatus.SENDING.value, "claim_id": claim_id}}
+            )
+            batch = await recipients_collection.find(
+                {"_id": {"$in": candidate_ids}, "claim_id": claim_id}
+            ).to_list(length=None)
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            results = await _deliver_batch(campaign["template_name"], batch, pool, limiter)
+            elapsed = time.monotonic() - started
+
+            now = datetime.now(timezone.utc)
+            operations = []
+            batch_failed = 0
+            for recipient_id, error in results:
+                if error is None:
+                    operations.append(UpdateOne(
+                        {"_id": recipient_id}, {"$set": {"status": models.RecipientStatus.SENT.value, "sent_at": now}}
+                    ))
+                else:
+                    batch_failed += 1
+                    operations.append(UpdateOne(
+                        {"_id": recipient_id}, {"$set": {"status": models.RecipientStatus.FAILED.value, "error": error}}
+                    ))
+            await recipients_collection.bulk_write(operations, ordered=False)
+
+            sent += len(results) - batch_failed
+            failed += batch_failed
+            await campaigns_collection.update_one(
+                {"_id": campaign_id},
+                {"$inc": {
+                    "stats.sent": len(results) - batch_failed,
+                    "stats.failed": batch_failed,
+                    "stats.send_seconds": elapsed
+                }, "$set": {"updated_at": now}}
+            )
+            stats = current.get("stats") or {}
+            done = stats.get("sent", 0) + stats.get("failed", 0) + stats.get("interrupted", 0) + len(results)
+            await job.progress(done, stats.get("recipients"))
+    finally:
+        while not pool.empty():
+            await asyncio.to_thread(pool.get_nowait().close)
+
+    if not cancelled:
+        now = datetime.now(timezone.utc)
+        await campaigns_collection.update_one(
+            {"_id": campaign_id, "status": models.CampaignStatus.SENDING.value},
+            {"$set": {"status": models.CampaignStatus.COMPLETED.value, "finished_at": now, "updated_at": now}}
+        )
+
+    campaign = await campaigns_collection.find_one({"_id": campaign_id}, {"stats": 1})
+    return {"sent": sent, "failed": failed, "cancelled": cancelled, **campaign_metrics(campaign)}
@@ -0,0 +1,193 @@
+import heapq
+from datetime import datetime, timezone
+from typing import List
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from database import get_collection, Collections
+import models
+from jobs import register_job, JobContext
+from activity_utils import restamp_lead_activities
+from assignment_alerts import assignment_alerts, ALERT_LEAD_FIELDS
+from attachments import delete_attachments
+from live_events import live_events
+
+PURGE_LEAD_JOB = "purge_lead"
+REDISTRIBUTE_LEADS_JOB = "redistribute_agent_leads"
+
+# Documents deleted or reassigned per round trip
+CASCADE_BATCH_SIZE = 1000
+
+# Statuses that no longer need an owner working them
+CLOSED_STATUSES = [models.LeadStatus.CLOSED_WON.value, models.LeadStatus.CLOSED_LOST.value]
+
+
+async def _delete_in_batches(collection, query: dict, on_batch) -> int:
+    """Delete matching documents by _id batches so no single delete runs long"""
+    deleted = 0
+    while True:
+        ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1}).limit(CASCADE_BATCH_SIZE)]
+        if not ids:
+            return deleted
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        deleted += result.deleted_count
+        await on_batch(deleted)
+
+
+@register_job(PURGE_LEAD_JOB)
+async def purge_lead(job: JobContext) -> dict:
+    """Remove a soft-deleted lead's activities, quotes and attachments, then the lead itself"""
+    lead_id = ObjectId(job.params["lead_id"])
+    leads_collection = get_collection(Collections.MAIN_DATA)
+    activities_collection = get_collection(Collections.ACTIVITIES)
+    quotes_collection = get_collection(Collections.QUOTES)
+
+    # Never purge a lead that was restored (or never soft-deleted)
+    lead = await leads_collection.find_one({"_id": lead_id}, {"deleted_at": 1})
+    if lead and not lead.get("deleted_at"):
+        return {"skipped": "Lead is not deleted"}
+
+    total = (
+        await activities_collection.count_documents({"lead_id": lead_id})
+        + await quotes_collection.count_documents({"lead_id": lead_id})
+    )
+    await job.progress(0, total)
+
+    activities_deleted = await _delete_in_batches(
+        activities_collection, {"lead_id": lead_id},
+        lambda deleted: job.progress(deleted)
+    )
+    quotes_deleted = await _delete_in_batches(
+        quotes_collection, {"lead_id": lead_id},
+        lambda deleted: job.progress(activities_deleted + deleted)
+    )
+
+    attachments_deleted = await delete_attachments({"lead_id": lead_id})
+
+    lead = await leads_collection.find_one_and_delete({"_id": lead_id, "deleted_at": {"$exists": True}})
+    if lead:
+        # Its counters were already taken out when it was soft-deleted
+        live_events.lead_changed("lead.purged", lead, lead, {"id": str(lead_id)})
+    return {
+        "activities_deleted": activities_deleted,
+        "quotes_deleted": quotes_deleted,
+        "attachments_deleted": attachments_deleted
+    }
+
+
+async def _open_lead_counts(agent_ids: List[ObjectId]) -> dict:
+    """Current number of open leads per agent, in one aggregation"""
+    collection = get_collection(Collections.MAIN_DATA)
+    counts = {agent_id: 0 for agent_id in agent_ids}
+    pipeline = [
+        {"$match": {
+            "assigned_agent_id": {"$in": agent_ids},
+            "status": {"$nin": CLOSED_STATUSES},
+            "deleted_at": {"$exists": False}
+        }},
+        {"$group": {"_id": "$assigned_agent_id", "count": {"$sum": 1}}}
+    ]
+    async for row in collection.aggregate(pipeline):
+        counts[row["_id"]] = row["count"]
+    return counts
+
+
+@register_job(REDISTRIBUTE_LEADS_JOB)
+async def redistribute_agent_leads(job: JobContext) -> dict:
+    """Spread a deactivated agent's open leads across the active agents.
+
+    Each lead goes to the active agent with the fewest open leads (a min-heap
+    seeded from one aggregation), so the team ends up evenly loaded rather
+    than round-robined. Updates are conditional on the lead still belonging
+    to the deactivated agent, so manual reassignments made meanwhile win.
+    """
+    agent_id = ObjectId(job.params["agent_id"])
+    leads_collection = get_collection(Collections.MAIN_DATA)
+    users_collection = get_collection(Collections.USERS)
+    activities_collection = get_collection(Collections.ACTIVITIES)
+
+    open_filter = {
+        "assigned_agent_id": agent_id,
+        "status": {"$nin": CLOSED_STATUSES},
+        "deleted_at": {"$exists": False}
+    }
+    total = await leads_collection.count_documents(open_filter)
+    await job.progress(0, total)
+    if total == 0:
+        return {"reassigned": 0, "by_agent": {}}
+
+    agents = await users_collection.find(
+        {"role": models.UserRole.AGENT.value, "is_active": True, "_id": {"$ne": agent_id}},
+        {"full_name": 1}
+    ).to_list(length=None)
+    if not agents:
+        raise RuntimeError("No active agents to redistribute leads to")
+
+    names = {agent["_id"]: agent.get("full_name", "Unknown") for agent in agents}
+    counts = await _open_lead_counts(list(names))
+    heap = [(count, str(agent), agent) for agent, count in counts.items()]
+    heapq.heapify(heap)
+
+    processed = reassigned = 0
+    by_agent = {}
+    cursor = leads_collection.find(open_filter, {field: 1 for field in ALERT_LEAD_FIELDS}).batch_size(CASCADE_BATCH_SIZE)
+    batch = []
+
+    async def flush(batch):
+        now = datetime.now(timezone.utc)
+        operations, planned = [], {}
+        leads = {lead["_id"]: lead for lead in batch}
+        for lead_id in leads:
+            count, key, target = heapq.heappop(heap)
+            heapq.heappush(heap, (count + 1, key, target))
+            planned[lead_id] = target
+            operations.append(UpdateOne(
+                {"_id": lead_id, "assigned_agent_id": agent_id},
+                {"$set": {"assigned_agent_id": target, "updated_at": now}}
+            ))
+        await leads_collection.bulk_write(operations, ordered=False)
+
+        # Audit only the leads that actually moved (not reassigned by hand meanwhile)
+        targets = {}
+        async for doc in leads_collection.find({"_id": {"$in": list(leads)}}, {"assigned_agent_id": 1}):
+            if doc.get("assigned_agent_id") == planned[doc["_id"]]:
+                targets.setdefault(planned[doc["_id"]], []).append(doc["_id"])
+
+        activities = [
+            {
+                "lead_id": lead_id,
+                "user_id": job.params.get("user_id"),
+                "assigned_agent_id": target,
+                "activity_type": models.ActivityType.NOTE.value,
+                "title": "Lead Reassigned",
+                "description": f"Lead reassigned to {names[target]} after agent deactivation",
+                "created_at": now
+            }
+            for target, lead_ids in targets.items()
+            for lead_id in lead_ids
+        ]
+        if activities:
+            await activities_collection.insert_many(activities, ordered=False)
+        for target, lead_ids in targets.items():
+            await restamp_lead_activities(lead_ids, target)
+            by_agent[str(target)] = by_agent.get(str(target), 0) + len(lead_ids)
+            for lead_id in lead_ids:
+                assignment_alerts.emit(target, leads[lead_id])
+        return len(activities)
+
+    async for lead in cursor:
+        batch.append(lead)
+        if len(batch) >= CASCADE_BATCH_SIZE:
+            reassigned += await flush(batch)
+            processed += len(batch)
+            batch = []
+            await job.progress(processed)
+    if batch:
+        reassigned += await flush(batch)
+        processed += len(batch)
+        await job.progress(processed)
+
+    if reassigned:
+        live_events.resync("redistribution")
+    return {"reassigned": reassigned, "by_agent": by_agent}
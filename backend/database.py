@@ -1,5 +1,5 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel
 from decouple import config
 from typing import Optional
 import asyncio
@@ -71,4 +71,84 @@ class Collections:
     ACTIVITIES = 'activities'
     QUOTES = 'quotes'
     EMAIL_TEMPLATES = 'email_templates'
-    SETTINGS = 'settings'
\ No newline at end of file
+    SETTINGS = 'settings'
+    JOBS = 'jobs'
+    DUPLICATE_CLUSTERS = 'duplicate_clusters'
+    SCHEDULER_STATE = 'scheduler_state'
+    CAMPAIGNS = 'campaigns'
+    CAMPAIGN_RECIPIENTS = 'campaign_recipients'
+    COUNTERS = 'counters'
+    ATTACHMENTS = 'attachments'
+    ATTACHMENT_FILES = 'attachment_files'  # GridFS bucket
+    REPORT_SNAPSHOTS = 'report_snapshots'
+    REPORT_RESULTS = 'report_results'
+
+
+# Secondary indexes backing the analytics and listing queries
+INDEXES = {
+    Collections.MAIN_DATA: [
+        IndexModel([("created_at", ASCENDING)]),
+        IndexModel([("email", ASCENDING)]),
+        IndexModel([("assigned_agent_id", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("next_follow_up_date", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("assigned_agent_id", ASCENDING), ("next_follow_up_date", ASCENDING)]),
+        IndexModel([("dedupe_keys", ASCENDING)]),
+        # Incremental report refreshes look up leads changed since the last run
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    Collections.ACTIVITIES: [
+        IndexModel([("lead_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("activity_type", ASCENDING), ("lead_id", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("assigned_agent_id", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    Collections.QUOTES: [
+        IndexModel([("lead_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("created_by", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Quotes saved before numbering was introduced have no number and must not collide
+        IndexModel([("quote_number", ASCENDING)], unique=True, partialFilterExpression={"quote_number": {"$exists": True}}),
+        # Only open quotes can expire, so the sweeper's index stays small
+        IndexModel([("expires_at", ASCENDING)], partialFilterExpression={"is_active": True, "is_accepted": False}),
+    ],
+    Collections.JOBS: [
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    Collections.EMAIL_TEMPLATES: [
+        IndexModel([("name", ASCENDING), ("is_active", ASCENDING)]),
+    ],
+    Collections.DUPLICATE_CLUSTERS: [
+        IndexModel([("lead_ids", ASCENDING)]),
+        IndexModel([("size", DESCENDING)]),
+    ],
+    Collections.ATTACHMENTS: [
+        IndexModel([("lead_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("quote_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("file_id", ASCENDING)]),
+    ],
+    f"{Collections.ATTACHMENT_FILES}.files": [
+        # One stored copy per content hash
+        IndexModel([("metadata.sha256", ASCENDING)], unique=True, partialFilterExpression={"metadata.sha256": {"$exists": True}}),
+    ],
+    Collections.REPORT_SNAPSHOTS: [
+        IndexModel([("report", ASCENDING), ("day", ASCENDING), ("agent_id", ASCENDING)]),
+    ],
+    Collections.REPORT_RESULTS: [
+        # Finished reports (and stuck computations) expire on their own
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        IndexModel([("job_id", ASCENDING)]),
+    ],
+    Collections.CAMPAIGNS: [
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    Collections.CAMPAIGN_RECIPIENTS: [
+        # One message per address per campaign, also makes a resumed snapshot idempotent
+        IndexModel([("campaign_id", ASCENDING), ("email", ASCENDING)], unique=True),
+        IndexModel([("campaign_id", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)]),
+    ],
+}
+
+
+async def create_indexes():
+    """Create the secondary indexes used by the routers (idempotent)"""
+    for collection_name, indexes in INDEXES.items():
+        await get_collection(collection_name).create_indexes(indexes)
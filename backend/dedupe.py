@@ -0,0 +1,277 @@
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateMany
+
+from database import get_collection, Collections
+import models
+from jobs import register_job, JobContext
+from activity_utils import restamp_lead_activities
+
+CLUSTER_DUPLICATES_JOB = "cluster_duplicates"
+
+# Blocks bigger than this are placeholder values ("0000000000", a shared
+# office zip) rather than real duplicates and are ignored when clustering
+MAX_BLOCK_SIZE = 50
+
+# Clusters written per insert_many when a scan finishes
+CLUSTER_WRITE_BATCH = 1000
+
+# Fields copied from a merged duplicate when the surviving lead lacks them
+MERGE_FILL_FIELDS = [
+    "phone_number", "address_line1", "address_line2", "city", "state", "zip_code",
+    "country", "estimated_value", "next_follow_up_date", "assigned_agent_id"
+]
+MERGE_OR_FIELDS = ["personal_lines", "commercial_lines", "life_and_health"]
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("BFPV", "1"),
+    **dict.fromkeys("CGJKQSXZ", "2"),
+    **dict.fromkeys("DT", "3"),
+    "L": "4",
+    **dict.fromkeys("MN", "5"),
+    "R": "6",
+}
+
+
+def soundex(name: Optional[str]) -> Optional[str]:
+    """American Soundex code of a name (e.g. "Robert" and "Rupert" -> "R163")"""
+    letters = re.sub(r"[^A-Z]", "", str(name or "").upper())
+    if not letters:
+        return None
+    code = letters[0]
+    previous = _SOUNDEX_CODES.get(letters[0])
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES.get(letter)
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W do not separate letters with the same code; vowels do
+        if letter not in "HW":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    email = str(email or "").strip().lower()
+    return email or None
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Digits only, without a leading US country code; None if too short to be real"""
+    digits = re.sub(r"\D", "", str(phone or ""))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits if len(digits) >= 7 else None
+
+
+def email_key(email: Optional[str]) -> Optional[str]:
+    email = normalize_email(email)
+    return f"email:{email}" if email else None
+
+
+def blocking_keys(lead: dict) -> List[str]:
+    """Normalized blocking keys stored (and indexed) as `dedupe_keys` on each lead.
+
+    Two leads are duplicate candidates when they share any key: the same
+    lowercased email, the same digits-only phone, or the same Soundex of the
+    last name within the same 5-digit zip.
+    """
+    keys = []
+    email = email_key(lead.get("email"))
+    if email:
+        keys.append(email)
+    phone = normalize_phone(lead.get("phone_number"))
+    if phone:
+        keys.append(f"phone:{phone}")
+    name = soundex(lead.get("last_name"))
+    zip_code = re.sub(r"\D", "", str(lead.get("zip_code") or ""))[:5]
+    if name and zip_code:
+        keys.append(f"name:{name}:{zip_code}")
+    return keys
+
+
+async def find_duplicate_candidates(lead: dict, limit: int = 20) -> List[dict]:
+    """Other live leads sharing a blocking key with `lead` (one indexed query)"""
+    keys = lead.get("dedupe_keys") or blocking_keys(lead)
+    if not keys:
+        return []
+    query = {"dedupe_keys": {"$in": keys}, "deleted_at": {"$exists": False}}
+    if lead.get("_id"):
+        query["_id"] = {"$ne": lead["_id"]}
+    collection = get_collection(Collections.MAIN_DATA)
+    return await collection.find(query).limit(limit).to_list(length=limit)
+
+
+@register_job(CLUSTER_DUPLICATES_JOB)
+async def cluster_duplicates(job: JobContext) -> dict:
+    """Group existing leads into duplicate clusters.
+
+    The database groups leads by blocking key in one aggregation (spilling
+    to disk if needed) and only returns blocks with more than one lead. Blocks that share a lead are then joined with a
+    union-find, so A~B by phone and B~C by email form one cluster. The new
+    clusters replace the previous scan's once they are all written.
+    """
+    leads_collection = get_collection(Collections.MAIN_DATA)
+    clusters_collection = get_collection(Collections.DUPLICATE_CLUSTERS)
+
+    pipeline = [
+        {"$match": {"deleted_at": {"$exists": False}, "dedupe_keys.0": {"$exists": True}}},
+        {"$project": {"dedupe_keys": 1}},
+        {"$unwind": "$dedupe_keys"},
+        {"$group": {"_id": "$dedupe_keys", "lead_ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1, "$lte": MAX_BLOCK_SIZE}}}
+    ]
+
+    parent: Dict[ObjectId, ObjectId] = {}
+
+    def find(lead_id):
+        root = lead_id
+        while parent[root] != root:
+            root = parent[root]
+        # Path compression
+        while parent[lead_id] != root:
+            parent[lead_id], lead_id = root, parent[lead_id]
+        return root
+
+    keys_by_lead: Dict[ObjectId, set] = {}
+    blocks = 0
+    async for block in leads_collection.aggregate(pipeline, allowDiskUse=True):
+        blocks += 1
+        ids = block["lead_ids"]
+        for lead_id in ids:
+            parent.setdefault(lead_id, lead_id)
+            keys_by_lead.setdefault(lead_id, set()).add(block["_id"])
+        root = find(ids[0])
+        for lead_id in ids[1:]:
+            other = find(lead_id)
+            if other != root:
+                parent[other] = root
+        if blocks % 1000 == 0:
+            await job.progress(blocks)
+    await job.progress(blocks, blocks)
+
+    members: Dict[ObjectId, List[ObjectId]] = {}
+    for lead_id in parent:
+        members.setdefault(find(lead_id), []).append(lead_id)
+
+    now = datetime.now(timezone.utc)
+    batch, written = [], 0
+    for lead_ids in members.values():
+        batch.append({
+            "lead_ids": sorted(lead_ids),
+            "keys": sorted(set().union(*(keys_by_lead[lead_id] for lead_id in lead_ids))),
+            "size": len(lead_ids),
+            "job_id": job.id,
+            "created_at": now
+        })
+        if len(batch) >= CLUSTER_WRITE_BATCH:
+            await clusters_collection.insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    if batch:
+        await clusters_collection.insert_many(batch, ordered=False)
+        written += len(batch)
+
+    # Swap in the new scan only once it is complete
+    await clusters_collection.delete_many({"job_id": {"$ne": job.id}})
+    return {"blocks": blocks, "clusters": written, "leads": len(parent)}
+
+
+async def merge_leads(primary: dict, duplicates: List[dict], user_id: Optional[ObjectId]) -> dict:
+    """Merge duplicate leads into `primary`.
+
+    Empty fields on the primary are filled from the duplicates, activities
+    and quotes are re-pointed with one `bulk_write` per collection (and
+    attachments with one update_many), and the duplicates are soft-deleted
+    with `merged_into` so they stay auditable.
+    """
+    leads_collection = get_collection(Collections.MAIN_DATA)
+    activities_collection = get_collection(Collections.ACTIVITIES)
+    quotes_collection = get_collection(Collections.QUOTES)
+    attachments_collection = get_collection(Collections.ATTACHMENTS)
+    clusters_collection = get_collection(Collections.DUPLICATE_CLUSTERS)
+    now = datetime.now(timezone.utc)
+
+    primary_id = primary["_id"]
+    duplicate_ids = [duplicate["_id"] for duplicate in duplicates]
+
+    # Fill gaps on the surviving lead, oldest duplicate first
+    merged = dict(primary)
+    for duplicate in sorted(duplicates, key=lambda doc: doc.get("created_at") or now):
+        for field in MERGE_FILL_FIELDS:
+            if merged.get(field) in (None, "") and duplicate.get(field) not in (None, ""):
+                merged[field] = duplicate[field]
+        for field in MERGE_OR_FIELDS:
+            merged[field] = bool(merged.get(field) or duplicate.get(field))
+        contacted_at = duplicate.get("first_contact_at")
+        if contacted_at and (not merged.get("first_contact_at") or contacted_at < merged["first_contact_at"]):
+            merged["first_contact_at"] = contacted_at
+            merged["first_contact_activity_id"] = duplicate.get("first_contact_activity_id")
+
+    update = {
+        field: merged[field]
+        for field in MERGE_FILL_FIELDS + MERGE_OR_FIELDS + ["first_contact_at", "first_contact_activity_id"]
+        if field in merged and merged.get(field) != primary.get(field)
+    }
+    update["dedupe_keys"] = blocking_keys(merged)
+    update["updated_at"] = now
+    owner = merged.get("assigned_agent_id")
+
+    # Re-point history before hiding the duplicates
+    activities_moved = quotes_moved = 0
+    if duplicate_ids:
+        result = await activities_collection.bulk_write([
+            UpdateMany({"lead_id": duplicate_id}, {"$set": {"lead_id": primary_id, "assigned_agent_id": owner}})
+            for duplicate_id in duplicate_ids
+        ], ordered=False)
+        activities_moved = result.modified_count
+        result = await quotes_collection.bulk_write([
+            UpdateMany({"lead_id": duplicate_id}, {"$set": {"lead_id": primary_id}})
+            for duplicate_id in duplicate_ids
+        ], ordered=False)
+        quotes_moved = result.modified_count
+        await attachments_collection.update_many({"lead_id": {"$in": duplicate_ids}}, {"$set": {"lead_id": primary_id}})
+
+    await leads_collection.update_one(
+        {"_id": primary_id},
+        {"$set": update, "$addToSet": {"merged_lead_ids": {"$each": duplicate_ids}}}
+    )
+    await leads_collection.update_many(
+        {"_id": {"$in": duplicate_ids}},
+        {"$set": {"deleted_at": now, "deleted_by": user_id, "merged_into": primary_id, "updated_at": now}}
+    )
+
+    # An owner inherited from a duplicate also owns the primary's own history
+    if "assigned_agent_id" in update:
+        await restamp_lead_activities([primary_id], owner)
+
+    await activities_collection.insert_one({
+        "lead_id": primary_id,
+        "user_id": user_id,
+        "assigned_agent_id": owner,
+        "activity_type": models.ActivityType.NOTE.value,
+        "title": "Leads Merged",
+        "description": f"Merged {len(duplicate_ids)} duplicate lead(s) into this lead",
+        "created_at": now
+    })
+
+    # Drop merged leads from stored clusters, and clusters left with one lead
+    await clusters_collection.update_many(
+        {"lead_ids": {"$in": duplicate_ids}},
+        [
+            {"$set": {"lead_ids": {"$setDifference": ["$lead_ids", duplicate_ids]}}},
+            {"$set": {"size": {"$size": "$lead_ids"}}}
+        ]
+    )
+    await clusters_collection.delete_many({"lead_ids.1": {"$exists": False}})
+
+    return {
+        "lead_id": str(primary_id),
+        "merged": [str(duplicate_id) for duplicate_id in duplicate_ids],
+        "activities_moved": activities_moved,
+        "quotes_moved": quotes_moved
+    }
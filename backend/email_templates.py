@@ -0,0 +1,308 @@
+import asyncio
+import base64
+import logging
+import re
+from dataclasses import dataclass
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from typing import Dict, Optional, Tuple
+
+from decouple import config
+from jinja2 import TemplateSyntaxError
+from jinja2.sandbox import SandboxedEnvironment
+
+from database import get_collection, Collections
+
+logger = logging.getLogger(__name__)
+
+FROM_EMAIL = config('FROM_EMAIL', default='')
+
+# Domain for Message-ID headers, resolved once instead of per message
+MESSAGE_ID_DOMAIN = config('MESSAGE_ID_DOMAIN', default='asiainc.co')
+
+# Seconds between checks for templates edited by another process
+TEMPLATE_REFRESH_SECONDS = 60
+
+# Built-in copy, used until a template with the same name is stored in the
+# email_templates collection
+DEFAULT_TEMPLATES = {
+    "new_lead_notification": {
+        "subject": "Thank you for your insurance quote request",
+        "body": """Dear {{ first_name }} {{ last_name }},
+
+Thank you for requesting an insurance quote from A.S.I.A Inc. We have received your information and one of our experienced agents will contact you within 24 hours to discuss your insurance needs.
+
+What happens next:
+1. Our team will review your information
+2. We'll prepare personalized quotes based on your needs
+3. An agent will contact you to discuss your options
+4. We'll help you find the best coverage at competitive rates
+
+Our office hours:
+Monday - Friday: 9am - 5pm
+Saturday - Sunday: by appointment only
+
+Contact Information:
+Phone: 916-772-4006
+Email: TEAM@ASIAINC.CO
+Address: 3017 Douglas Blvd STE 140, Roseville, CA 95661
+
+We look forward to serving you!
+
+Best regards,
+The A.S.I.A Inc Team
+CA License #6009368
+"""
+    },
+    "agent_new_lead_alert": {
+        "subject": "New Lead Assigned: {{ lead_name }}",
+        "body": """You have been assigned a new lead:
+
+Name: {{ lead_name }}
+Email: {{ lead_email }}
+Interests: {{ interests | join(', ') or 'Not specified' }}
+
+Please log into the CRM to view full details and follow up with this lead.
+
+CRM Dashboard: {{ frontend_url }}/dashboard
+
+Best regards,
+A.S.I.A Inc CRM System
+"""
+    },
+    "agent_assignment_summary": {
+        "subject": "{{ total }} New Leads Assigned",
+        "body": """Hi {{ agent_name }},
+
+You have been assigned {{ total }} new leads:
+
+{% for lead in leads %}- {{ lead.name }} ({{ lead.email }}): {{ lead.interests | join(', ') or 'Not specified' }}
+{% endfor %}{% if total > leads | length %}...and {{ total - leads | length }} more
+{% endif %}
+Please log into the CRM to view full details and follow up with these leads.
+
+CRM Dashboard: {{ frontend_url }}/dashboard
+
+Best regards,
+A.S.I.A Inc CRM System
+"""
+    },
+    "follow_up_reminder": {
+        "subject": "Follow-up Reminder: {{ lead_name }}",
+        "body": """Hi {{ agent_name }},
+
+This is a reminder that you have a follow-up scheduled for:
+
+Lead: {{ lead_name }}
+Email: {{ lead_email }}
+
+Please log into the CRM to view full details and update the lead status.
+
+CRM Dashboard: {{ frontend_url }}/dashboard
+
+Best regards,
+A.S.I.A Inc CRM System
+"""
+    },
+    "follow_up_digest": {
+        "subject": "Follow-up Reminder: {{ total }} lead{{ 's' if total != 1 }} due",
+        "body": """Hi {{ agent_name }},
+
+The following follow-ups are now due:
+
+{% for lead in leads %}- {{ lead.name }} ({{ lead.email }}), due {{ lead.due.strftime('%b %d %I:%M %p') }}
+{% endfor %}{% if total > leads | length %}...and {{ total - leads | length }} more
+{% endif %}
+Please log into the CRM to view full details and update the lead status.
+
+CRM Dashboard: {{ frontend_url }}/dashboard
+
+Best regards,
+A.S.I.A Inc CRM System
+"""
+    },
+}
+
+# Stored templates are edited by staff, so they render in Jinja's sandbox. Lead
+# values come from the public form, so HTML bodies escape everything they insert.
+_environments = {
+    False: SandboxedEnvironment(trim_blocks=False, keep_trailing_newline=True),
+    True: SandboxedEnvironment(trim_blocks=False, keep_trailing_newline=True, autoescape=True),
+}
+for _environment in _environments.values():
+    _environment.globals["frontend_url"] = config('FRONTEND_URL', default='http://localhost:5173')
+
+_LEGACY_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+_LINE_BREAKS = re.compile(r"[\r\n]+")
+
+
+def _to_jinja(source: str) -> str:
+    """Accept the older `{first_name}` placeholders used by the seeded templates"""
+    if "{{" in source or "{%" in source:
+        return source
+    return _LEGACY_PLACEHOLDER.sub(r"{{ \1 }}", source)
+
+
+def compile_source(source: str, is_html: bool = False):
+    """Compile template text, raising jinja2.TemplateSyntaxError on bad syntax.
+
+    HTML bodies compile with autoescaping; subjects are headers, never HTML.
+    """
+    return _environments[is_html].from_string(_to_jinja(source))
+
+
+class MimeSkeleton:
+    """Pre-built headers for one content type.
+
+    The constant part of every message is formatted once; building a message
+    only encodes the subject and base64-encodes the body, which is far
+    cheaper than constructing `email.mime` objects for each recipient.
+    """
+
+    def __init__(self, subtype: str):
+        self.prefix = (
+            f"From: {FROM_EMAIL}\r\n"
+            "MIME-Version: 1.0\r\n"
+            f"Content-Type: text/{subtype}; charset=\"utf-8\"\r\n"
+            "Content-Transfer-Encoding: base64\r\n"
+        )
+
+    def build(self, to_email: str, subject: str, body: str) -> str:
+        # Values are pasted into the header block, so line breaks must not survive
+        if "\r" in to_email or "\n" in to_email:
+            raise ValueError("Recipient address contains a line break")
+        subject = _LINE_BREAKS.sub(" ", subject)
+        if not subject.isascii():
+            subject = Header(subject, "utf-8").encode()
+        encoded = base64.encodebytes(body.encode("utf-8")).decode("ascii").replace("\n", "\r\n")
+        return (
+            f"{self.prefix}"
+            f"To: {to_email}\r\n"
+            f"Subject: {subject}\r\n"
+            f"Date: {formatdate()}\r\n"
+            f"Message-ID: {make_msgid(domain=MESSAGE_ID_DOMAIN)}\r\n"
+            "\r\n"
+            f"{encoded}"
+        )
+
+
+MIME_SKELETONS = {False: MimeSkeleton("plain"), True: MimeSkeleton("html")}
+
+
+def build_mime_message(to_email: str, subject: str, body: str, is_html: bool = False) -> str:
+    return MIME_SKELETONS[is_html].build(to_email, subject, body)
+
+
+@dataclass
+class CompiledTemplate:
+    name: str
+    version: int
+    subject: object
+    body: object
+    is_html: bool = False
+
+
+@dataclass
+class RenderedEmail:
+    subject: str
+    body: str
+    is_html: bool
+
+    def to_mime(self, to_email: str) -> str:
+        return build_mime_message(to_email, self.subject, self.body, self.is_html)
+
+
+class TemplateEngine:
+    """Compiled email templates held in memory.
+
+    Compiled templates are cached by (name, version); `_active` maps each name
+    to the version currently in force. Rendering never touches MongoDB, so it
+    is safe from the synchronous email functions and cheap for large sends.
+    Writes through the templates API call `reload()`; other processes pick
+    edits up within TEMPLATE_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._compiled: Dict[Tuple[str, int], CompiledTemplate] = {}
+        self._active: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        for name, template in DEFAULT_TEMPLATES.items():
+            self._store(name, 0, template["subject"], template["body"], False)
+            self._active[name] = 0
+
+    def _store(self, name: str, version: int, subject: str, body: str, is_html: bool) -> CompiledTemplate:
+        key = (name, version)
+        if key not in self._compiled:
+            self._compiled[key] = CompiledTemplate(
+                name, version, compile_source(subject), compile_source(body, is_html), is_html
+            )
+        return self._compiled[key]
+
+    async def reload(self, name: Optional[str] = None):
+        """Re-read active templates (all, or one name) and compile new versions"""
+        collection = get_collection(Collections.EMAIL_TEMPLATES)
+        query = {"is_active": True}
+        if name is not None:
+            query["name"] = name
+
+        # Check versions first; only fetch bodies for templates that changed
+        current = {doc["name"]: doc.get("version", 1) async for doc in collection.find(query, {"name": 1, "version": 1})}
+        changed = [template_name for template_name, version in current.items() if (template_name, version) not in self._compiled]
+        if changed:
+            async for doc in collection.find({**query, "name": {"$in": changed}}):
+                try:
+                    self._store(doc["name"], doc.get("version", 1), doc["subject"], doc["body"], doc.get("is_html", False))
+                except TemplateSyntaxError as e:
+                    logger.error(f"Email template {doc['name']} does not compile: {e}")
+                    current.pop(doc["name"], None)
+
+        names = [name] if name is not None else set(self._active) | set(current)
+        for template_name in names:
+            if template_name in current and (template_name, current[template_name]) in self._compiled:
+                self._active[template_name] = current[template_name]
+            elif template_name in DEFAULT_TEMPLATES:
+                self._active[template_name] = 0
+            else:
+                self._active.pop(template_name, None)
+
+        # Drop compiled versions that are no longer referenced
+        live = set(self._active.items())
+        for key in [key for key in self._compiled if key not in live]:
+            del self._compiled[key]
+
+    def get(self, name: str) -> Optional[CompiledTemplate]:
+        version = self._active.get(name)
+        return None if version is None else self._compiled.get((name, version))
+
+    def render(self, name: str, context: dict) -> RenderedEmail:
+        template = self.get(name)
+        if template is None:
+            raise KeyError(f"Unknown email template: {name}")
+        return RenderedEmail(
+            subject=template.subject.render(context).strip(),
+            body=template.body.render(context),
+            is_html=template.is_html
+        )
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(TEMPLATE_REFRESH_SECONDS)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Email template refresh failed: {e}")
+
+    async def start(self):
+        await self.reload()
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Process-wide engine used by email_utils and campaign sends
+template_engine = TemplateEngine()
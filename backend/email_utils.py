@@ -1,9 +1,9 @@
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from decouple import config
 import logging
 
+from email_templates import template_engine, build_mime_message
+
 # Email configuration
 SMTP_HOST = config('SMTP_HOST', default='smtp.gmail.com')
 SMTP_PORT = int(config('SMTP_PORT', default=587))
@@ -16,26 +16,19 @@ logger = logging.getLogger(__name__)
 
 def send_email(to_email: str, subject: str, body: str, is_html: bool = False):
     """Send an email"""
+    return send_raw_email(to_email, build_mime_message(to_email, subject, body, is_html))
+
+def send_raw_email(to_email: str, message: str):
+    """Send a message already rendered to MIME text"""
     try:
         if not SMTP_USER or not SMTP_PASSWORD:
             logger.warning("Email configuration not set. Skipping email send.")
             return False
-            
-        msg = MIMEMultipart()
-        msg['From'] = FROM_EMAIL
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        if is_html:
-            msg.attach(MIMEText(body, 'html'))
-        else:
-            msg.attach(MIMEText(body, 'plain'))
         
         server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
         server.starttls()
         server.login(SMTP_USER, SMTP_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(FROM_EMAIL, to_email, text)
+        server.sendmail(FROM_EMAIL, to_email, message)
         server.quit()
         
         logger.info(f"Email sent successfully to {to_email}")
@@ -45,80 +38,81 @@ def send_email(to_email: str, subject: str, body: str, is_html: bool = False):
         logger.error(f"Failed to send email to {to_email}: {str(e)}")
         return False
 
-def send_new_lead_notification(email: str, first_name: str, last_name: str):
-    """Send welcome email to new leads"""
-    subject = "Thank you for your insurance quote request"
-    
-    body = f"""
-    Dear {first_name} {last_name},
-
-    Thank you for requesting an insurance quote from A.S.I.A Inc. We have received your information and one of our experienced agents will contact you within 24 hours to discuss your insurance needs.
+class SMTPConnection:
+    """One SMTP session reused for many messages (bulk sends).
 
-    What happens next:
-    1. Our team will review your information
-    2. We'll prepare personalized quotes based on your needs
-    3. An agent will contact you to discuss your options
-    4. We'll help you find the best coverage at competitive rates
+    Opens lazily, and reconnects once if the server dropped an idle
+    session. Not thread-safe: give each concurrent sender its own.
+    """
 
-    Our office hours:
-    Monday - Friday: 9am - 5pm
-    Saturday - Sunday: by appointment only
+    def __init__(self):
+        self.server = None
 
-    Contact Information:
-    Phone: 916-772-4006
-    Email: TEAM@ASIAINC.CO
-    Address: 3017 Douglas Blvd STE 140, Roseville, CA 95661
+    def _open(self):
+        self.server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        self.server.starttls()
+        self.server.login(SMTP_USER, SMTP_PASSWORD)
 
-    We look forward to serving you!
+    def send(self, to_email: str, message: str):
+        """Send one message, raising on failure"""
+        if not SMTP_USER or not SMTP_PASSWORD:
+            raise RuntimeError("Email configuration not set")
+        if self.server is None:
+            self._open()
+        try:
+            self.server.sendmail(FROM_EMAIL, to_email, message)
+        except smtplib.SMTPServerDisconnected:
+            self._open()
+            self.server.sendmail(FROM_EMAIL, to_email, message)
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+def send_template_email(to_email: str, template_name: str, context: dict):
+    """Render a template from the in-memory engine and send it"""
+    rendered = template_engine.render(template_name, context)
+    return send_raw_email(to_email, rendered.to_mime(to_email))
 
-    Best regards,
-    The A.S.I.A Inc Team
-    CA License #6009368
-    """
-    
-    return send_email(email, subject, body)
+def send_new_lead_notification(email: str, first_name: str, last_name: str):
+    """Send welcome email to new leads"""
+    return send_template_email(email, "new_lead_notification", {
+        "first_name": first_name,
+        "last_name": last_name
+    })
 
 def send_agent_new_lead_alert(agent_email: str, lead_name: str, lead_email: str, interests: list):
     """Send alert to agent about new lead assignment"""
-    subject = f"New Lead Assigned: {lead_name}"
-    
-    interests_text = ", ".join(interests) if interests else "Not specified"
-    
-    body = f"""
-    You have been assigned a new lead:
-
-    Name: {lead_name}
-    Email: {lead_email}
-    Interests: {interests_text}
-
-    Please log into the CRM to view full details and follow up with this lead.
-
-    CRM Dashboard: {config('FRONTEND_URL', default='http://localhost:5173')}/dashboard
-
-    Best regards,
-    A.S.I.A Inc CRM System
-    """
-    
-    return send_email(agent_email, subject, body)
+    return send_template_email(agent_email, "agent_new_lead_alert", {
+        "lead_name": lead_name,
+        "lead_email": lead_email,
+        "interests": interests or []
+    })
+
+def send_agent_assignment_summary(agent_email: str, agent_name: str, leads: list, total: int):
+    """Send one summary of several new lead assignments to an agent"""
+    return send_template_email(agent_email, "agent_assignment_summary", {
+        "agent_name": agent_name,
+        "leads": leads,
+        "total": total
+    })
 
 def send_follow_up_reminder(agent_email: str, agent_name: str, lead_name: str, lead_email: str):
     """Send follow-up reminder to agent"""
-    subject = f"Follow-up Reminder: {lead_name}"
-    
-    body = f"""
-    Hi {agent_name},
-
-    This is a reminder that you have a follow-up scheduled for:
-
-    Lead: {lead_name}
-    Email: {lead_email}
-
-    Please log into the CRM to view full details and update the lead status.
-
-    CRM Dashboard: {config('FRONTEND_URL', default='http://localhost:5173')}/dashboard
-
-    Best regards,
-    A.S.I.A Inc CRM System
-    """
-    
-    return send_email(agent_email, subject, body)
\ No newline at end of file
+    return send_template_email(agent_email, "follow_up_reminder", {
+        "agent_name": agent_name,
+        "lead_name": lead_name,
+        "lead_email": lead_email
+    })
+
+def send_follow_up_digest(agent_email: str, agent_name: str, leads: list, total: int):
+    """Send one digest of due follow-ups to an agent"""
+    return send_template_email(agent_email, "follow_up_digest", {
+        "agent_name": agent_name,
+        "leads": leads,
+        "total": total
+    })
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Follow-up reminder scheduler: one digest email per agent per sweep
+
+Runs inside the API process (see main.py) or standalone:
+    python followup_scheduler.py [--once]
+"""
+
+import argparse
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from decouple import config
+
+from database import connect_to_mongo, close_mongo_connection, get_collection, Collections
+from email_utils import send_follow_up_digest, send_follow_up_reminder
+from settings_service import settings, get_follow_up_statuses
+
+logger = logging.getLogger(__name__)
+
+FOLLOW_UP_SCHEDULER_ENABLED = config('FOLLOW_UP_SCHEDULER_ENABLED', default=True, cast=bool)
+
+# Seconds between sweeps
+FOLLOW_UP_SWEEP_INTERVAL = config('FOLLOW_UP_SWEEP_INTERVAL', default=900, cast=int)
+
+# How far back the very first sweep looks, so a new install does not mail
+# every historic overdue follow-up
+FOLLOW_UP_INITIAL_LOOKBACK_HOURS = config('FOLLOW_UP_INITIAL_LOOKBACK_HOURS', default=24, cast=int)
+
+# Sweeps that retry a lead whose reminder could not be sent before it is given up
+FOLLOW_UP_MAX_ATTEMPTS = config('FOLLOW_UP_MAX_ATTEMPTS', default=5, cast=int)
+
+# Leads read per round trip of the range scan
+FOLLOW_UP_BATCH_SIZE = 1000
+
+# Leads listed in one digest (the total is always reported)
+DIGEST_MAX_LEADS = 50
+
+STATE_ID = "follow_up_reminders"
+WORKER_ID = uuid.uuid4().hex
+
+
+async def _acquire_lease(now: datetime) -> Optional[dict]:
+    """Claim the sweep for this worker so several API processes never double-send"""
+    collection = get_collection(Collections.SCHEDULER_STATE)
+    await collection.update_one({"_id": STATE_ID}, {"$setOnInsert": {"high_water_mark": None}}, upsert=True)
+    # Free (or expired) lease, and no other worker swept within the interval
+    recent = now - timedelta(seconds=FOLLOW_UP_SWEEP_INTERVAL / 2)
+    return await collection.find_one_and_update(
+        {"_id": STATE_ID, "$and": [
+            {"$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lte": now}}]},
+            {"$or": [{"last_run_at": {"$exists": False}}, {"last_run_at": {"$lte": recent}}]}
+        ]},
+        {"$set": {"lease_until": now + timedelta(seconds=FOLLOW_UP_SWEEP_INTERVAL), "lease_owner": WORKER_ID}}
+    )
+
+
+async def sweep_follow_ups(now: Optional[datetime] = None) -> dict:
+    """Send digests for follow-ups that fell due since the last sweep.
+
+    Reads only leads whose `next_follow_up_date` lies between the stored
+    high-water mark and now, as a keyset-paged range scan on the
+    (`next_follow_up_date`, `_id`) index, so the cost depends on how many follow-ups
+    fell due in the window, not on the number of leads. Each lead is stamped
+    with the follow-up date it was reminded for, so a sweep that dies after
+    mailing but before advancing the mark does not remind anyone twice.
+    Leads whose digest failed to send, or whose agent is inactive or gone,
+    are left unstamped and the mark stops short of the earliest of them, so
+    the next sweep retries them. Each such lead counts its attempts for its
+    due date; after FOLLOW_UP_MAX_ATTEMPTS it is given up on and no longer
+    holds the mark back, so a permanently failing address cannot make every
+    sweep rescan a growing window.
+    """
+    now = now or datetime.now(timezone.utc)
+    state = await _acquire_lease(now)
+    if state is None:
+        return {"skipped": "Another worker is sweeping or swept recently"}
+
+    state_collection = get_collection(Collections.SCHEDULER_STATE)
+    leads_collection = get_collection(Collections.MAIN_DATA)
+    users_collection = get_collection(Collections.USERS)
+
+    since = state.get("high_water_mark") or now - timedelta(hours=FOLLOW_UP_INITIAL_LOOKBACK_HOURS)
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    base_filter = {
+        "status": {"$in": get_follow_up_statuses()},
+        "assigned_agent_id": {"$ne": None},
+        "deleted_at": {"$exists": False}
+    }
+    projection = {
+        "first_name": 1, "last_name": 1, "email": 1,
+        "assigned_agent_id": 1, "next_follow_up_date": 1, "follow_up_reminded_for": 1,
+        "follow_up_failed_for": 1, "follow_up_attempts": 1
+    }
+
+    # Per agent: total due and the first DIGEST_MAX_LEADS of them
+    digests: Dict = {}
+    reminded = []
+    position = None
+    while True:
+        if position is None:
+            date_range = {"next_follow_up_date": {"$gt": since, "$lte": now}}
+        else:
+            date_range = {"$or": [
+                {"next_follow_up_date": {"$gt": position[0], "$lte": now}},
+                {"next_follow_up_date": position[0], "_id": {"$gt": position[1]}}
+            ]}
+        batch = await leads_collection.find(
+            {**base_filter, **date_range}, projection
+        ).sort([("next_follow_up_date", 1), ("_id", 1)]).limit(FOLLOW_UP_BATCH_SIZE).to_list(length=FOLLOW_UP_BATCH_SIZE)
+        if not batch:
+            break
+        position = (batch[-1]["next_follow_up_date"], batch[-1]["_id"])
+
+        for lead in batch:
+            if lead.get("follow_up_reminded_for") == lead["next_follow_up_date"]:
+                continue
+            digest = digests.setdefault(lead["assigned_agent_id"], {"total": 0, "leads": []})
+            digest["total"] += 1
+            if len(digest["leads"]) < DIGEST_MAX_LEADS:
+                digest["leads"].append({
+                    "name": f"{lead.get('first_name', '')} {lead.get('last_name', '')}".strip(),
+                    "email": lead.get("email", ""),
+                    "due": lead["next_follow_up_date"]
+                })
+            reminded.append(lead)
+
+    sent = failed = 0
+    sent_agents = set()
+    if digests:
+        agents = await users_collection.find(
+            {"_id": {"$in": list(digests)}, "is_active": True},
+            {"email": 1, "full_name": 1}
+        ).to_list(length=None)
+        for agent in agents:
+            digest = digests[agent["_id"]]
+            name = agent.get("full_name", "there")
+            if digest["total"] == 1:
+                lead = digest["leads"][0]
+                ok = await asyncio.to_thread(send_follow_up_reminder, agent["email"], name, lead["name"], lead["email"])
+            else:
+                ok = await asyncio.to_thread(send_follow_up_digest, agent["email"], name, digest["leads"], digest["total"])
+            if ok:
+                sent += 1
+                sent_agents.add(agent["_id"])
+            else:
+                failed += 1
+
+    # Stamp what was reminded, grouped by due date; count an attempt on the
+    # rest and advance the mark up to (not past) the first one still retried
+    by_due: Dict[datetime, list] = {}
+    retry_by_due: Dict[datetime, list] = {}
+    high_water_mark = now
+    abandoned = 0
+    for lead in reminded:
+        due = lead["next_follow_up_date"]
+        if lead["assigned_agent_id"] in sent_agents:
+            by_due.setdefault(due, []).append(lead["_id"])
+            continue
+        retry_by_due.setdefault(due, []).append(lead["_id"])
+        attempts = lead.get("follow_up_attempts", 0) if lead.get("follow_up_failed_for") == due else 0
+        if attempts + 1 >= FOLLOW_UP_MAX_ATTEMPTS:
+            abandoned += 1
+            continue
+        due_at = due if due.tzinfo else due.replace(tzinfo=timezone.utc)
+        high_water_mark = min(high_water_mark, due_at - timedelta(milliseconds=1))
+    for due, lead_ids in by_due.items():
+        await leads_collection.update_many(
+            {"_id": {"$in": lead_ids}, "next_follow_up_date": due},
+            {"$set": {"follow_up_reminded_for": due}}
+        )
+    for due, lead_ids in retry_by_due.items():
+        await leads_collection.update_many(
+            {"_id": {"$in": lead_ids}, "next_follow_up_date": due, "follow_up_failed_for": due},
+            {"$inc": {"follow_up_attempts": 1}}
+        )
+        await leads_collection.update_many(
+            {"_id": {"$in": lead_ids}, "next_follow_up_date": due, "follow_up_failed_for": {"$ne": due}},
+            {"$set": {"follow_up_failed_for": due, "follow_up_attempts": 1}}
+        )
+
+    await state_collection.update_one(
+        {"_id": STATE_ID, "lease_owner": WORKER_ID},
+        {"$set": {"high_water_mark": high_water_mark, "last_run_at": datetime.now(timezone.utc)}, "$unset": {"lease_until": ""}}
+    )
+
+    result = {
+        "window_start": since,
+        "window_end": high_water_mark,
+        "leads": len(reminded),
+        "agents": len(digests),
+        "emails_sent": sent,
+        "emails_failed": failed,
+        "reminders_abandoned": abandoned
+    }
+    logger.info(f"Follow-up sweep: {result}")
+    return result
+
+
+async def run_follow_up_scheduler():
+    """Sweep forever at FOLLOW_UP_SWEEP_INTERVAL; errors are logged, not fatal"""
+    while True:
+        try:
+            await sweep_follow_ups()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Follow-up sweep failed: {e}")
+        await asyncio.sleep(FOLLOW_UP_SWEEP_INTERVAL)
+
+
+async def _main(once: bool):
+    await connect_to_mongo()
+    try:
+        if once:
+            await settings.load()
+            print(await sweep_follow_ups())
+        else:
+            # A long-running scheduler keeps following settings changes
+            await settings.start()
+            await run_follow_up_scheduler()
+    finally:
+        await settings.stop()
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send follow-up reminder digests")
+    parser.add_argument("--once", action="store_true", help="Run a single sweep and exit")
+    args = parser.parse_args()
+    asyncio.run(_main(args.once))
@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Percentile bands reported by the simulation
+BANDS = {"p10": 10, "p50": 50, "p90": 90}
+
+# Cells expecting at least this many wins and losses use the normal approximation
+NORMAL_APPROXIMATION_MIN_OUTCOMES = 5
+
+
+def _bands(samples: np.ndarray) -> Dict[str, np.ndarray]:
+    """P10/P50/P90 of simulated totals along the simulation axis"""
+    values = np.percentile(samples, list(BANDS.values()), axis=0)
+    return {name: values[i] for i, name in enumerate(BANDS)}
+
+
+def _simulate_cells(
+    rng: np.random.Generator,
+    n: np.ndarray,
+    p: np.ndarray,
+    mean: np.ndarray,
+    variance: np.ndarray,
+    simulations: int
+) -> np.ndarray:
+    """Simulated won revenue, shape (simulations, cells).
+
+    Small cells draw the number of wins K ~ Binomial(n, p) exactly and then
+    the revenue of a random K-subset from its normal approximation (mean
+    K*mu, variance K*sigma^2*(n-K)/(n-1)). Large cells skip the binomial
+    draw, which dominates the cost, and sample revenue from the normal
+    approximation of that same compound distribution.
+    """
+    revenue = np.empty((simulations, len(n)))
+    approximate = (n * p >= NORMAL_APPROXIMATION_MIN_OUTCOMES) & (n * (1 - p) >= NORMAL_APPROXIMATION_MIN_OUTCOMES)
+
+    if approximate.any():
+        na, pa, ma, va = n[approximate], p[approximate], mean[approximate], variance[approximate]
+        # Law of total variance over K: E[Var(S|K)] + Var(E[S|K])
+        expected = na * pa * ma
+        spread = np.sqrt(va * na * pa * (1 - pa) * na / np.maximum(na - 1, 1) + ma ** 2 * na * pa * (1 - pa))
+        draws = rng.standard_normal((simulations, len(na)))
+        draws *= spread
+        draws += expected
+        revenue[:, approximate] = draws
+
+    if not approximate.all():
+        exact = ~approximate
+        ne, me, ve = n[exact], mean[exact], variance[exact]
+        wins = rng.binomial(ne, p[exact], size=(simulations, len(ne)))
+        subset_variance = wins * ve * (ne - wins) / np.maximum(ne - 1, 1)
+        revenue[:, exact] = wins * me + np.sqrt(subset_variance) * rng.standard_normal(wins.shape)
+
+    np.maximum(revenue, 0.0, out=revenue)
+    return revenue
+
+
+def simulate_pipeline(
+    cells: List[dict],
+    probabilities: Dict[str, float],
+    simulations: int = 2000,
+    seed: Optional[int] = None
+) -> dict:
+    """Monte Carlo simulation of closed revenue for the open pipeline.
+
+    Each cell is one (status, agent, month) group with its lead count and the
+    sum and sum of squares of `estimated_value`. Working on cell moments keeps
+    the cost proportional to simulations x cells rather than simulations x
+    leads, and simulating cells jointly keeps the per-agent and per-month
+    rollups consistent with the total.
+
+    Returns expected value and P10/P50/P90 bands for the total, per agent and
+    per month.
+    """
+    if not cells:
+        empty = {"expected": 0.0, **{name: 0.0 for name in BANDS}}
+        return {"simulations": simulations, "total": empty, "by_agent": {}, "by_month": {}}
+
+    rng = np.random.default_rng(seed)
+
+    n = np.array([cell["count"] for cell in cells], dtype=np.int64)
+    p = np.array([probabilities.get(cell["status"], 0.0) for cell in cells])
+    total = np.array([cell["total_value"] for cell in cells], dtype=np.float64)
+    total_sq = np.array([cell["total_value_sq"] for cell in cells], dtype=np.float64)
+
+    mean = total / n
+    variance = np.maximum(total_sq / n - mean ** 2, 0.0)
+
+    revenue = _simulate_cells(rng, n, p, mean, variance, simulations)
+
+    def summarize(samples: np.ndarray, labels: List) -> Dict:
+        bands = _bands(samples)
+        expected = samples.mean(axis=0)
+        return {
+            label: {"expected": float(expected[i]), **{name: float(values[i]) for name, values in bands.items()}}
+            for i, label in enumerate(labels)
+        }
+
+    def rollup(key: str) -> Dict[str, Dict[str, float]]:
+        labels = sorted({cell[key] for cell in cells}, key=str)
+        index = {label: i for i, label in enumerate(labels)}
+        membership = np.zeros((len(cells), len(labels)))
+        membership[np.arange(len(cells)), [index[cell[key]] for cell in cells]] = 1.0
+        return summarize(revenue @ membership, labels)
+
+    totals = revenue.sum(axis=1, keepdims=True)
+    return {
+        "simulations": simulations,
+        "total": summarize(totals, ["total"])["total"],
+        "by_agent": rollup("agent_id"),
+        "by_month": rollup("month")
+    }
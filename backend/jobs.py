@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+from decouple import config
+from pymongo import ReturnDocument
+
+from database import get_collection, Collections
+import models
+
+logger = logging.getLogger(__name__)
+
+# Seconds a job's lease lasts without renewal; another process may resume the job once it lapses
+JOB_LEASE_SECONDS = config('JOB_LEASE_SECONDS', default=60, cast=int)
+
+# Holder of the leases on the jobs this process runs
+WORKER_ID = uuid.uuid4().hex
+
+# Registered job handlers by job type
+JOB_HANDLERS: Dict[str, Callable[["JobContext"], Awaitable[Optional[dict]]]] = {}
+
+# Strong references to running tasks so they are not garbage collected
+_running_tasks: Dict[ObjectId, asyncio.Task] = {}
+
+
+def register_job(job_type: str):
+    """Register an async handler for a job type.
+
+    Handlers receive a `JobContext` and may return a result dict. They must be
+    idempotent: jobs interrupted by a restart are run again from the start.
+    """
+    def decorator(handler):
+        JOB_HANDLERS[job_type] = handler
+        return handler
+    return decorator
+
+
+class JobContext:
+    """Handle passed to a running job for reading params and reporting progress"""
+
+    def __init__(self, job_id: ObjectId, params: dict):
+        self.id = job_id
+        self.params = params
+
+    async def progress(self, processed: int, total: Optional[int] = None, **details):
+        """Persist progress so it can be polled through the jobs API"""
+        update = {"progress.processed": processed, "updated_at": datetime.now(timezone.utc)}
+        if total is not None:
+            update["progress.total"] = total
+        for key, value in details.items():
+            update[f"progress.{key}"] = value
+        await get_collection(Collections.JOBS).update_one({"_id": self.id}, {"$set": update})
+
+
+async def enqueue_job(
+    job_type: str,
+    params: dict,
+    user_id: Optional[ObjectId] = None,
+    job_id: Optional[ObjectId] = None
+) -> ObjectId:
+    """Persist a job and start it in the background; returns the job id.
+
+    Callers that must hand out the id before the job exists can pass `job_id`.
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    now = datetime.now(timezone.utc)
+    job = {
+        "_id": job_id or ObjectId(),
+        "job_type": job_type,
+        "status": models.JobStatus.QUEUED.value,
+        "params": params,
+        "progress": {"processed": 0, "total": None},
+        "result": None,
+        "error": None,
+        "created_by": user_id,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "lease_owner": WORKER_ID,
+        "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)
+    }
+    await get_collection(Collections.JOBS).insert_one(job)
+    _start(job)
+    return job["_id"]
+
+
+def _start(job: dict):
+    task = asyncio.create_task(_run_job(job["_id"], job["job_type"], job["params"]))
+    _running_tasks[job["_id"]] = task
+    task.add_done_callback(lambda _: _running_tasks.pop(job["_id"], None))
+
+
+async def _renew_lease(job_id: ObjectId):
+    collection = get_collection(Collections.JOBS)
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            await collection.update_one(
+                {"_id": job_id, "lease_owner": WORKER_ID},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+        except Exception as e:
+            logger.error(f"Renewing the lease on job {job_id} failed: {e}")
+
+
+async def _run_job(job_id: ObjectId, job_type: str, params: dict):
+    collection = get_collection(Collections.JOBS)
+    await collection.update_one(
+        {"_id": job_id, "lease_owner": WORKER_ID},
+        {"$set": {
+            "status": models.JobStatus.RUNNING.value,
+            "started_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc)
+        }}
+    )
+
+    renewer = asyncio.create_task(_renew_lease(job_id))
+    try:
+        result = await JOB_HANDLERS[job_type](JobContext(job_id, params))
+        update = {"status": models.JobStatus.COMPLETED.value, "result": result}
+    except asyncio.CancelledError:
+        # Shutdown: leave the job running and give up the lease so the next start resumes it at once
+        await collection.update_one({"_id": job_id, "lease_owner": WORKER_ID}, {"$unset": {"lease_until": ""}})
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        update = {"status": models.JobStatus.FAILED.value, "error": str(e)}
+    finally:
+        renewer.cancel()
+
+    now = datetime.now(timezone.utc)
+    await collection.update_one(
+        {"_id": job_id, "lease_owner": WORKER_ID},
+        {"$set": {**update, "finished_at": now, "updated_at": now}, "$unset": {"lease_until": ""}}
+    )
+
+
+async def resume_jobs() -> int:
+    """Restart jobs left queued or running by a process that stopped or died.
+
+    A job is only taken over once its lease has lapsed, and taking the
+    lease is a single conditional update, so with several API processes
+    exactly one of them resumes each job.
+    """
+    collection = get_collection(Collections.JOBS)
+    resumable = {
+        "status": {"$in": [models.JobStatus.QUEUED.value, models.JobStatus.RUNNING.value]},
+        "job_type": {"$in": list(JOB_HANDLERS)}
+    }
+    resumed = 0
+    async for job in collection.find(resumable, {"_id": 1}):
+        if job["_id"] in _running_tasks:
+            continue
+        now = datetime.now(timezone.utc)
+        job = await collection.find_one_and_update(
+            {
+                **resumable,
+                "_id": job["_id"],
+                "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lte": now}}]
+            },
+            {"$set": {"lease_owner": WORKER_ID, "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            _start(job)
+            resumed += 1
+    return resumed
+
+
+async def run_job_resumer():
+    """Resume orphaned jobs forever, once per lease period; errors are logged, not fatal"""
+    while True:
+        try:
+            resumed = await resume_jobs()
+            if resumed:
+                logger.info(f"Resumed {resumed} job(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job resume sweep failed: {e}")
+        await asyncio.sleep(JOB_LEASE_SECONDS)
+
+
+async def cancel_running_jobs():
+    """Cancel in-process jobs on shutdown (they resume on the next start)"""
+    tasks = list(_running_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,205 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import get_collection, Collections
+import models
+import schemas
+from activity_utils import is_contact_activity, status_value, build_status_change_activity, restamp_lead_activities
+from assignment_alerts import assignment_alerts, ALERT_LEAD_FIELDS
+
+# Leads read, written and audited per bulk_write round trip
+BULK_CHUNK_SIZE = 1000
+
+# Lead fields needed to compute changes and audit entries
+BULK_PROJECTION = {
+    "status": 1, "assigned_agent_id": 1, "priority": 1, "next_follow_up_date": 1,
+    **{field: 1 for field in ALERT_LEAD_FIELDS}
+}
+
+
+def _note_activity(lead: dict, user_id: ObjectId, agent_id: Optional[ObjectId], title: str, description: str, now: datetime) -> dict:
+    return {
+        "lead_id": lead["_id"],
+        "user_id": user_id,
+        "assigned_agent_id": agent_id,
+        "activity_type": models.ActivityType.NOTE.value,
+        "title": title,
+        "description": description,
+        "created_at": now
+    }
+
+
+def _plan_chunk(
+    leads: List[dict],
+    request: schemas.BulkLeadRequest,
+    current_user: dict,
+    agent: Optional[dict],
+    now: datetime
+) -> Tuple[List[UpdateOne], List[ObjectId], List[dict], List[ObjectId]]:
+    """Work out the writes for one chunk of leads.
+
+    Returns the lead updates, the lead id owning each update (to map bulk
+    write errors back to items), the activities to insert and the ids of
+    leads left unchanged.
+    """
+    operations, owners, activities, unchanged = [], [], [], []
+    user_id = current_user["_id"]
+    operation = request.operation
+
+    for lead in leads:
+        lead_id = lead["_id"]
+        owner = lead.get("assigned_agent_id")
+        updates = []
+
+        if operation == models.BulkLeadOperation.SET_STATUS:
+            new_status = status_value(request.status)
+            if status_value(lead.get("status")) != new_status:
+                updates.append(UpdateOne({"_id": lead_id}, {"$set": {
+                    "status": new_status, "last_contact_date": now, "updated_at": now
+                }}))
+                activity = build_status_change_activity(lead_id, user_id, lead.get("status"), new_status, assigned_agent_id=owner)
+                activity["created_at"] = now
+                activities.append(activity)
+
+        elif operation == models.BulkLeadOperation.ASSIGN_AGENT:
+            if owner != agent["_id"]:
+                updates.append(UpdateOne({"_id": lead_id}, {"$set": {"assigned_agent_id": agent["_id"], "updated_at": now}}))
+                activities.append(_note_activity(
+                    lead, user_id, agent["_id"], "Lead Assigned",
+                    f"Lead assigned to {agent.get('full_name', 'Unknown')}", now
+                ))
+
+        elif operation == models.BulkLeadOperation.SET_PRIORITY:
+            if lead.get("priority") != request.priority:
+                updates.append(UpdateOne({"_id": lead_id}, {"$set": {"priority": request.priority, "updated_at": now}}))
+                activities.append(_note_activity(
+                    lead, user_id, owner, "Priority Changed",
+                    f"Priority changed from {lead.get('priority')} to {request.priority}", now
+                ))
+
+        elif operation == models.BulkLeadOperation.SET_FOLLOW_UP_DATE:
+            if lead.get("next_follow_up_date") != request.next_follow_up_date:
+                updates.append(UpdateOne({"_id": lead_id}, {"$set": {
+                    "next_follow_up_date": request.next_follow_up_date, "updated_at": now
+                }}))
+                activities.append(_note_activity(
+                    lead, user_id, owner, "Follow-up Scheduled",
+                    f"Follow-up scheduled for {request.next_follow_up_date.isoformat()}", now
+                ))
+
+        elif operation == models.BulkLeadOperation.ADD_ACTIVITY:
+            activity = request.activity.dict()
+            activity.update({
+                "_id": ObjectId(),
+                "lead_id": lead_id,
+                "user_id": user_id,
+                "assigned_agent_id": owner,
+                "created_at": now
+            })
+            activities.append(activity)
+            updates.append(UpdateOne({"_id": lead_id}, {"$set": {"last_contact_date": now}}))
+            # Same conditional stamp as record_first_contact, batched
+            if is_contact_activity(activity["activity_type"]):
+                updates.append(UpdateOne(
+                    {"_id": lead_id, "first_contact_at": {"$exists": False}},
+                    {"$set": {"first_contact_at": now, "first_contact_activity_id": activity["_id"]}}
+                ))
+
+        if not updates:
+            unchanged.append(lead_id)
+            continue
+        operations.extend(updates)
+        owners.extend([lead_id] * len(updates))
+
+    return operations, owners, activities, unchanged
+
+
+async def _write_chunk(leads: List[dict], request: schemas.BulkLeadRequest, current_user: dict, agent: Optional[dict]) -> Dict[ObjectId, dict]:
+    """Apply the operation to one chunk and return a result per lead id"""
+    collection = get_collection(Collections.MAIN_DATA)
+    activities_collection = get_collection(Collections.ACTIVITIES)
+    now = datetime.now(timezone.utc)
+
+    operations, owners, activities, unchanged = _plan_chunk(leads, request, current_user, agent, now)
+    results = {lead_id: {"result": "unchanged"} for lead_id in unchanged}
+    changed = list(dict.fromkeys(owners))
+
+    failed = {}
+    if operations:
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed[owners[error["index"]]] = error.get("errmsg", "Write failed")
+
+    for lead_id in changed:
+        if lead_id in failed:
+            results[lead_id] = {"result": "failed", "error": failed[lead_id]}
+        else:
+            results[lead_id] = {"result": "updated"}
+
+    # Only audit leads whose write went through
+    activities = [activity for activity in activities if activity["lead_id"] not in failed]
+    if activities:
+        await activities_collection.insert_many(activities, ordered=False)
+
+    if request.operation == models.BulkLeadOperation.ASSIGN_AGENT:
+        await restamp_lead_activities([lead_id for lead_id in changed if lead_id not in failed], agent["_id"])
+        for lead in leads:
+            if results.get(lead["_id"], {}).get("result") == "updated":
+                assignment_alerts.emit(agent["_id"], lead)
+
+    return results
+
+
+async def run_bulk_operation(
+    query_filter: dict,
+    request: schemas.BulkLeadRequest,
+    current_user: dict,
+    agent: Optional[dict] = None,
+    requested_ids: Optional[List[str]] = None,
+    chunk_size: int = BULK_CHUNK_SIZE
+) -> dict:
+    """Apply a bulk operation to every lead matching `query_filter`.
+
+    Leads are read off one projected cursor and processed a chunk at a time
+    with a single unordered `bulk_write` for the lead updates and a single
+    `insert_many` for the audit activities, so the cost is a few round trips
+    per thousand leads. Permissions are enforced by `query_filter` itself;
+    requested ids that it does not match are reported as `not_found`.
+    """
+    collection = get_collection(Collections.MAIN_DATA)
+    results: Dict[ObjectId, dict] = {}
+
+    cursor = collection.find(query_filter, BULK_PROJECTION).batch_size(chunk_size)
+    chunk = []
+    async for lead in cursor:
+        chunk.append(lead)
+        if len(chunk) >= chunk_size:
+            results.update(await _write_chunk(chunk, request, current_user, agent))
+            chunk = []
+    if chunk:
+        results.update(await _write_chunk(chunk, request, current_user, agent))
+
+    items = [{"id": str(lead_id), **result} for lead_id, result in results.items()]
+    for raw_id in requested_ids or []:
+        if not ObjectId.is_valid(raw_id):
+            items.append({"id": raw_id, "result": "invalid_id"})
+        elif ObjectId(raw_id) not in results:
+            items.append({"id": raw_id, "result": "not_found", "error": "Lead not found or not permitted"})
+
+    counts = {"updated": 0, "unchanged": 0, "failed": 0}
+    for item in items:
+        if item["result"] in counts:
+            counts[item["result"]] += 1
+
+    return {
+        "operation": request.operation,
+        "matched": len(results),
+        **counts,
+        "results": items
+    }
@@ -0,0 +1,176 @@
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, List
+
+import aiofiles
+from bson import ObjectId
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from database import get_collection, Collections
+
+# Lead columns written to exports, in order
+LEAD_EXPORT_FIELDS = [
+    "_id", "first_name", "last_name", "email", "phone_number",
+    "address_line1", "address_line2", "city", "state", "zip_code", "country",
+    "personal_lines", "commercial_lines", "life_and_health",
+    "status", "source", "priority", "estimated_value", "assigned_agent_id",
+    "last_contact_date", "next_follow_up_date", "created_at", "updated_at",
+]
+
+# Activity columns appended when activities are joined
+ACTIVITY_EXPORT_FIELDS = ["activity_type", "title", "description", "outcome", "created_at"]
+
+# Documents per cursor batch and CSV rows per yielded chunk
+EXPORT_BATCH_SIZE = 1000
+
+# Bytes per chunk when streaming a finished file from disk
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Leading characters that make Excel and Sheets read a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def export_headers(include_activities: bool) -> List[str]:
+    headers = list(LEAD_EXPORT_FIELDS)
+    if include_activities:
+        headers += [f"activity_{field}" for field in ACTIVITY_EXPORT_FIELDS]
+    return headers
+
+
+def _cell(value, xlsx: bool = False):
+    """Flatten a BSON value into a spreadsheet cell.
+
+    Lead fields come from the public form, so text that a spreadsheet would
+    evaluate as a formula is quoted, and for XLSX the control characters
+    openpyxl refuses are dropped.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str):
+        if xlsx:
+            value = ILLEGAL_CHARACTERS_RE.sub("", value)
+        if value.startswith(FORMULA_PREFIXES):
+            value = "'" + value
+    return value
+
+
+def _export_cursor(query_filter: dict, include_activities: bool):
+    """Projected cursor over matching leads, one row per lead or per activity"""
+    collection = get_collection(Collections.MAIN_DATA)
+    projection = {field: 1 for field in LEAD_EXPORT_FIELDS}
+
+    if not include_activities:
+        return collection.find(query_filter, projection).sort("created_at", -1).batch_size(EXPORT_BATCH_SIZE)
+
+    pipeline = [
+        {"$match": query_filter},
+        {"$sort": {"created_at": -1}},
+        {"$project": projection},
+        {
+            "$lookup": {
+                "from": Collections.ACTIVITIES,
+                "localField": "_id",
+                "foreignField": "lead_id",
+                "pipeline": [
+                    {"$sort": {"created_at": -1}},
+                    {"$project": {field: 1 for field in ACTIVITY_EXPORT_FIELDS}}
+                ],
+                "as": "activity"
+            }
+        },
+        # One row per activity; leads without activities still get a row
+        {"$unwind": {"path": "$activity", "preserveNullAndEmptyArrays": True}}
+    ]
+    return collection.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE)
+
+
+async def iter_export_rows(query_filter: dict, include_activities: bool, xlsx: bool = False) -> AsyncIterator[list]:
+    """Yield export rows (without the header) straight off the cursor"""
+    async for doc in _export_cursor(query_filter, include_activities):
+        row = [_cell(doc.get(field), xlsx) for field in LEAD_EXPORT_FIELDS]
+        if include_activities:
+            activity = doc.get("activity") or {}
+            row += [_cell(activity.get(field), xlsx) for field in ACTIVITY_EXPORT_FIELDS]
+        yield row
+
+
+async def stream_csv(query_filter: dict, include_activities: bool) -> AsyncIterator[str]:
+    """Stream CSV text; the header goes out before the first database round trip"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(export_headers(include_activities))
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    async for row in iter_export_rows(query_filter, include_activities):
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if pending:
+        yield buffer.getvalue()
+
+
+def _append_rows(worksheet, rows: List[list]):
+    for row in rows:
+        worksheet.append(row)
+
+
+async def write_xlsx(query_filter: dict, include_activities: bool) -> str:
+    """Write an XLSX export to a temporary file and return its path.
+
+    Unlike CSV, an XLSX file is a zip archive that cannot be sent until it
+    is complete, so the whole sheet is built before the response starts.
+    Uses openpyxl's write-only mode, which spills rows to disk as they are
+    appended, so memory stays flat regardless of the row count. Rows are
+    read from the cursor on the event loop and appended (serialized and
+    written) a batch at a time in a worker thread, as is the final save.
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Leads")
+    worksheet.append(export_headers(include_activities))
+
+    batch = []
+    async for row in iter_export_rows(query_filter, include_activities, xlsx=True):
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            await asyncio.to_thread(_append_rows, worksheet, batch)
+            batch = []
+    if batch:
+        await asyncio.to_thread(_append_rows, worksheet, batch)
+
+    handle, path = tempfile.mkstemp(prefix="leads-export-", suffix=".xlsx")
+    os.close(handle)
+    # Zipping the sheet is CPU/disk bound; keep it off the event loop
+    await asyncio.to_thread(workbook.save, path)
+    return path
+
+
+async def stream_file(path: str, delete: bool = True) -> AsyncIterator[bytes]:
+    """Stream a file from disk with async I/O, removing it afterwards"""
+    try:
+        async with aiofiles.open(path, "rb") as export_file:
+            while True:
+                chunk = await export_file.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if delete:
+            await asyncio.to_thread(os.remove, path)
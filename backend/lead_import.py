@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Bulk lead import from CSV or XLSX spreadsheets
+
+Usage:
+    python lead_import.py leads.csv [--source referral] [--chunk-size 1000]
+"""
+
+import argparse
+import asyncio
+import codecs
+import csv
+import re
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional
+
+from bson import ObjectId
+from openpyxl import load_workbook
+from pydantic import ValidationError
+from pymongo import UpdateOne
+
+from database import connect_to_mongo, close_mongo_connection, get_collection, Collections
+import models
+import schemas
+from lead_utils import lead_form_fields
+from dedupe import blocking_keys, email_key, normalize_email
+
+# Rows validated and written per bulk_write round trip
+IMPORT_CHUNK_SIZE = 1000
+
+# Error rows echoed back in the report (the count is always exact)
+MAX_REPORTED_ERRORS = 500
+
+# Extra header spellings seen in carrier/agency exports
+HEADER_ALIASES = {
+    "first": "firstName",
+    "last": "lastName",
+    "emailaddress": "email",
+    "phone": "phoneNumber",
+    "phonenumber": "phoneNumber",
+    "address": "addressLine1",
+    "address1": "addressLine1",
+    "street": "addressLine1",
+    "address2": "addressLine2",
+    "zip": "zipCode",
+    "zipcode": "zipCode",
+    "postalcode": "zipCode",
+    "personal": "personalLines",
+    "commercial": "commercialLines",
+    "lifehealth": "lifeAndHealth",
+    "lifeandhealth": "lifeAndHealth",
+}
+
+BOOLEAN_FIELDS = {"personalLines", "commercialLines", "lifeAndHealth"}
+TRUE_VALUES = {"1", "true", "yes", "y", "x"}
+
+
+def _normalize_header(header: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(header or "").lower())
+
+
+# Every LeadCreate field, matched case- and punctuation-insensitively
+FIELD_BY_HEADER = {_normalize_header(name): name for name in schemas.LeadCreate.model_fields}
+FIELD_BY_HEADER.update(HEADER_ALIASES)
+
+
+def map_headers(headers: List[str]) -> List[Optional[str]]:
+    """Map spreadsheet headers onto LeadCreate field names (None = ignored)"""
+    return [FIELD_BY_HEADER.get(_normalize_header(header)) for header in headers]
+
+
+def _clean_row(fields: List[Optional[str]], values) -> dict:
+    row = {}
+    for field, value in zip(fields, values):
+        if field is None or value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                continue
+        if field in BOOLEAN_FIELDS:
+            value = value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
+        elif not isinstance(value, str):
+            value = str(value)
+        row[field] = value
+    return row
+
+
+def iter_csv_rows(binary_file) -> Iterator[dict]:
+    """Stream rows from a CSV file object opened in binary mode"""
+    reader = csv.reader(codecs.iterdecode(binary_file, "utf-8-sig"))
+    headers = next(reader, None)
+    if headers is None:
+        return
+    fields = map_headers(headers)
+    for values in reader:
+        yield _clean_row(fields, values)
+
+
+def iter_xlsx_rows(binary_file) -> Iterator[dict]:
+    """Stream rows from the first sheet of an XLSX file in read-only mode"""
+    workbook = load_workbook(binary_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        fields = map_headers(headers)
+        for values in rows:
+            yield _clean_row(fields, values)
+    finally:
+        workbook.close()
+
+
+def iter_rows(binary_file, filename: str) -> Iterator[dict]:
+    """Pick the reader from the file extension"""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_rows(binary_file)
+    return iter_csv_rows(binary_file)
+
+
+def _take(rows: Iterator[dict], size: int) -> List[dict]:
+    return list(islice(rows, size))
+
+
+async def _write_chunk(valid: Dict[str, schemas.LeadCreate], source_label: str, user_id: Optional[ObjectId]) -> tuple:
+    """Upsert one chunk of validated leads (keyed by normalized email) and log activities.
+
+    A row updates the live lead whose normalized email matches, whatever
+    case it was stored in; soft-deleted leads are never revived.
+    """
+    collection = get_collection(Collections.MAIN_DATA)
+    activities_collection = get_collection(Collections.ACTIVITIES)
+    now = datetime.now(timezone.utc)
+
+    emails = list(valid)
+    operations = []
+    for email in emails:
+        lead = valid[email]
+        fields = lead_form_fields(lead)
+        operations.append(UpdateOne(
+            {"dedupe_keys": email_key(email), "deleted_at": {"$exists": False}},
+            {
+                "$set": {**fields, "dedupe_keys": blocking_keys(fields), "updated_at": now},
+                "$setOnInsert": {
+                    "_id": ObjectId(),
+                    "source": lead.source.value,
+                    "status": models.LeadStatus.NEW.value,
+                    "created_at": now,
+                    "priority": 3,  # Default priority
+                    "notes": ""
+                }
+            },
+            upsert=True
+        ))
+
+    result = await collection.bulk_write(operations, ordered=False)
+
+    # Resolve ids (and owners) of leads that already existed in one query
+    upserted = {emails[index]: lead_id for index, lead_id in result.upserted_ids.items()}
+    existing = {}
+    matched_emails = [email for email in emails if email not in upserted]
+    if matched_emails:
+        cursor = collection.find(
+            {"dedupe_keys": {"$in": [email_key(email) for email in matched_emails]}, "deleted_at": {"$exists": False}},
+            {"email": 1, "assigned_agent_id": 1}
+        )
+        async for doc in cursor:
+            existing[normalize_email(doc["email"])] = doc
+
+    activities = []
+    for email in emails:
+        if email in upserted:
+            lead_id, agent_id = upserted[email], None
+            title, description = "Lead Imported", f"Lead created by import of {source_label}"
+        elif email in existing:
+            lead_id, agent_id = existing[email]["_id"], existing[email].get("assigned_agent_id")
+            title, description = "Lead Updated", f"Lead updated by import of {source_label}"
+        else:
+            continue
+        activities.append({
+            "lead_id": lead_id,
+            "user_id": user_id,
+            "assigned_agent_id": agent_id,
+            "activity_type": models.ActivityType.NOTE.value,
+            "title": title,
+            "description": description,
+            "created_at": now
+        })
+    if activities:
+        await activities_collection.insert_many(activities, ordered=False)
+
+    return len(upserted), len(existing)
+
+
+async def import_leads(
+    rows: Iterator[dict],
+    source_label: str,
+    default_source: Optional[models.LeadSource] = None,
+    user_id: Optional[ObjectId] = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    on_progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """Validate and upsert spreadsheet rows in chunks.
+
+    Rows are validated against `schemas.LeadCreate`, deduplicated by
+    normalized email (within a chunk the last row wins, across chunks the
+    upsert merges), and written with one unordered `bulk_write` plus one `insert_many` of
+    activities per chunk. Parsing runs in a worker thread so large files
+    never block the event loop.
+    """
+    started = time.monotonic()
+    report = {
+        "processed": 0,
+        "created": 0,
+        "updated": 0,
+        "duplicates_in_file": 0,
+        "failed": 0,
+        "errors": [],
+        "elapsed_seconds": 0.0,
+        "rows_per_second": 0.0
+    }
+    row_number = 1  # Header row
+
+    while True:
+        chunk = await asyncio.to_thread(_take, rows, chunk_size)
+        if not chunk:
+            break
+
+        valid: Dict[str, schemas.LeadCreate] = {}
+        for row in chunk:
+            row_number += 1
+            if default_source and "source" not in row:
+                row["source"] = default_source
+            try:
+                lead = schemas.LeadCreate(**row)
+            except ValidationError as e:
+                report["failed"] += 1
+                if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                    report["errors"].append({
+                        "row": row_number,
+                        "email": row.get("email"),
+                        "error": "; ".join(
+                            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                            for error in e.errors()
+                        )
+                    })
+                continue
+            email = normalize_email(lead.email)
+            if email in valid:
+                report["duplicates_in_file"] += 1
+            valid[email] = lead
+
+        if valid:
+            created, updated = await _write_chunk(valid, source_label, user_id)
+            report["created"] += created
+            report["updated"] += updated
+
+        report["processed"] += len(chunk)
+        elapsed = time.monotonic() - started
+        report["elapsed_seconds"] = round(elapsed, 2)
+        report["rows_per_second"] = round(report["processed"] / elapsed, 1) if elapsed > 0 else 0.0
+        if on_progress:
+            on_progress(report)
+
+    return report
+
+
+async def _main(path: str, source: Optional[str], chunk_size: int):
+    def print_progress(report):
+        print(
+            f"{report['processed']} rows | {report['created']} created | {report['updated']} updated | "
+            f"{report['failed']} failed | {report['rows_per_second']} rows/s"
+        )
+
+    await connect_to_mongo()
+    try:
+        with open(path, "rb") as binary_file:
+            report = await import_leads(
+                iter_rows(binary_file, path),
+                source_label=path,
+                default_source=models.LeadSource(source) if source else None,
+                chunk_size=chunk_size,
+                on_progress=print_progress
+            )
+    finally:
+        await close_mongo_connection()
+
+    for error in report["errors"]:
+        print(f"Row {error['row']}: {error['error']}")
+    print(f"Done in {report['elapsed_seconds']}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import leads from a CSV or XLSX file")
+    parser.add_argument("path")
+    parser.add_argument("--source", choices=[source.value for source in models.LeadSource])
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    asyncio.run(_main(args.path, args.source, args.chunk_size))
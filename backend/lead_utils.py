@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+from bson import ObjectId
+
+import models
+import schemas
+from dedupe import blocking_keys
+
+
+def lead_form_fields(lead: schemas.LeadCreate) -> dict:
+    """Map the camelCase form payload onto the snake_case lead layout"""
+    lead_data = lead.dict()
+    return {
+        "first_name": lead_data.get("firstName"),
+        "last_name": lead_data.get("lastName"),
+        "email": lead_data.get("email"),
+        "phone_number": lead_data.get("phoneNumber"),
+        "country": lead_data.get("country", "United States"),
+        "address_line1": lead_data.get("addressLine1"),
+        "address_line2": lead_data.get("addressLine2", ""),
+        "city": lead_data.get("city"),
+        "state": lead_data.get("state"),
+        "zip_code": lead_data.get("zipCode"),
+        "personal_lines": lead_data.get("personalLines", False),
+        "commercial_lines": lead_data.get("commercialLines", False),
+        "life_and_health": lead_data.get("lifeAndHealth", False),
+    }
+
+
+def build_lead_document(lead: schemas.LeadCreate) -> dict:
+    """Build the MongoDB document for a brand new lead"""
+    now = datetime.now(timezone.utc)
+    fields = lead_form_fields(lead)
+    return {
+        "_id": ObjectId(),
+        **fields,
+        "dedupe_keys": blocking_keys(fields),
+        "source": lead.source.value if hasattr(lead.source, "value") else lead.source,
+        "status": models.LeadStatus.NEW.value,
+        "created_at": now,
+        "updated_at": now,
+        "priority": 3,  # Default priority
+        "notes": ""
+    }
+
+
+def lead_interests(lead: schemas.LeadCreate) -> List[str]:
+    """Human readable insurance interests from the form checkboxes"""
+    interests = []
+    if lead.personalLines:
+        interests.append("Personal Lines")
+    if lead.commercialLines:
+        interests.append("Commercial Lines")
+    if lead.lifeAndHealth:
+        interests.append("Life & Health")
+    return interests
+
+
+def build_lead_filter(
+    current_user: dict,
+    status: Optional[models.LeadStatus] = None,
+    source: Optional[models.LeadSource] = None,
+    assigned_agent_id: Optional[str] = None,
+    priority: Optional[int] = None,
+    search: Optional[str] = None,
+    full_access_roles: tuple = (models.UserRole.ADMIN.value,)
+) -> dict:
+    """Build the lead query filter shared by the list, export and bulk endpoints.
+
+    Users whose role is not in `full_access_roles` are restricted to the
+    leads assigned to them.
+    """
+    # Soft-deleted leads are hidden until their purge job removes them
+    query_filter = {"deleted_at": {"$exists": False}}
+    
+    if status:
+        query_filter["status"] = status
+    if source:
+        query_filter["source"] = source
+    if assigned_agent_id and ObjectId.is_valid(assigned_agent_id):
+        query_filter["assigned_agent_id"] = ObjectId(assigned_agent_id)
+    if priority:
+        query_filter["priority"] = priority
+    
+    # Search functionality
+    if search:
+        query_filter["$or"] = [
+            {"first_name": {"$regex": search, "$options": "i"}},
+            {"last_name": {"$regex": search, "$options": "i"}},
+            {"email": {"$regex": search, "$options": "i"}},
+            {"phone_number": {"$regex": search, "$options": "i"}},
+            {"city": {"$regex": search, "$options": "i"}}
+        ]
+    
+    # If user is not admin, only show their assigned leads
+    if current_user.get("role") not in full_access_roles:
+        query_filter["assigned_agent_id"] = current_user["_id"]
+    
+    return query_filter
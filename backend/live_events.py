@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from decouple import config
+
+import models
+from activity_utils import status_value
+
+logger = logging.getLogger(__name__)
+
+# Redis relaying events between API worker processes; unset keeps them in-process
+REDIS_URL = config('REDIS_URL', default='')
+
+# Seconds counter deltas are coalesced before being pushed
+LIVE_EVENTS_FLUSH_INTERVAL = config('LIVE_EVENTS_FLUSH_INTERVAL', default=1.0, cast=float)
+
+# Messages buffered per client; a client further behind is told to resync instead
+LIVE_EVENTS_QUEUE_SIZE = config('LIVE_EVENTS_QUEUE_SIZE', default=256, cast=int)
+
+# Seconds between keepalive comments on an idle stream
+LIVE_EVENTS_HEARTBEAT = 15
+
+# Reconnect delay suggested to EventSource clients, in milliseconds
+LIVE_EVENTS_RETRY_MS = 3000
+
+# Messages written to a client in one chunk when it has a backlog
+LIVE_EVENTS_MAX_BATCH = 50
+
+LIVE_EVENTS_CHANNEL = "crm:live-events"
+
+# Scope of managers and admins; agents are scoped by their user id
+ALL_SCOPE = "*"
+
+# /dashboard/stats counters per lead status
+STATUS_COUNTERS = {
+    models.LeadStatus.NEW.value: "new_leads",
+    models.LeadStatus.QUALIFIED.value: "qualified_leads",
+    models.LeadStatus.CLOSED_WON.value: "closed_won",
+    models.LeadStatus.CLOSED_LOST.value: "closed_lost",
+}
+
+
+def user_scope(user: dict) -> str:
+    """Scope of the events a user receives: everything, or their own leads"""
+    if user.get("role") in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
+        return ALL_SCOPE
+    return str(user["_id"])
+
+
+def lead_scopes(*leads: Optional[dict]) -> list:
+    scopes = [ALL_SCOPE]
+    for lead in leads:
+        agent_id = lead.get("assigned_agent_id") if lead else None
+        if agent_id and str(agent_id) not in scopes:
+            scopes.append(str(agent_id))
+    return scopes
+
+
+def lead_counters(lead: dict, now: datetime) -> Dict[str, float]:
+    """A lead's contribution to the /dashboard/stats counters"""
+    counters = {"total_leads": 1, "total_estimated_value": lead.get("estimated_value") or 0}
+    status_counter = STATUS_COUNTERS.get(status_value(lead.get("status")))
+    if status_counter:
+        counters[status_counter] = 1
+    created_at = lead.get("created_at")
+    if isinstance(created_at, datetime):
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if created_at >= now - timedelta(days=7):
+            counters["leads_this_week"] = 1
+        if created_at >= now - timedelta(days=30):
+            counters["leads_this_month"] = 1
+    return counters
+
+
+def format_event(event_type: str, data) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+
+RESYNC_MESSAGE = format_event("resync", {"reason": "behind"})
+
+
+class LiveEvents:
+    """Pub/sub feeding the dashboard's Server-Sent Events streams.
+
+    Writers call the synchronous publish helpers; each event is encoded
+    once and put on the queue of every connected client in its scopes.
+    Counter deltas are summed per scope and pushed once per flush
+    interval, however many writes happened. With REDIS_URL set, events are
+    also relayed through a Redis channel so clients connected to other
+    worker processes see them.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pending: Dict[str, Dict[str, float]] = {}
+        self._origin = uuid.uuid4().hex
+        self._outbox: Optional[asyncio.Queue] = None
+        self._redis = None
+        self._tasks = []
+        self.counters = {"events_published": 0, "events_relayed": 0, "relay_dropped": 0, "client_overflows": 0}
+
+    # Publishing
+
+    def publish(self, event: dict):
+        """Dispatch an event locally and, with Redis configured, to the other workers"""
+        self.counters["events_published"] += 1
+        self._dispatch(event)
+        if self._outbox is not None:
+            try:
+                self._outbox.put_nowait(json.dumps({**event, "origin": self._origin}, default=str))
+            except asyncio.QueueFull:
+                self.counters["relay_dropped"] += 1
+
+    def lead_changed(self, event_type: str, before: Optional[dict], after: Optional[dict], payload: dict):
+        """Publish a lead event and the /dashboard/stats deltas it implies.
+
+        `before` and `after` are the stored lead documents (None when the lead
+        is new); the deltas move the lead's contribution between agent scopes
+        when it was reassigned.
+        """
+        now = datetime.now(timezone.utc)
+        deltas: Dict[str, Dict[str, float]] = {}
+        for lead, sign in ((before, -1), (after, 1)):
+            if lead is None:
+                continue
+            counters = lead_counters(lead, now)
+            for scope in lead_scopes(lead):
+                scope_deltas = deltas.setdefault(scope, {})
+                for counter, value in counters.items():
+                    scope_deltas[counter] = scope_deltas.get(counter, 0) + sign * value
+
+        self.publish({"type": event_type, "scopes": lead_scopes(before, after), "data": payload})
+        deltas = {scope: {counter: value for counter, value in scope_deltas.items() if value}
+                  for scope, scope_deltas in deltas.items()}
+        deltas = {scope: scope_deltas for scope, scope_deltas in deltas.items() if scope_deltas}
+        if deltas:
+            self.publish({"type": "counters", "deltas": deltas})
+
+    def activity_created(self, activity: dict, payload: dict):
+        self.publish({"type": "activity.created", "scopes": lead_scopes(activity), "data": payload})
+
+    def resync(self, reason: str):
+        """Tell every client to reload, after changes too broad to send as deltas"""
+        self.publish({"type": "resync", "scopes": None, "data": {"reason": reason}})
+
+    # Fan-out
+
+    def _dispatch(self, event: dict):
+        if event["type"] == "counters":
+            for scope, deltas in event["deltas"].items():
+                if scope not in self._subscribers:
+                    continue
+                pending = self._pending.setdefault(scope, {})
+                for counter, value in deltas.items():
+                    pending[counter] = pending.get(counter, 0) + value
+        else:
+            self._deliver(event["scopes"], format_event(event["type"], event["data"]))
+
+    def _deliver(self, scopes: Optional[Iterable[str]], message: Optional[str]):
+        """Queue one encoded message for every client in `scopes` (None: all clients)"""
+        for scope in self._subscribers if scopes is None else scopes:
+            for queue in self._subscribers.get(scope, ()):
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    # Too far behind to catch up: drop its backlog and have it reload
+                    self.counters["client_overflows"] += 1
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC_MESSAGE if message is not None else None)
+
+    async def _flush_counters(self):
+        while True:
+            await asyncio.sleep(LIVE_EVENTS_FLUSH_INTERVAL)
+            pending, self._pending = self._pending, {}
+            for scope, deltas in pending.items():
+                deltas = {counter: value for counter, value in deltas.items() if value}
+                if deltas:
+                    self._deliver([scope], format_event("counters", deltas))
+
+    async def stream(self, scope: str) -> AsyncIterator[str]:
+        """SSE messages for one client, until it disconnects or the server stops"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_EVENTS_QUEUE_SIZE)
+        self._subscribers.setdefault(scope, set()).add(queue)
+        try:
+            yield f"retry: {LIVE_EVENTS_RETRY_MS}\n" + format_event("ready", {"scope": "all" if scope == ALL_SCOPE else "own"})
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=LIVE_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                # Write whatever else is waiting in the same chunk
+                batch = [message]
+                while message is not None and not queue.empty() and len(batch) < LIVE_EVENTS_MAX_BATCH:
+                    message = queue.get_nowait()
+                    batch.append(message)
+                if None in batch:
+                    batch = batch[:batch.index(None)]
+                    if batch:
+                        yield "".join(batch)
+                    return
+                yield "".join(batch)
+        finally:
+            subscribers = self._subscribers.get(scope)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[scope]
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "clients": sum(len(queues) for queues in self._subscribers.values()),
+            "scopes": len(self._subscribers),
+            "relay": "redis" if self._redis is not None else "in-process"
+        }
+
+    # Redis relay
+
+    async def _relay_out(self):
+        while True:
+            message = await self._outbox.get()
+            try:
+                await self._redis.publish(LIVE_EVENTS_CHANNEL, message)
+            except Exception as e:
+                self.counters["relay_dropped"] += 1
+                logger.error(f"Live event relay publish failed: {e}")
+
+    async def _relay_in(self):
+        connected_before = False
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(LIVE_EVENTS_CHANNEL)
+                if connected_before:
+                    # Events published while the subscription was down are lost
+                    self._deliver(None, RESYNC_MESSAGE)
+                connected_before = True
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    event = json.loads(message["data"])
+                    if event.pop("origin", None) == self._origin:
+                        continue
+                    self.counters["events_relayed"] += 1
+                    self._dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Live event relay subscription failed: {e}")
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._flush_counters()))
+        if REDIS_URL:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(REDIS_URL)
+            self._outbox = asyncio.Queue(maxsize=10000)
+            self._tasks.append(asyncio.create_task(self._relay_out()))
+            self._tasks.append(asyncio.create_task(self._relay_in()))
+
+    async def stop(self):
+        """End every open stream and stop the flusher and relay"""
+        self._deliver(None, None)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+            self._outbox = None
+
+
+# Process-wide event hub used by every lead and activity write path
+live_events = LiveEvents()
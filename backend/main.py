@@ -2,10 +2,20 @@ from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 import uvicorn
+import asyncio
 from contextlib import asynccontextmanager
 
-from database import connect_to_mongo, close_mongo_connection
-from routers import leads, auth, dashboard, analytics
+from database import connect_to_mongo, close_mongo_connection, create_indexes
+from routers import leads, auth, dashboard, analytics, jobs as jobs_router, templates, campaigns, quotes, attachments
+from jobs import run_job_resumer, cancel_running_jobs
+from followup_scheduler import run_follow_up_scheduler, FOLLOW_UP_SCHEDULER_ENABLED
+from assignment_alerts import assignment_alerts
+from live_events import live_events
+from quote_utils import run_quote_expiry_sweeper
+from quote_pdf import shutdown_pdf_pool
+from report_snapshots import run_report_materializer, REPORT_SNAPSHOTS_ENABLED
+from email_templates import template_engine
+from settings_service import settings
 from auth_utils import get_current_user
 import models
 
@@ -13,8 +23,41 @@ import models
 async def lifespan(app: FastAPI):
     # Startup - Connect to MongoDB
     await connect_to_mongo()
+    await create_indexes()
+    # Settings snapshot, kept current by a change stream or polling
+    await settings.start()
+    # Compile stored email templates into memory before anything sends mail
+    await template_engine.start()
+    # Pick up background jobs interrupted by the last shutdown, or orphaned by a crashed worker
+    resume_task = asyncio.create_task(run_job_resumer())
+    # Follow-up reminder digests
+    scheduler_task = asyncio.create_task(run_follow_up_scheduler()) if FOLLOW_UP_SCHEDULER_ENABLED else None
+    # Coalesced agent assignment emails
+    assignment_alerts.start()
+    # Dashboard event fan-out (and Redis relay when configured)
+    live_events.start()
+    # Deactivate quotes past their expiry date
+    quote_expiry_task = asyncio.create_task(run_quote_expiry_sweeper())
+    # Daily analytics rollups served by the report endpoints
+    report_task = asyncio.create_task(run_report_materializer()) if REPORT_SNAPSHOTS_ENABLED else None
     yield
-    # Shutdown - Close MongoDB connection
+    # Shutdown - Stop background work, then close MongoDB connection
+    if scheduler_task:
+        scheduler_task.cancel()
+        await asyncio.gather(scheduler_task, return_exceptions=True)
+    quote_expiry_task.cancel()
+    await asyncio.gather(quote_expiry_task, return_exceptions=True)
+    if report_task:
+        report_task.cancel()
+        await asyncio.gather(report_task, return_exceptions=True)
+    shutdown_pdf_pool()
+    resume_task.cancel()
+    await asyncio.gather(resume_task, return_exceptions=True)
+    await cancel_running_jobs()
+    await assignment_alerts.stop()
+    await live_events.stop()
+    await template_engine.stop()
+    await settings.stop()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -38,6 +81,11 @@ app.include_router(leads.router, prefix="/api/leads", tags=["leads"])
 app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(dashboard.router, prefix="/api/dashboard", tags=["dashboard"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(jobs_router.router, prefix="/api/jobs", tags=["jobs"])
+app.include_router(templates.router, prefix="/api/templates", tags=["email templates"])
+app.include_router(campaigns.router, prefix="/api/campaigns", tags=["campaigns"])
+app.include_router(quotes.router, prefix="/api/quotes", tags=["quotes"])
+app.include_router(attachments.router, prefix="/api/attachments", tags=["attachments"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Data migrations and backfills for denormalized fields
+
+Usage:
+    python migrations.py first-contact
+    python migrations.py status-transitions
+    python migrations.py activity-agents
+    python migrations.py dedupe-keys
+"""
+
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+
+from database import connect_to_mongo, close_mongo_connection, get_collection, Collections
+from activity_utils import CONTACT_ACTIVITY_TYPES
+from dedupe import blocking_keys
+
+# Documents rewritten per bulk_write by client-side backfills
+BACKFILL_BATCH_SIZE = 1000
+
+
+async def backfill_first_contact():
+    """Backfill `first_contact_at`/`first_contact_activity_id` on historic leads.
+
+    Runs entirely server-side: the earliest contact activity per lead is
+    computed by an aggregation and merged into the leads collection. Leads
+    that already carry a later first contact are corrected.
+    """
+    activities_collection = get_collection(Collections.ACTIVITIES)
+
+    pipeline = [
+        {"$match": {"activity_type": {"$in": CONTACT_ACTIVITY_TYPES}}},
+        {"$sort": {"lead_id": 1, "created_at": 1}},
+        {
+            "$group": {
+                "_id": "$lead_id",
+                "first_contact_at": {"$first": "$created_at"},
+                "first_contact_activity_id": {"$first": "$_id"}
+            }
+        },
+        {
+            "$merge": {
+                "into": Collections.MAIN_DATA,
+                "on": "_id",
+                "whenMatched": [
+                    {
+                        "$set": {
+                            "first_contact_at": {"$min": ["$first_contact_at", "$$new.first_contact_at"]},
+                            "first_contact_activity_id": {
+                                "$cond": [
+                                    {"$or": [
+                                        {"$eq": [{"$type": "$first_contact_at"}, "missing"]},
+                                        {"$lt": ["$$new.first_contact_at", "$first_contact_at"]}
+                                    ]},
+                                    "$$new.first_contact_activity_id",
+                                    "$first_contact_activity_id"
+                                ]
+                            }
+                        }
+                    }
+                ],
+                "whenNotMatched": "discard"
+            }
+        }
+    ]
+
+    await activities_collection.aggregate(pipeline).to_list(length=None)
+
+    leads_collection = get_collection(Collections.MAIN_DATA)
+    contacted = await leads_collection.count_documents({"first_contact_at": {"$exists": True}})
+    print(f"First contact backfilled: {contacted} leads have a first contact")
+
+
+async def backfill_status_transitions():
+    """Parse `from_status`/`to_status` out of historic status change descriptions.
+
+    Older activities only carry the text "Status changed from X to Y" (where X
+    and Y may be rendered as `LeadStatus.X`). The parse runs once, server-side,
+    as a pipeline update over the activities that lack structured fields.
+    """
+    activities_collection = get_collection(Collections.ACTIVITIES)
+
+    transition = {"$regexFind": {
+        "input": "$description",
+        "regex": r"^Status changed from (?:LeadStatus\.)?(\w+) to (?:LeadStatus\.)?(\w+)$",
+        "options": "i"
+    }}
+
+    result = await activities_collection.update_many(
+        {
+            "activity_type": "status_change",
+            "to_status": {"$exists": False},
+            "description": {"$regex": "^Status changed from "}
+        },
+        [
+            {"$set": {"_transition": transition}},
+            {
+                "$set": {
+                    "from_status": {"$toLower": {"$arrayElemAt": ["$_transition.captures", 0]}},
+                    "to_status": {"$toLower": {"$arrayElemAt": ["$_transition.captures", 1]}}
+                }
+            },
+            {"$unset": "_transition"}
+        ]
+    )
+    print(f"Status transitions backfilled: {result.modified_count} activities updated")
+
+
+async def backfill_activity_agents():
+    """Stamp the owning agent onto activities written before it was denormalized.
+
+    Each activity lacking `assigned_agent_id` looks up its lead by `_id` and
+    the result is merged back into the activities collection server-side.
+    """
+    activities_collection = get_collection(Collections.ACTIVITIES)
+
+    pipeline = [
+        {"$match": {"assigned_agent_id": {"$exists": False}}},
+        {"$project": {"lead_id": 1}},
+        {
+            "$lookup": {
+                "from": Collections.MAIN_DATA,
+                "localField": "lead_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"assigned_agent_id": 1}}],
+                "as": "lead"
+            }
+        },
+        {
+            "$project": {
+                "assigned_agent_id": {"$ifNull": [{"$first": "$lead.assigned_agent_id"}, None]}
+            }
+        },
+        {
+            "$merge": {
+                "into": Collections.ACTIVITIES,
+                "on": "_id",
+                "whenMatched": "merge",
+                "whenNotMatched": "discard"
+            }
+        }
+    ]
+
+    await activities_collection.aggregate(pipeline).to_list(length=None)
+
+    remaining = await activities_collection.count_documents({"assigned_agent_id": {"$exists": False}})
+    print(f"Activity agents backfilled: {remaining} activities still unstamped")
+
+
+async def backfill_dedupe_keys():
+    """Compute duplicate blocking keys for leads created before they existed.
+
+    Soundex has no aggregation equivalent, so keys are computed client-side
+    and written back with one unordered bulk_write per batch.
+    """
+    leads_collection = get_collection(Collections.MAIN_DATA)
+    cursor = leads_collection.find(
+        {"dedupe_keys": {"$exists": False}},
+        {"email": 1, "phone_number": 1, "last_name": 1, "zip_code": 1}
+    ).batch_size(BACKFILL_BATCH_SIZE)
+
+    updated = 0
+    operations = []
+    async for lead in cursor:
+        operations.append(UpdateOne({"_id": lead["_id"]}, {"$set": {"dedupe_keys": blocking_keys(lead)}}))
+        if len(operations) >= BACKFILL_BATCH_SIZE:
+            await leads_collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await leads_collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+
+    print(f"Dedupe keys backfilled: {updated} leads updated")
+
+
+MIGRATIONS = {
+    "first-contact": backfill_first_contact,
+    "status-transitions": backfill_status_transitions,
+    "activity-agents": backfill_activity_agents,
+    "dedupe-keys": backfill_dedupe_keys,
+}
+
+
+async def run(names):
+    await connect_to_mongo()
+    try:
+        for name in names:
+            print(f"Running migration: {name}")
+            await MIGRATIONS[name]()
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run data migrations")
+    parser.add_argument("migrations", nargs="+", choices=sorted(MIGRATIONS))
+    args = parser.parse_args()
+    asyncio.run(run(args.migrations))
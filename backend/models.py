@@ -69,6 +69,42 @@ class UserRole(str, enum.Enum):
     MANAGER = "manager"
     VIEWER = "viewer"
 
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class RoutingStrategy(str, enum.Enum):
+    ROUND_ROBIN = "round_robin"
+    LEAST_OPEN_LEADS = "least_open_leads"
+
+
+class CampaignStatus(str, enum.Enum):
+    DRAFT = "draft"
+    SENDING = "sending"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+
+class RecipientStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    INTERRUPTED = "interrupted"
+
+
+class BulkLeadOperation(str, enum.Enum):
+    SET_STATUS = "set_status"
+    ASSIGN_AGENT = "assign_agent"
+    SET_PRIORITY = "set_priority"
+    SET_FOLLOW_UP_DATE = "set_follow_up_date"
+    ADD_ACTIVITY = "add_activity"
+
 # Base MongoDB Model
 class MongoBaseModel(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
@@ -0,0 +1,88 @@
+import base64
+import heapq
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+# Newest first, with _id as the tie-breaker so the order is total
+KEYSET_SORT = [("created_at", -1), ("_id", -1)]
+
+
+def encode_cursor(doc: dict) -> str:
+    """Encode a document's (created_at, _id) position as an opaque cursor"""
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Decode a cursor produced by `encode_cursor`"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_filter(cursor: Optional[str]) -> dict:
+    """Filter selecting the documents strictly after a cursor in KEYSET_SORT order"""
+    if not cursor:
+        return {}
+    created_at, doc_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": doc_id}}
+        ]
+    }
+
+
+async def fetch_page(
+    collection, query: dict, limit: int, cursor: Optional[str] = None, projection: Optional[dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Fetch one keyset page, newest first.
+
+    Reads one document past the page to know whether a continuation cursor
+    is needed, so no count or skip is ever required.
+    """
+    page_filter = {**query, **keyset_filter(cursor)} if cursor else query
+    if projection is not None:
+        # The cursor is built from created_at and _id (always returned)
+        projection = {**projection, "created_at": 1}
+    docs = await collection.find(page_filter, projection).sort(KEYSET_SORT).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit and limit > 0 else None
+    return docs[:limit], next_cursor
+
+
+async def merge_newest_first(*sources: Tuple[str, AsyncIterator[dict]]) -> AsyncIterator[Tuple[str, dict]]:
+    """Lazily k-way merge async iterators that are each sorted by KEYSET_SORT.
+
+    Yields (label, document) pairs; each source is only advanced when its
+    head has been consumed, so at most one document per source is buffered.
+    """
+    heap = []
+    iterators = [(label, source.__aiter__()) for label, source in sources]
+
+    async def push(index: int):
+        label, iterator = iterators[index]
+        try:
+            doc = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        # Negate the timestamp so the min-heap pops the newest document first
+        heapq.heappush(heap, (-doc["created_at"].timestamp(), _descending(doc["_id"]), index, doc))
+
+    for index in range(len(iterators)):
+        await push(index)
+
+    while heap:
+        _, _, index, doc = heapq.heappop(heap)
+        yield iterators[index][0], doc
+        await push(index)
+
+
+def _descending(doc_id: ObjectId) -> bytes:
+    """Heap key that orders ObjectIds from largest to smallest"""
+    return bytes(255 - b for b in doc_id.binary)
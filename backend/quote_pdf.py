@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from decouple import config
+
+# Rendered PDFs, named by the content hash of their inputs
+QUOTE_PDF_CACHE_DIR = config('QUOTE_PDF_CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'crm_quote_pdfs'))
+
+# Worker processes doing PDF layout
+QUOTE_PDF_WORKERS = config('QUOTE_PDF_WORKERS', default=2, cast=int)
+
+# Bump when the layout changes so cached documents are re-rendered
+RENDERER_VERSION = 1
+
+LEAD_FIELDS = [
+    "first_name", "last_name", "email", "phone_number",
+    "address_line1", "address_line2", "city", "state", "zip_code"
+]
+QUOTE_FIELDS = ["quote_number", "insurance_type", "premium_amount", "deductible", "coverage_details"]
+QUOTE_DATE_FIELDS = ["coverage_start_date", "coverage_end_date", "expires_at", "created_at"]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_rendering: Dict[str, asyncio.Future] = {}
+
+
+def build_pdf_payload(quote: dict, lead: dict) -> dict:
+    """Everything that appears on the document, as plain JSON values"""
+    payload = {"quote": {field: quote.get(field) for field in QUOTE_FIELDS}}
+    for field in QUOTE_DATE_FIELDS:
+        value = quote.get(field)
+        payload["quote"][field] = value.strftime("%b %d, %Y") if isinstance(value, datetime) else None
+    payload["lead"] = {field: lead.get(field) for field in LEAD_FIELDS}
+    return payload
+
+
+def payload_hash(payload: dict) -> str:
+    """Content hash of a payload; also used as the document's ETag"""
+    raw = json.dumps({"version": RENDERER_VERSION, "payload": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _money(value) -> str:
+    return f"${value:,.2f}" if isinstance(value, (int, float)) else "-"
+
+
+def render_quote_pdf(payload: dict) -> bytes:
+    """Lay out a quote document (runs in a worker process)"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+    quote, lead = payload["quote"], payload["lead"]
+    styles = getSampleStyleSheet()
+    buffer = io.BytesIO()
+    # invariant=1 keeps the bytes stable for identical inputs
+    document = SimpleDocTemplate(
+        buffer, pagesize=letter, title=f"Quote {quote['quote_number']}",
+        leftMargin=0.75 * inch, rightMargin=0.75 * inch, invariant=1
+    )
+
+    address = ", ".join(part for part in [
+        lead.get("address_line1"), lead.get("address_line2"), lead.get("city"),
+        " ".join(part for part in [lead.get("state"), lead.get("zip_code")] if part)
+    ] if part)
+    name = f"{lead.get('first_name') or ''} {lead.get('last_name') or ''}".strip()
+
+    grid = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BACKGROUND", (0, 0), (0, -1), colors.whitesmoke),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ])
+
+    story = [
+        Paragraph("A.S.I.A Inc", styles["Title"]),
+        Paragraph("3017 Douglas Blvd STE 140, Roseville, CA 95661 &middot; 916-772-4006 &middot; CA License #6009368", styles["Normal"]),
+        Spacer(1, 0.3 * inch),
+        Paragraph(f"Insurance Quote {quote['quote_number']}", styles["Heading2"]),
+        Table([
+            ["Prepared for", name or "-"],
+            ["Email", lead.get("email") or "-"],
+            ["Phone", lead.get("phone_number") or "-"],
+            ["Address", address or "-"],
+            ["Quote date", quote.get("created_at") or "-"],
+            ["Valid until", quote.get("expires_at") or "-"],
+        ], colWidths=[1.6 * inch, 5 * inch], style=grid),
+        Spacer(1, 0.25 * inch),
+        Paragraph("Coverage", styles["Heading3"]),
+        Table([
+            ["Insurance type", quote.get("insurance_type") or "-"],
+            ["Premium", _money(quote.get("premium_amount"))],
+            ["Deductible", _money(quote.get("deductible"))],
+            ["Coverage period", f"{quote.get('coverage_start_date') or '-'} to {quote.get('coverage_end_date') or '-'}"],
+        ], colWidths=[1.6 * inch, 5 * inch], style=grid),
+    ]
+
+    details = quote.get("coverage_details") or {}
+    if details:
+        story += [
+            Spacer(1, 0.25 * inch),
+            Paragraph("Coverage details", styles["Heading3"]),
+            Table(
+                [[str(key).replace("_", " ").title(), str(value)] for key, value in sorted(details.items())],
+                colWidths=[2.2 * inch, 4.4 * inch], style=grid
+            ),
+        ]
+
+    story += [
+        Spacer(1, 0.4 * inch),
+        Paragraph(
+            "This quote is an estimate based on the information provided and is subject to underwriting approval. "
+            "Please contact your agent with any questions.",
+            styles["Italic"]
+        ),
+    ]
+
+    document.build(story)
+    return buffer.getvalue()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and Mongo clients is unsafe
+        _pool = ProcessPoolExecutor(max_workers=QUOTE_PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pdf_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def cache_path(digest: str) -> str:
+    return os.path.join(QUOTE_PDF_CACHE_DIR, f"{digest}.pdf")
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    with os.fdopen(fd, "wb") as temp_file:
+        temp_file.write(data)
+    os.replace(temp_path, path)
+
+
+async def _render_to_cache(payload: dict, path: str):
+    loop = asyncio.get_running_loop()
+    pdf = await loop.run_in_executor(_get_pool(), render_quote_pdf, payload)
+    await asyncio.to_thread(_write_atomic, path, pdf)
+
+
+async def get_quote_pdf(payload: dict) -> Tuple[str, str]:
+    """Path of the cached PDF for a payload and its hash, rendering it if needed.
+
+    Concurrent requests for the same content share one render.
+    """
+    digest = payload_hash(payload)
+    path = cache_path(digest)
+    if await asyncio.to_thread(os.path.exists, path):
+        return path, digest
+
+    task = _rendering.get(digest)
+    if task is None:
+        task = asyncio.ensure_future(_render_to_cache(payload, path))
+        _rendering[digest] = task
+        task.add_done_callback(lambda _: _rendering.pop(digest, None))
+    # A client disconnecting must not cancel a render others are waiting on
+    await asyncio.shield(task)
+    return path, digest
+
+
+def discard_cached_pdf(digest: Optional[str]):
+    """Remove a superseded document (best effort)"""
+    if not digest:
+        return
+    try:
+        os.remove(cache_path(digest))
+    except OSError:
+        pass
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from decouple import config
+from pymongo import ReturnDocument
+
+from database import get_collection, Collections
+
+logger = logging.getLogger(__name__)
+
+# Quote numbers reserved per round trip to the counter document
+QUOTE_NUMBER_BLOCK_SIZE = 100
+
+# Seconds between expiry sweeps
+QUOTE_EXPIRY_SWEEP_INTERVAL = config('QUOTE_EXPIRY_SWEEP_INTERVAL', default=3600, cast=int)
+
+
+class BlockSequence:
+    """Yearly quote numbers handed out from blocks reserved with one `$inc`.
+
+    Each process reserves QUOTE_NUMBER_BLOCK_SIZE numbers at a time and
+    serves them from memory, so concurrent quoting only touches the counter
+    document once per block instead of once per quote. Numbers are unique
+    but not gap-free (a restart abandons the rest of a block) and, across
+    several processes, not in creation order.
+    """
+
+    def __init__(self, name: str, block_size: int = QUOTE_NUMBER_BLOCK_SIZE):
+        self.name = name
+        self.block_size = block_size
+        self._year: Optional[int] = None
+        self._next = 0
+        self._end = -1
+        self._lock = asyncio.Lock()
+
+    def _take(self, year: int) -> Optional[int]:
+        if self._year == year and self._next <= self._end:
+            value = self._next
+            self._next += 1
+            return value
+        return None
+
+    async def next_value(self, year: int) -> int:
+        value = self._take(year)
+        while value is None:
+            # One coroutine refills; the rest wait and then share the block
+            async with self._lock:
+                value = self._take(year)
+                if value is None:
+                    counter = await get_collection(Collections.COUNTERS).find_one_and_update(
+                        {"_id": f"{self.name}:{year}"},
+                        {"$inc": {"value": self.block_size}},
+                        upsert=True,
+                        return_document=ReturnDocument.AFTER
+                    )
+                    self._year = year
+                    self._end = counter["value"]
+                    self._next = self._end - self.block_size + 1
+                    value = self._take(year)
+        return value
+
+
+_quote_numbers = BlockSequence("quote_number")
+
+
+async def next_quote_number() -> str:
+    """Next quote number, e.g. Q-2024-000123"""
+    year = datetime.now(timezone.utc).year
+    return f"Q-{year}-{await _quote_numbers.next_value(year):06d}"
+
+
+async def expire_quotes(now: Optional[datetime] = None) -> int:
+    """Deactivate active quotes whose `expires_at` has passed; returns how many"""
+    now = now or datetime.now(timezone.utc)
+    result = await get_collection(Collections.QUOTES).update_many(
+        {"is_active": True, "is_accepted": False, "expires_at": {"$lte": now}},
+        {"$set": {"is_active": False, "expired_at": now, "updated_at": now}}
+    )
+    return result.modified_count
+
+
+async def run_quote_expiry_sweeper():
+    """Expire quotes forever at QUOTE_EXPIRY_SWEEP_INTERVAL; errors are logged, not fatal"""
+    while True:
+        try:
+            expired = await expire_quotes()
+            if expired:
+                logger.info(f"Expired {expired} quote(s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Quote expiry sweep failed: {e}")
+        await asyncio.sleep(QUOTE_EXPIRY_SWEEP_INTERVAL)
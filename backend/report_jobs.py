@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from bson import ObjectId
+from decouple import config
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+from database import get_collection, Collections
+import models
+from jobs import register_job, enqueue_job, JobContext
+
+ANALYTICS_REPORT_JOB = "analytics_report"
+
+# Seconds a finished report stays available for polling and reuse
+REPORT_RESULT_TTL = config('REPORT_RESULT_TTL', default=600, cast=int)
+
+# Reports computed at once by this process; further jobs wait their turn
+REPORT_JOB_CONCURRENCY = config('REPORT_JOB_CONCURRENCY', default=4, cast=int)
+
+# Longest a queued or running report holds its slot before a new request may start another
+REPORT_JOB_TIMEOUT = 1800
+
+# Seconds between checks while waiting on a report computed by another process
+REPORT_POLL_INTERVAL = 1.0
+
+# Report functions by name, registered by the analytics router
+REPORTS: Dict[str, Callable[..., Awaitable[dict]]] = {}
+
+_slots = asyncio.Semaphore(REPORT_JOB_CONCURRENCY)
+
+# Reports computing in this process, set when they finish
+_finished: Dict[ObjectId, asyncio.Event] = {}
+
+
+def register_report(name: str):
+    """Make a report endpoint runnable as a background job.
+
+    The job calls it with the stored query parameters, `run_async=False`
+    and the requesting user as `current_user`.
+    """
+    def decorator(report):
+        REPORTS[name] = report
+        return report
+    return decorator
+
+
+def report_key(name: str, params: dict, current_user: dict) -> str:
+    """Identity of a report request: same report, same parameters, same visible data"""
+    if current_user.get("role") in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
+        scope = "all"
+    else:
+        # Agents only see their own leads
+        scope = str(current_user["_id"])
+    raw = json.dumps({"report": name, "params": params, "scope": scope}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def enqueue_report(name: str, params: dict, current_user: dict) -> Tuple[ObjectId, bool]:
+    """Start a report job, or join an identical one that is running or recently finished.
+
+    Returns the job id and whether a new computation was started. The
+    result entry's _id is the request's key, so concurrent identical
+    requests race on one insert and all but one join the winner's job.
+    """
+    if name not in REPORTS:
+        raise ValueError(f"Unknown report: {name}")
+
+    key = report_key(name, params, current_user)
+    collection = get_collection(Collections.REPORT_RESULTS)
+    while True:
+        now = datetime.now(timezone.utc)
+        entry = await collection.find_one({"_id": key, "expires_at": {"$gt": now}}, {"job_id": 1})
+        if entry:
+            return entry["job_id"], False
+
+        # The TTL monitor only runs once a minute
+        await collection.delete_one({"_id": key, "expires_at": {"$lte": now}})
+        job_id = ObjectId()
+        try:
+            await collection.insert_one({
+                "_id": key,
+                "job_id": job_id,
+                "report": name,
+                "status": models.JobStatus.QUEUED.value,
+                "result": None,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=REPORT_JOB_TIMEOUT)
+            })
+            break
+        except DuplicateKeyError:
+            continue
+
+    try:
+        await enqueue_job(
+            ANALYTICS_REPORT_JOB,
+            {"report": name, "query": params, "key": key, "user_id": current_user["_id"]},
+            user_id=current_user["_id"],
+            job_id=job_id
+        )
+    except Exception:
+        await collection.delete_one({"_id": key, "job_id": job_id})
+        raise
+    return job_id, True
+
+
+@register_job(ANALYTICS_REPORT_JOB)
+async def run_report(job: JobContext) -> dict:
+    """Compute a report and keep its result for REPORT_RESULT_TTL seconds"""
+    key = job.params["key"]
+    collection = get_collection(Collections.REPORT_RESULTS)
+    _finished[job.id] = asyncio.Event()
+    try:
+        user = await get_collection(Collections.USERS).find_one({"_id": job.params["user_id"]})
+        if not user:
+            raise ValueError("Requesting user no longer exists")
+
+        async with _slots:
+            await collection.update_one({"_id": key, "job_id": job.id}, {"$set": {"status": models.JobStatus.RUNNING.value}})
+            report = REPORTS[job.params["report"]]
+            result = await report(**job.params["query"], run_async=False, current_user=user)
+
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=REPORT_RESULT_TTL)
+        await collection.update_one(
+            {"_id": key, "job_id": job.id},
+            {"$set": {
+                "status": models.JobStatus.COMPLETED.value,
+                "result": jsonable_encoder(result),
+                "completed_at": now,
+                "expires_at": expires_at
+            }}
+        )
+        return {"expires_at": expires_at}
+    except Exception:
+        # Free the slot so the next request computes afresh
+        await collection.delete_one({"_id": key, "job_id": job.id})
+        raise
+    finally:
+        _finished.pop(job.id).set()
+
+
+async def wait_for_report(job_id: ObjectId, timeout: float) -> Optional[dict]:
+    """A report job's result entry, waiting up to `timeout` seconds for it to finish.
+
+    Returns None once the entry is gone (the job failed or the result expired).
+    """
+    collection = get_collection(Collections.REPORT_RESULTS)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        entry = await collection.find_one({"job_id": job_id})
+        remaining = deadline - loop.time()
+        if entry is None or entry["status"] == models.JobStatus.COMPLETED.value or remaining <= 0:
+            return entry
+
+        finished = _finished.get(job_id)
+        if finished is None:
+            # Computing in another process (or not started yet)
+            await asyncio.sleep(min(REPORT_POLL_INTERVAL, remaining))
+            continue
+        try:
+            await asyncio.wait_for(finished.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            pass
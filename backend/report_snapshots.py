@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Report materializer: per-day analytics rollups merged into report_snapshots
+
+Runs inside the API process (see main.py) or standalone:
+    python report_snapshots.py [--full]
+"""
+
+import argparse
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from decouple import config
+
+from database import connect_to_mongo, close_mongo_connection, get_collection, Collections
+from aggregations import status_equals
+
+logger = logging.getLogger(__name__)
+
+REPORT_SNAPSHOTS_ENABLED = config('REPORT_SNAPSHOTS_ENABLED', default=True, cast=bool)
+
+# Days of history kept in snapshots; longer report windows are computed live
+REPORT_SNAPSHOT_DAYS = config('REPORT_SNAPSHOT_DAYS', default=90, cast=int)
+
+# Seconds between incremental refreshes of the latest days
+REPORT_INCREMENTAL_INTERVAL = config('REPORT_INCREMENTAL_INTERVAL', default=900, cast=int)
+
+# UTC hour after which the nightly full refresh runs
+REPORT_FULL_REFRESH_HOUR = config('REPORT_FULL_REFRESH_HOUR', default=2, cast=int)
+
+# Days an incremental refresh always recomputes (yesterday keeps changing for a
+# while); older days are recomputed only when one of their leads changed
+INCREMENTAL_DAYS = 2
+
+STATE_ID = "report_snapshots"
+WORKER_ID = uuid.uuid4().hex
+
+
+def _count_where(condition: dict) -> dict:
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+
+_VALUE_METRICS = {
+    "value_sum": {"$sum": "$estimated_value"},
+    # $avg ignores missing values, so averages are rebuilt as value_sum / value_count
+    "value_count": _count_where({"$isNumber": "$estimated_value"}),
+}
+
+# Each report is rolled up per (UTC day, agent, key) with additive metrics only,
+# so any window of whole days is a sum of its daily rows
+SNAPSHOT_REPORTS = {
+    "lead-sources-analysis": {
+        "collection": Collections.MAIN_DATA,
+        "agent_field": "assigned_agent_id",
+        "key": "$source",
+        "metrics": {
+            "total": {"$sum": 1},
+            "qualified": _count_where(status_equals("qualified")),
+            "closed_won": _count_where(status_equals("closed_won")),
+            "closed_lost": _count_where(status_equals("closed_lost")),
+            **_VALUE_METRICS,
+        },
+    },
+    "geographic-distribution": {
+        "collection": Collections.MAIN_DATA,
+        "agent_field": "assigned_agent_id",
+        "key": {"state": "$state", "city": "$city"},
+        "metrics": {
+            "count": {"$sum": 1},
+            "closed_won": _count_where(status_equals("closed_won")),
+            **_VALUE_METRICS,
+        },
+    },
+    "agent-performance": {
+        "collection": Collections.MAIN_DATA,
+        "agent_field": "assigned_agent_id",
+        "key": None,
+        "metrics": {
+            "total": {"$sum": 1},
+            "qualified": _count_where(status_equals("qualified")),
+            "closed_won": _count_where(status_equals("closed_won")),
+            "closed_lost": _count_where(status_equals("closed_lost")),
+            "value_sum": {"$sum": "$estimated_value"},
+        },
+    },
+    "agent-activity": {
+        "collection": Collections.ACTIVITIES,
+        "agent_field": "user_id",
+        "key": None,
+        "metrics": {"total": {"$sum": 1}},
+    },
+}
+
+
+def _start_of_day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _pipeline(name: str, spec: dict, start: datetime, end: datetime, run_id: ObjectId) -> list:
+    group_id = {
+        "day": {"$dateTrunc": {"date": "$created_at", "unit": "day"}},
+        "agent_id": f"${spec['agent_field']}",
+    }
+    if spec["key"] is not None:
+        group_id["key"] = spec["key"]
+
+    project = {
+        "_id": {"report": {"$literal": name}, "day": "$_id.day", "agent_id": "$_id.agent_id", "key": "$_id.key"},
+        "report": {"$literal": name},
+        "day": "$_id.day",
+        "agent_id": "$_id.agent_id",
+        "key": "$_id.key",
+        "run_id": {"$literal": run_id},
+        "materialized_at": "$$NOW",
+        **{metric: 1 for metric in spec["metrics"]},
+    }
+
+    return [
+        # Soft-deleted leads drop out; activities never carry deleted_at
+        {"$match": {"created_at": {"$gte": start, "$lt": end}, "deleted_at": {"$exists": False}}},
+        {"$group": {"_id": group_id, **spec["metrics"]}},
+        {"$project": project},
+        {"$merge": {"into": Collections.REPORT_SNAPSHOTS, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+async def materialize(start: datetime, end: datetime) -> Dict[str, int]:
+    """Recompute every report's daily rows for [start, end) and merge them in.
+
+    The database does all the work: each report is one aggregation ending
+    in `$merge`, so no rows pass through the API process. Rows in the range
+    that this run did not produce (a group that no longer exists) are
+    removed afterwards.
+    """
+    snapshots_collection = get_collection(Collections.REPORT_SNAPSHOTS)
+    run_id = ObjectId()
+    removed = {}
+    for name, spec in SNAPSHOT_REPORTS.items():
+        await get_collection(spec["collection"]).aggregate(
+            _pipeline(name, spec, start, end, run_id), allowDiskUse=True
+        ).to_list(length=None)
+        result = await snapshots_collection.delete_many(
+            {"report": name, "day": {"$gte": start, "$lt": end}, "run_id": {"$ne": run_id}}
+        )
+        removed[name] = result.deleted_count
+    return removed
+
+
+async def _changed_days(since: datetime, start: datetime, end: datetime) -> List[datetime]:
+    """Days in [start, end) holding a lead updated (or soft-deleted) since `since`.
+
+    Rows are keyed by the day a lead was created but carry its current status,
+    owner and value, so a lead closed today must refresh its creation day.
+    """
+    pipeline = [
+        {"$match": {"updated_at": {"$gte": since}, "created_at": {"$gte": start, "$lt": end}}},
+        {"$group": {"_id": {"$dateTrunc": {"date": "$created_at", "unit": "day"}}}},
+        {"$sort": {"_id": 1}},
+    ]
+    rows = await get_collection(Collections.MAIN_DATA).aggregate(pipeline).to_list(length=None)
+    return [row["_id"] if row["_id"].tzinfo else row["_id"].replace(tzinfo=timezone.utc) for row in rows]
+
+
+def _day_ranges(days: List[datetime]) -> List[Tuple[datetime, datetime]]:
+    """Coalesce sorted days into [start, end) ranges of consecutive days"""
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] == day:
+            ranges[-1] = (ranges[-1][0], day + timedelta(days=1))
+        else:
+            ranges.append((day, day + timedelta(days=1)))
+    return ranges
+
+
+async def _acquire_lease(now: datetime, duration: int, scheduled: bool) -> Optional[dict]:
+    """Claim the materializer so several API processes never run it at once"""
+    collection = get_collection(Collections.SCHEDULER_STATE)
+    await collection.update_one({"_id": STATE_ID}, {"$setOnInsert": {"last_full_at": None}}, upsert=True)
+    conditions = [{"$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lte": now}}]}]
+    if scheduled:
+        # Another worker refreshed within the interval
+        recent = now - timedelta(seconds=REPORT_INCREMENTAL_INTERVAL / 2)
+        conditions.append({"$or": [{"last_incremental_at": {"$exists": False}}, {"last_incremental_at": {"$lte": recent}}]})
+    return await collection.find_one_and_update(
+        {"_id": STATE_ID, "$and": conditions},
+        {"$set": {"lease_until": now + timedelta(seconds=duration), "lease_owner": WORKER_ID}}
+    )
+
+
+async def refresh_snapshots(full: Optional[bool] = None, now: Optional[datetime] = None) -> dict:
+    """Run a full or incremental refresh.
+
+    With `full=None` a full refresh runs once per day after
+    REPORT_FULL_REFRESH_HOUR (and on first use); otherwise only the last
+    INCREMENTAL_DAYS are recomputed, plus any older kept day with a lead
+    updated since the previous run. Returns what was done.
+    """
+    now = now or datetime.now(timezone.utc)
+    state = await _acquire_lease(now, max(REPORT_INCREMENTAL_INTERVAL, 3600), scheduled=full is None)
+    if state is None:
+        return {"skipped": "Another worker is materializing reports or did recently"}
+
+    today = _start_of_day(now)
+    if full is None:
+        last_full = state.get("last_full_at")
+        if last_full is not None and last_full.tzinfo is None:
+            last_full = last_full.replace(tzinfo=timezone.utc)
+        due = today + timedelta(hours=REPORT_FULL_REFRESH_HOUR)
+        if due > now:
+            due -= timedelta(days=1)
+        full = last_full is None or last_full < due
+
+    days = REPORT_SNAPSHOT_DAYS if full else INCREMENTAL_DAYS
+    start = today - timedelta(days=days - 1)
+    state_collection = get_collection(Collections.SCHEDULER_STATE)
+    changed_days = []
+    try:
+        removed = await materialize(start, today + timedelta(days=1))
+        last_run = state.get("last_incremental_at")
+        if not full and last_run is not None:
+            if last_run.tzinfo is None:
+                last_run = last_run.replace(tzinfo=timezone.utc)
+            kept_from = today - timedelta(days=REPORT_SNAPSHOT_DAYS - 1)
+            changed_days = await _changed_days(last_run, kept_from, start)
+            for range_start, range_end in _day_ranges(changed_days):
+                for name, count in (await materialize(range_start, range_end)).items():
+                    removed[name] += count
+        update = {"last_incremental_at": now}
+        if full:
+            update.update({"last_full_at": now, "covered_from": start})
+            # Drop days that fell out of the kept window
+            await get_collection(Collections.REPORT_SNAPSHOTS).delete_many({"day": {"$lt": start}})
+        await state_collection.update_one({"_id": STATE_ID, "lease_owner": WORKER_ID}, {"$set": update})
+    finally:
+        await state_collection.update_one({"_id": STATE_ID, "lease_owner": WORKER_ID}, {"$unset": {"lease_until": ""}})
+
+    result = {
+        "full": full, "from": start, "to": now, "changed_days": len(changed_days), "stale_rows_removed": removed
+    }
+    logger.info(f"Report snapshots refreshed: {result}")
+    return result
+
+
+async def read_snapshot(
+    report: str,
+    days: int,
+    group_by,
+    metrics: List[str],
+    agent_id: Optional[ObjectId] = None,
+    sort: Optional[dict] = None,
+    limit: Optional[int] = None
+) -> Optional[Tuple[List[dict], dict]]:
+    """Sum a report's daily rows over the last `days` UTC days, today included.
+
+    Returns (grouped rows, freshness), or None when snapshots cannot answer
+    (disabled, never materialized, or a window longer than what is kept).
+    """
+    if not REPORT_SNAPSHOTS_ENABLED or days > REPORT_SNAPSHOT_DAYS:
+        return None
+    state = await get_collection(Collections.SCHEDULER_STATE).find_one({"_id": STATE_ID})
+    if not state or not state.get("last_full_at"):
+        return None
+
+    window_start = _start_of_day(datetime.now(timezone.utc)) - timedelta(days=days - 1)
+    match = {"report": report, "day": {"$gte": window_start}}
+    if agent_id is not None:
+        match["agent_id"] = agent_id
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": group_by, **{metric: {"$sum": f"${metric}"} for metric in metrics}}},
+    ]
+    if sort:
+        pipeline.append({"$sort": sort})
+    if limit:
+        pipeline.append({"$limit": limit})
+
+    rows = await get_collection(Collections.REPORT_SNAPSHOTS).aggregate(pipeline).to_list(length=None)
+    freshness = {
+        "source": "snapshot",
+        "as_of": (state.get("last_incremental_at") or state["last_full_at"]).isoformat(),
+        "full_refresh_at": state["last_full_at"].isoformat(),
+        "window_start": window_start.isoformat()
+    }
+    return rows, freshness
+
+
+def live_freshness() -> dict:
+    return {"source": "live", "as_of": datetime.now(timezone.utc).isoformat()}
+
+
+async def run_report_materializer():
+    """Refresh forever at REPORT_INCREMENTAL_INTERVAL; errors are logged, not fatal"""
+    while True:
+        try:
+            await refresh_snapshots()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Report snapshot refresh failed: {e}")
+        await asyncio.sleep(REPORT_INCREMENTAL_INTERVAL)
+
+
+async def _main(full: bool):
+    await connect_to_mongo()
+    try:
+        print(await refresh_snapshots(full=full or None))
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize analytics report snapshots")
+    parser.add_argument("--full", action="store_true", help="Recompute the whole kept window")
+    args = parser.parse_args()
+    asyncio.run(_main(args.full))
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import JSONResponse
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta, timezone
 from bson import ObjectId
+import asyncio
 import pymongo
 
 from database import get_collection, Collections
 import models
 import schemas
 from auth_utils import get_current_active_user, require_role
+from aggregations import group_by_dimension, status_equals
+from settings_service import get_forecast_probabilities
+from forecasting import simulate_pipeline
+from report_snapshots import read_snapshot, live_freshness
+from report_jobs import ANALYTICS_REPORT_JOB, register_report, enqueue_report, wait_for_report
 
 router = APIRouter()
 
@@ -34,18 +41,78 @@ def serialize_doc(doc):
         return result
     return doc
 
+async def queue_report(name: str, params: dict, current_user: dict) -> JSONResponse:
+    """Start (or join) a background computation of a report"""
+    job_id, started = await enqueue_report(name, params, current_user)
+    return JSONResponse(status_code=202, content={
+        "job_id": str(job_id),
+        "deduplicated": not started,
+        "poll_url": f"/api/analytics/reports/{job_id}"
+    })
+
+# Poll or long-poll an async report
+@router.get("/reports/{job_id}")
+async def get_report_result(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the report to finish"),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get the result of a report requested with `async=true` (202 while it is still computing)"""
+    
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
+    
+    jobs_collection = get_collection(Collections.JOBS)
+    job = await jobs_collection.find_one({"_id": ObjectId(job_id), "job_type": ANALYTICS_REPORT_JOB})
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    
+    # Check permissions
+    if (current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value] and
+        job.get("created_by") != current_user["_id"]):
+        raise HTTPException(status_code=403, detail="Not authorized to view this report")
+    
+    entry = await wait_for_report(job["_id"], wait)
+    
+    if entry and entry["status"] == models.JobStatus.COMPLETED.value:
+        return {
+            "job_id": job_id,
+            "status": entry["status"],
+            "report": entry["report"],
+            "params": job["params"]["query"],
+            "completed_at": entry["completed_at"].isoformat(),
+            "expires_at": entry["expires_at"].isoformat(),
+            "result": entry["result"]
+        }
+    
+    if entry is None:
+        job = await jobs_collection.find_one({"_id": job["_id"]})
+        if job["status"] == models.JobStatus.FAILED.value:
+            return {"job_id": job_id, "status": job["status"], "error": job.get("error")}
+        if job["status"] == models.JobStatus.COMPLETED.value:
+            raise HTTPException(status_code=410, detail="Report result has expired; request it again")
+    
+    status = entry["status"] if entry else job["status"]
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": status})
+
 @router.get("/conversion-funnel")
+@register_report("conversion-funnel")
 async def get_conversion_funnel(
     days: int = Query(30, description="Number of days to analyze"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get conversion funnel data"""
     
+    if run_async:
+        return await queue_report("conversion-funnel", {"days": days}, current_user)
+    
     start_date = datetime.now(timezone.utc) - timedelta(days=days)
     collection = get_collection(Collections.MAIN_DATA)
     
     # Base query filter
-    base_filter = {"created_at": {"$gte": start_date}}
+    base_filter = {"created_at": {"$gte": start_date}, "deleted_at": {"$exists": False}}
     
     # Filter by agent if not admin/manager
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
@@ -82,18 +149,23 @@ async def get_conversion_funnel(
     return {"funnel": funnel_data, "period_days": days}
 
 @router.get("/leads-by-month")
+@register_report("leads-by-month")
 async def get_leads_by_month(
     months: int = Query(12, description="Number of months to analyze"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get leads created by month"""
     
+    if run_async:
+        return await queue_report("leads-by-month", {"months": months}, current_user)
+    
     start_date = datetime.now(timezone.utc) - timedelta(days=months * 30)
     collection = get_collection(Collections.MAIN_DATA)
     
     # Base pipeline
     pipeline = [
-        {"$match": {"created_at": {"$gte": start_date}}}
+        {"$match": {"created_at": {"$gte": start_date}, "deleted_at": {"$exists": False}}}
     ]
     
     # Filter by agent if not admin/manager
@@ -129,13 +201,50 @@ async def get_leads_by_month(
     return {"monthly_data": results}
 
 @router.get("/agent-performance")
+@register_report("agent-performance")
 async def get_agent_performance(
     days: int = Query(30, description="Number of days to analyze"),
-    current_user: dict = Depends(require_role(models.UserRole.MANAGER.value))
+    fresh: bool = Query(False, description="Compute live instead of from report snapshots"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
 ):
     """Get agent performance metrics (manager+ only)"""
     
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
+    if run_async:
+        return await queue_report("agent-performance", {"days": days, "fresh": fresh}, current_user)
+    
+    # Per-agent lead metrics and activity counts, from snapshots when they cover the window
+    snapshot = None if fresh else await read_snapshot(
+        "agent-performance", days, "$agent_id", ["total", "qualified", "closed_won", "closed_lost", "value_sum"]
+    )
+    activity_snapshot = await read_snapshot("agent-activity", days, "$agent_id", ["total"]) if snapshot else None
+    
+    if snapshot and activity_snapshot:
+        rows, freshness = snapshot
+        lead_stats = {row["_id"]: row for row in rows}
+        activity_counts = {row["_id"]: row["total"] for row in activity_snapshot[0]}
+    else:
+        start_date = datetime.now(timezone.utc) - timedelta(days=days)
+        leads_collection = get_collection(Collections.MAIN_DATA)
+        activities_collection = get_collection(Collections.ACTIVITIES)
+        
+        # One grouped pass per collection rather than several queries per agent
+        lead_stats = await group_by_dimension(
+            leads_collection,
+            {"created_at": {"$gte": start_date}, "deleted_at": {"$exists": False}},
+            "assigned_agent_id",
+            counts={
+                "qualified": status_equals("qualified"),
+                "closed_won": status_equals("closed_won"),
+                "closed_lost": status_equals("closed_lost")
+            },
+            sums={"value_sum": "estimated_value"}
+        )
+        activity_groups = await group_by_dimension(
+            activities_collection, {"created_at": {"$gte": start_date}}, "user_id"
+        )
+        activity_counts = {agent_id: group["total"] for agent_id, group in activity_groups.items()}
+        freshness = live_freshness()
     
     # Get all agents
     users_collection = get_collection(Collections.USERS)
@@ -145,51 +254,20 @@ async def get_agent_performance(
     })
     
     performance_data = []
-    leads_collection = get_collection(Collections.MAIN_DATA)
-    activities_collection = get_collection(Collections.ACTIVITIES)
     
     async for agent in agents_cursor:
         agent_id = agent["_id"]
+        stats = lead_stats.get(agent_id, {})
         
-        # Agent's leads in the period
-        agent_filter = {
-            "assigned_agent_id": agent_id,
-            "created_at": {"$gte": start_date}
-        }
-        
-        total_leads = await leads_collection.count_documents(agent_filter)
-        qualified_leads = await leads_collection.count_documents({
-            **agent_filter,
-            "status": "qualified"
-        })
-        closed_won = await leads_collection.count_documents({
-            **agent_filter,
-            "status": "closed_won"
-        })
-        closed_lost = await leads_collection.count_documents({
-            **agent_filter,
-            "status": "closed_lost"
-        })
+        total_leads = stats.get("total", 0)
+        qualified_leads = stats.get("qualified", 0)
+        closed_won = stats.get("closed_won", 0)
+        closed_lost = stats.get("closed_lost", 0)
         
         # Calculate metrics
         qualification_rate = (qualified_leads / total_leads * 100) if total_leads > 0 else 0
         close_rate = (closed_won / (closed_won + closed_lost) * 100) if (closed_won + closed_lost) > 0 else 0
         
-        # Get total estimated value
-        pipeline = [
-            {"$match": agent_filter},
-            {"$group": {"_id": None, "total_value": {"$sum": "$estimated_value"}}}
-        ]
-        cursor = leads_collection.aggregate(pipeline)
-        total_value_result = await cursor.to_list(length=1)
-        estimated_value = total_value_result[0]["total_value"] if total_value_result else 0
-        
-        # Get activity count
-        activity_count = await activities_collection.count_documents({
-            "user_id": agent_id,
-            "created_at": {"$gte": start_date}
-        })
-        
         performance_data.append({
             "agent_name": agent.get("full_name", "Unknown"),
             "agent_id": str(agent_id),
@@ -199,63 +277,81 @@ async def get_agent_performance(
             "closed_lost": closed_lost,
             "qualification_rate": round(qualification_rate, 2),
             "close_rate": round(close_rate, 2),
-            "estimated_value": estimated_value or 0,
-            "activity_count": activity_count
+            "estimated_value": stats.get("value_sum") or 0,
+            "activity_count": activity_counts.get(agent_id, 0)
         })
     
     # Sort by total leads descending
     performance_data.sort(key=lambda x: x['total_leads'], reverse=True)
     
-    return {"performance_data": performance_data, "period_days": days}
+    return {"performance_data": performance_data, "period_days": days, "freshness": freshness}
 
 @router.get("/lead-sources-analysis")
+@register_report("lead-sources-analysis")
 async def get_lead_sources_analysis(
     days: int = Query(90, description="Number of days to analyze"),
+    fresh: bool = Query(False, description="Compute live instead of from report snapshots"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Analyze lead sources performance"""
     
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
-    collection = get_collection(Collections.MAIN_DATA)
+    if run_async:
+        return await queue_report("lead-sources-analysis", {"days": days, "fresh": fresh}, current_user)
     
-    # Base filter
-    base_filter = {"created_at": {"$gte": start_date}}
+    # Agents only see their own leads
+    agent_id = None
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+        agent_id = current_user["_id"]
+    
+    snapshot = None if fresh else await read_snapshot(
+        "lead-sources-analysis", days, "$key",
+        ["total", "qualified", "closed_won", "closed_lost", "value_sum", "value_count"], agent_id
+    )
+    
+    if snapshot:
+        rows, freshness = snapshot
+        groups = {
+            row["_id"]: {**row, "avg_value": row["value_sum"] / row["value_count"] if row["value_count"] else None}
+            for row in rows
+        }
+    else:
+        start_date = datetime.now(timezone.utc) - timedelta(days=days)
+        collection = get_collection(Collections.MAIN_DATA)
+        
+        # Base filter
+        base_filter = {"created_at": {"$gte": start_date}, "deleted_at": {"$exists": False}}
+        if agent_id:
+            base_filter["assigned_agent_id"] = agent_id
+        
+        # All sources, counts and averages in one aggregation
+        groups = await group_by_dimension(
+            collection,
+            base_filter,
+            "source",
+            buckets=[source.value for source in models.LeadSource],
+            counts={
+                "qualified": status_equals("qualified"),
+                "closed_won": status_equals("closed_won"),
+                "closed_lost": status_equals("closed_lost")
+            },
+            averages={"avg_value": "estimated_value"}
+        )
+        freshness = live_freshness()
     
+    empty = {"total": 0, "qualified": 0, "closed_won": 0, "closed_lost": 0, "avg_value": None}
     source_analysis = []
-    
-    # Analyze each source
     for source in models.LeadSource:
-        source_filter = {**base_filter, "source": source.value}
-        
-        total_count = await collection.count_documents(source_filter)
-        qualified_count = await collection.count_documents({
-            **source_filter,
-            "status": "qualified"
-        })
-        closed_won_count = await collection.count_documents({
-            **source_filter,
-            "status": "closed_won"
-        })
-        closed_lost_count = await collection.count_documents({
-            **source_filter,
-            "status": "closed_lost"
-        })
+        group = groups.get(source.value, empty)
+        total_count = group["total"]
+        qualified_count = group["qualified"]
+        closed_won_count = group["closed_won"]
+        closed_lost_count = group["closed_lost"]
         
         # Calculate rates
         qualification_rate = (qualified_count / total_count * 100) if total_count > 0 else 0
         close_rate = (closed_won_count / (closed_won_count + closed_lost_count) * 100) if (closed_won_count + closed_lost_count) > 0 else 0
         
-        # Average estimated value
-        pipeline = [
-            {"$match": source_filter},
-            {"$group": {"_id": None, "avg_value": {"$avg": "$estimated_value"}}}
-        ]
-        cursor = collection.aggregate(pipeline)
-        avg_result = await cursor.to_list(length=1)
-        avg_value = avg_result[0]["avg_value"] if avg_result else 0
-        
         source_analysis.append({
             "source": source.value,
             "total_leads": total_count,
@@ -264,22 +360,27 @@ async def get_lead_sources_analysis(
             "closed_lost": closed_lost_count,
             "qualification_rate": round(qualification_rate, 2),
             "close_rate": round(close_rate, 2),
-            "average_estimated_value": round(avg_value or 0, 2)
+            "average_estimated_value": round(group["avg_value"] or 0, 2)
         })
     
     # Sort by total leads descending
     source_analysis.sort(key=lambda x: x['total_leads'], reverse=True)
     
-    return {"source_analysis": source_analysis, "period_days": days}
+    return {"source_analysis": source_analysis, "period_days": days, "freshness": freshness}
 
 @router.get("/activity-timeline")
+@register_report("activity-timeline")
 async def get_activity_timeline(
     lead_id: Optional[str] = Query(None, description="Specific lead ID"),
     days: int = Query(30, description="Number of days to analyze"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get activity timeline"""
     
+    if run_async:
+        return await queue_report("activity-timeline", {"lead_id": lead_id, "days": days}, current_user)
+    
     start_date = datetime.now(timezone.utc) - timedelta(days=days)
     activities_collection = get_collection(Collections.ACTIVITIES)
     
@@ -294,14 +395,8 @@ async def get_activity_timeline(
     
     # Filter by user role
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        # Get only activities for leads assigned to this user
-        leads_collection = get_collection(Collections.MAIN_DATA)
-        user_leads_cursor = leads_collection.find(
-            {"assigned_agent_id": current_user["_id"]},
-            {"_id": 1}
-        )
-        user_lead_ids = [lead["_id"] async for lead in user_leads_cursor]
-        query_filter["lead_id"] = {"$in": user_lead_ids}
+        # Activities carry the owning agent, so filter on it directly
+        query_filter["assigned_agent_id"] = current_user["_id"]
     
     # Group by date and activity type
     pipeline = [
@@ -339,58 +434,55 @@ async def get_activity_timeline(
     return {"timeline_data": timeline_data, "period_days": days}
 
 @router.get("/revenue-forecast")
+@register_report("revenue-forecast")
 async def get_revenue_forecast(
+    simulate: bool = Query(False, description="Add Monte Carlo P10/P50/P90 bands per agent and month"),
+    simulations: int = Query(2000, ge=100, le=20000, description="Number of simulated outcomes"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get revenue forecast based on pipeline"""
     
+    if run_async:
+        return await queue_report("revenue-forecast", {"simulate": simulate, "simulations": simulations}, current_user)
+    
     collection = get_collection(Collections.MAIN_DATA)
     
+    # Probability multipliers for each status (configurable via settings)
+    status_probabilities = get_forecast_probabilities()
+    
     # Base filter for leads with estimated value in active statuses
     base_filter = {
         "estimated_value": {"$ne": None, "$gt": 0},
-        "status": {"$in": ["new", "contacted", "qualified", "proposal_sent"]}
+        "status": {"$in": list(status_probabilities)},
+        "deleted_at": {"$exists": False}
     }
     
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
         base_filter["assigned_agent_id"] = current_user["_id"]
     
-    # Define probability multipliers for each status
-    status_probabilities = {
-        "new": 0.1,
-        "contacted": 0.2,
-        "qualified": 0.5,
-        "proposal_sent": 0.8
-    }
+    # Per-status sums in a single pass
+    pipeline = [
+        {"$match": base_filter},
+        {
+            "$group": {
+                "_id": "$status",
+                "count": {"$sum": 1},
+                "total_value": {"$sum": "$estimated_value"}
+            }
+        }
+    ]
+    
+    cursor = collection.aggregate(pipeline)
+    status_totals = {doc["_id"]: doc async for doc in cursor}
     
     forecast_data = []
     total_weighted_value = 0
     
     for status, probability in status_probabilities.items():
-        # Get leads for this status
-        status_filter = {**base_filter, "status": status}
-        
-        pipeline = [
-            {"$match": status_filter},
-            {
-                "$group": {
-                    "_id": None,
-                    "count": {"$sum": 1},
-                    "total_value": {"$sum": "$estimated_value"}
-                }
-            }
-        ]
-        
-        cursor = collection.aggregate(pipeline)
-        results = await cursor.to_list(length=1)
-        
-        if results:
-            result = results[0]
-            lead_count = result["count"]
-            total_value = result["total_value"]
-        else:
-            lead_count = 0
-            total_value = 0
+        result = status_totals.get(status)
+        lead_count = result["count"] if result else 0
+        total_value = result["total_value"] if result else 0
         
         weighted_value = total_value * probability
         total_weighted_value += weighted_value
@@ -403,156 +495,352 @@ async def get_revenue_forecast(
             "weighted_value": round(weighted_value, 2)
         })
     
-    return {
+    response = {
         "forecast_data": forecast_data,
         "total_pipeline_value": sum(f["total_value"] for f in forecast_data),
         "weighted_forecast": round(total_weighted_value, 2)
     }
+    
+    if simulate:
+        response["simulation"] = await _simulate_revenue(collection, base_filter, status_probabilities, simulations)
+    
+    return response
+
+async def _simulate_revenue(collection, base_filter, status_probabilities, simulations):
+    """Monte Carlo revenue bands per agent and per expected month"""
+    
+    # Only per-cell moments leave the server, not one row per lead
+    pipeline = [
+        {"$match": base_filter},
+        {
+            "$group": {
+                "_id": {
+                    "status": "$status",
+                    "agent_id": "$assigned_agent_id",
+                    "month": {
+                        "$ifNull": [
+                            {"$dateToString": {"format": "%Y-%m", "date": "$next_follow_up_date"}},
+                            "unscheduled"
+                        ]
+                    }
+                },
+                "count": {"$sum": 1},
+                "total_value": {"$sum": "$estimated_value"},
+                "total_value_sq": {"$sum": {"$multiply": ["$estimated_value", "$estimated_value"]}}
+            }
+        }
+    ]
+    
+    cells = []
+    async for doc in collection.aggregate(pipeline):
+        cells.append({
+            "status": doc["_id"]["status"],
+            "agent_id": str(doc["_id"].get("agent_id") or "unassigned"),
+            "month": doc["_id"]["month"],
+            "count": doc["count"],
+            "total_value": doc["total_value"],
+            "total_value_sq": doc["total_value_sq"]
+        })
+    
+    # Simulation is CPU-bound; keep it off the event loop
+    result = await asyncio.to_thread(simulate_pipeline, cells, status_probabilities, simulations)
+    
+    # Resolve agent names in one query
+    agent_ids = [ObjectId(agent_id) for agent_id in result["by_agent"] if ObjectId.is_valid(agent_id)]
+    agent_names = {}
+    if agent_ids:
+        users_collection = get_collection(Collections.USERS)
+        async for user in users_collection.find({"_id": {"$in": agent_ids}}, {"full_name": 1}):
+            agent_names[str(user["_id"])] = user.get("full_name", "Unknown")
+    
+    def rounded(bands):
+        return {name: round(value, 2) for name, value in bands.items()}
+    
+    return {
+        "simulations": result["simulations"],
+        "total": rounded(result["total"]),
+        "by_agent": [
+            {
+                "agent_id": None if agent_id == "unassigned" else agent_id,
+                "agent_name": agent_names.get(agent_id, "Unassigned" if agent_id == "unassigned" else "Unknown"),
+                **rounded(bands)
+            }
+            for agent_id, bands in sorted(result["by_agent"].items(), key=lambda item: -item[1]["expected"])
+        ],
+        "by_month": [
+            {"month": month, **rounded(bands)}
+            for month, bands in sorted(result["by_month"].items())
+        ]
+    }
+
+# Response time buckets (lower bound in hours -> label)
+RESPONSE_TIME_BUCKETS = [
+    (0, "< 1 hour"),
+    (1, "1-4 hours"),
+    (4, "4-24 hours"),
+    (24, "1-3 days"),
+    (72, "> 3 days"),
+]
+
+def _percentiles(values, points):
+    """Map a `$percentile` result array onto rounded named points"""
+    values = values or [0] * len(points)
+    return {name: round(value or 0, 2) for name, value in zip(points, values)}
 
 @router.get("/lead-response-time")
+@register_report("lead-response-time")
 async def get_lead_response_time(
     days: int = Query(30, description="Number of days to analyze"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Analyze lead response time metrics"""
     
+    if run_async:
+        return await queue_report("lead-response-time", {"days": days}, current_user)
+    
     start_date = datetime.now(timezone.utc) - timedelta(days=days)
     leads_collection = get_collection(Collections.MAIN_DATA)
-    activities_collection = get_collection(Collections.ACTIVITIES)
     
-    # Base filter
-    base_filter = {"created_at": {"$gte": start_date}}
+    # Base filter - only leads with a denormalized first contact
+    base_filter = {
+        "created_at": {"$gte": start_date},
+        "first_contact_at": {"$exists": True},
+        "deleted_at": {"$exists": False}
+    }
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
         base_filter["assigned_agent_id"] = current_user["_id"]
     
-    # Get leads with their first contact activities
+    percentile_input = {"input": "$response_time_hours", "p": [0.5, 0.9, 0.99], "method": "approximate"}
+    
+    # All statistics are computed server-side in a single pass
     pipeline = [
         {"$match": base_filter},
         {
-            "$lookup": {
-                "from": "activities",
-                "localField": "_id",
-                "foreignField": "lead_id",
-                "as": "activities"
-            }
-        },
-        {
-            "$addFields": {
-                "first_contact": {
-                    "$min": {
-                        "$filter": {
-                            "input": "$activities",
-                            "cond": {"$in": ["$$this.activity_type", ["call", "email", "meeting"]]}
-                        }
-                    }
-                }
-            }
-        },
-        {
-            "$addFields": {
+            "$project": {
+                "assigned_agent_id": 1,
+                "source": 1,
                 "response_time_hours": {
-                    "$cond": {
-                        "if": {"$ne": ["$first_contact", None]},
-                        "then": {
+                    "$max": [
+                        0,
+                        {
                             "$divide": [
-                                {"$subtract": ["$first_contact.created_at", "$created_at"]},
+                                {"$subtract": ["$first_contact_at", "$created_at"]},
                                 3600000  # Convert milliseconds to hours
                             ]
-                        },
-                        "else": None
-                    }
+                        }
+                    ]
                 }
             }
         },
         {
-            "$match": {"response_time_hours": {"$ne": None}}
+            "$facet": {
+                "summary": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "count": {"$sum": 1},
+                            "average": {"$avg": "$response_time_hours"},
+                            "fastest": {"$min": "$response_time_hours"},
+                            "slowest": {"$max": "$response_time_hours"},
+                            "percentiles": {"$percentile": percentile_input}
+                        }
+                    }
+                ],
+                "breakdown": [
+                    {
+                        "$bucket": {
+                            "groupBy": "$response_time_hours",
+                            "boundaries": [lower for lower, _ in RESPONSE_TIME_BUCKETS],
+                            "default": RESPONSE_TIME_BUCKETS[-1][0],
+                            "output": {"count": {"$sum": 1}}
+                        }
+                    }
+                ],
+                "by_agent": [
+                    {
+                        "$group": {
+                            "_id": "$assigned_agent_id",
+                            "count": {"$sum": 1},
+                            "average": {"$avg": "$response_time_hours"},
+                            "percentiles": {"$percentile": percentile_input}
+                        }
+                    },
+                    {"$sort": {"count": -1}}
+                ],
+                "by_source": [
+                    {
+                        "$group": {
+                            "_id": "$source",
+                            "count": {"$sum": 1},
+                            "average": {"$avg": "$response_time_hours"},
+                            "percentiles": {"$percentile": percentile_input}
+                        }
+                    },
+                    {"$sort": {"count": -1}}
+                ]
+            }
         }
     ]
     
     cursor = leads_collection.aggregate(pipeline)
-    response_times = []
+    results = await cursor.to_list(length=1)
+    facets = results[0] if results else {}
     
-    async for doc in cursor:
-        if doc["response_time_hours"] is not None:
-            response_times.append(doc["response_time_hours"])
-    
-    if not response_times:
+    summary = facets.get("summary") or []
+    if not summary:
         return {
             "average_response_time_hours": 0,
             "median_response_time_hours": 0,
+            "p90_response_time_hours": 0,
+            "p99_response_time_hours": 0,
             "fastest_response_hours": 0,
             "slowest_response_hours": 0,
             "total_responded_leads": 0,
-            "response_time_breakdown": []
+            "response_time_breakdown": [],
+            "by_agent": [],
+            "by_source": []
         }
     
-    response_times.sort()
-    total_leads = len(response_times)
-    
-    # Calculate statistics
-    average_response = sum(response_times) / total_leads
-    median_response = response_times[total_leads // 2] if total_leads % 2 == 1 else (response_times[total_leads // 2 - 1] + response_times[total_leads // 2]) / 2
+    summary = summary[0]
+    total_leads = summary["count"]
+    overall = _percentiles(summary["percentiles"], ["p50", "p90", "p99"])
     
     # Response time breakdown
-    breakdown = {
-        "< 1 hour": len([t for t in response_times if t < 1]),
-        "1-4 hours": len([t for t in response_times if 1 <= t < 4]),
-        "4-24 hours": len([t for t in response_times if 4 <= t < 24]),
-        "1-3 days": len([t for t in response_times if 24 <= t < 72]),
-        "> 3 days": len([t for t in response_times if t >= 72])
-    }
+    bucket_counts = {doc["_id"]: doc["count"] for doc in facets.get("breakdown", [])}
+    breakdown_list = []
+    for lower, range_name in RESPONSE_TIME_BUCKETS:
+        count = bucket_counts.get(lower, 0)
+        breakdown_list.append({
+            "range": range_name,
+            "count": count,
+            "percentage": round(count / total_leads * 100, 2)
+        })
     
-    breakdown_list = [
-        {"range": range_name, "count": count, "percentage": round(count/total_leads*100, 2)}
-        for range_name, count in breakdown.items()
-    ]
+    # Resolve agent names in one query
+    agent_ids = [doc["_id"] for doc in facets.get("by_agent", []) if doc["_id"] is not None]
+    agent_names = {}
+    if agent_ids:
+        users_collection = get_collection(Collections.USERS)
+        async for user in users_collection.find({"_id": {"$in": agent_ids}}, {"full_name": 1}):
+            agent_names[user["_id"]] = user.get("full_name", "Unknown")
+    
+    by_agent = []
+    for doc in facets.get("by_agent", []):
+        agent_percentiles = _percentiles(doc["percentiles"], ["p50", "p90", "p99"])
+        by_agent.append({
+            "agent_id": str(doc["_id"]) if doc["_id"] else None,
+            "agent_name": agent_names.get(doc["_id"], "Unassigned" if doc["_id"] is None else "Unknown"),
+            "responded_leads": doc["count"],
+            "average_response_time_hours": round(doc["average"] or 0, 2),
+            "median_response_time_hours": agent_percentiles["p50"],
+            "p90_response_time_hours": agent_percentiles["p90"],
+            "p99_response_time_hours": agent_percentiles["p99"]
+        })
+    
+    by_source = []
+    for doc in facets.get("by_source", []):
+        source_percentiles = _percentiles(doc["percentiles"], ["p50", "p90", "p99"])
+        by_source.append({
+            "source": doc["_id"] or "unknown",
+            "responded_leads": doc["count"],
+            "average_response_time_hours": round(doc["average"] or 0, 2),
+            "median_response_time_hours": source_percentiles["p50"],
+            "p90_response_time_hours": source_percentiles["p90"],
+            "p99_response_time_hours": source_percentiles["p99"]
+        })
     
     return {
-        "average_response_time_hours": round(average_response, 2),
-        "median_response_time_hours": round(median_response, 2),
-        "fastest_response_hours": round(min(response_times), 2),
-        "slowest_response_hours": round(max(response_times), 2),
+        "average_response_time_hours": round(summary["average"] or 0, 2),
+        "median_response_time_hours": overall["p50"],
+        "p90_response_time_hours": overall["p90"],
+        "p99_response_time_hours": overall["p99"],
+        "fastest_response_hours": round(summary["fastest"] or 0, 2),
+        "slowest_response_hours": round(summary["slowest"] or 0, 2),
         "total_responded_leads": total_leads,
-        "response_time_breakdown": breakdown_list
+        "response_time_breakdown": breakdown_list,
+        "by_agent": by_agent,
+        "by_source": by_source
     }
 
 @router.get("/geographic-distribution")
+@register_report("geographic-distribution")
 async def get_geographic_distribution(
     days: int = Query(90, description="Number of days to analyze"),
+    fresh: bool = Query(False, description="Compute live instead of from report snapshots"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Analyze lead geographic distribution"""
     
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
-    collection = get_collection(Collections.MAIN_DATA)
+    if run_async:
+        return await queue_report("geographic-distribution", {"days": days, "fresh": fresh}, current_user)
     
-    # Base filter
-    base_filter = {"created_at": {"$gte": start_date}}
+    # Agents only see their own leads
+    agent_id = None
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
-    
-    # Group by state
-    pipeline = [
-        {"$match": base_filter},
-        {
-            "$group": {
-                "_id": "$state",
-                "count": {"$sum": 1},
-                "total_estimated_value": {"$sum": "$estimated_value"},
-                "avg_estimated_value": {"$avg": "$estimated_value"},
-                "closed_won": {
-                    "$sum": {"$cond": [{"$eq": ["$status", "closed_won"]}, 1, 0]}
+        agent_id = current_user["_id"]
+    
+    snapshot = None if fresh else await read_snapshot(
+        "geographic-distribution", days, "$key.state",
+        ["count", "closed_won", "value_sum", "value_count"], agent_id, sort={"count": -1, "_id": 1}
+    )
+    city_snapshot = await read_snapshot(
+        "geographic-distribution", days, "$key", ["count"], agent_id, sort={"count": -1}, limit=10
+    ) if snapshot else None
+    
+    if snapshot and city_snapshot:
+        state_rows, freshness = snapshot
+        city_rows = city_snapshot[0]
+        for row in state_rows:
+            row["total_estimated_value"] = row["value_sum"]
+            row["avg_estimated_value"] = row["value_sum"] / row["value_count"] if row["value_count"] else None
+    else:
+        start_date = datetime.now(timezone.utc) - timedelta(days=days)
+        collection = get_collection(Collections.MAIN_DATA)
+        
+        # Base filter
+        base_filter = {"created_at": {"$gte": start_date}, "deleted_at": {"$exists": False}}
+        if agent_id:
+            base_filter["assigned_agent_id"] = agent_id
+        
+        # Group by state
+        pipeline = [
+            {"$match": base_filter},
+            {
+                "$group": {
+                    "_id": "$state",
+                    "count": {"$sum": 1},
+                    "total_estimated_value": {"$sum": "$estimated_value"},
+                    "avg_estimated_value": {"$avg": "$estimated_value"},
+                    "closed_won": {
+                        "$sum": {"$cond": [{"$eq": ["$status", "closed_won"]}, 1, 0]}
+                    }
                 }
-            }
-        },
-        {"$sort": {"count": -1}}
-    ]
+            },
+            {"$sort": {"count": -1}}
+        ]
+        state_rows = await collection.aggregate(pipeline).to_list(length=None)
+        
+        # Group by city for top cities
+        city_pipeline = [
+            {"$match": base_filter},
+            {
+                "$group": {
+                    "_id": {"city": "$city", "state": "$state"},
+                    "count": {"$sum": 1}
+                }
+            },
+            {"$sort": {"count": -1}},
+            {"$limit": 10}
+        ]
+        city_rows = await collection.aggregate(city_pipeline).to_list(length=None)
+        freshness = live_freshness()
     
-    cursor = collection.aggregate(pipeline)
     state_data = []
     total_leads = 0
     
-    async for doc in cursor:
+    for doc in state_rows:
         count = doc["count"]
         total_leads += count
         
@@ -569,26 +857,12 @@ async def get_geographic_distribution(
     for state in state_data:
         state["percentage"] = round((state["count"] / total_leads) * 100, 2) if total_leads > 0 else 0
     
-    # Group by city for top cities
-    city_pipeline = [
-        {"$match": base_filter},
-        {
-            "$group": {
-                "_id": {"city": "$city", "state": "$state"},
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"count": -1}},
-        {"$limit": 10}
-    ]
-    
-    city_cursor = collection.aggregate(city_pipeline)
     city_data = []
     
-    async for doc in city_cursor:
+    for doc in city_rows:
         city_data.append({
-            "city": doc["_id"]["city"] or "Unknown",
-            "state": doc["_id"]["state"] or "Unknown",
+            "city": doc["_id"].get("city") or "Unknown",
+            "state": doc["_id"].get("state") or "Unknown",
             "count": doc["count"]
         })
     
@@ -596,91 +870,120 @@ async def get_geographic_distribution(
         "by_state": state_data,
         "top_cities": city_data,
         "total_leads": total_leads,
-        "period_days": days
+        "period_days": days,
+        "freshness": freshness
     }
 
 @router.get("/pipeline-velocity")
+@register_report("pipeline-velocity")
 async def get_pipeline_velocity(
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Analyze pipeline velocity - average time in each stage"""
     
+    if run_async:
+        return await queue_report("pipeline-velocity", {}, current_user)
+    
     activities_collection = get_collection(Collections.ACTIVITIES)
     
-    # Base filter for status change activities
-    base_filter = {"activity_type": "status_change"}
+    # Stages we report on, in pipeline order
+    stages = ["new", "contacted", "qualified", "proposal_sent"]
     
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        # Get only activities for leads assigned to this user
-        leads_collection = get_collection(Collections.MAIN_DATA)
-        user_leads_cursor = leads_collection.find(
-            {"assigned_agent_id": current_user["_id"]},
-            {"_id": 1}
-        )
-        user_lead_ids = [lead["_id"] async for lead in user_leads_cursor]
-        base_filter["lead_id"] = {"$in": user_lead_ids}
-    
-    # Get all status change activities ordered by lead and time
-    cursor = activities_collection.find(base_filter).sort([("lead_id", 1), ("created_at", 1)])
-    
-    # Group activities by lead
-    lead_activities = {}
-    async for activity in cursor:
-        lead_id = str(activity["lead_id"])
-        if lead_id not in lead_activities:
-            lead_activities[lead_id] = []
-        lead_activities[lead_id].append(activity)
-    
-    # Calculate time in each stage
-    stage_times = {
-        "new": [],
-        "contacted": [],
-        "qualified": [],
-        "proposal_sent": []
+    # Base filter for structured status change activities
+    base_filter = {
+        "activity_type": "status_change",
+        "from_status": {"$exists": True}
     }
     
-    for lead_id, activities in lead_activities.items():
-        if len(activities) < 2:
-            continue
-        
-        for i in range(len(activities) - 1):
-            current_activity = activities[i]
-            next_activity = activities[i + 1]
-            
-            # Extract status from description (format: "Status changed from X to Y")
-            desc = current_activity.get("description", "")
-            if "Status changed from" in desc:
-                try:
-                    parts = desc.split(" to ")
-                    if len(parts) == 2:
-                        from_status = parts[0].split("from ")[-1].strip()
-                        
-                        # Calculate time difference in hours
-                        time_diff = (next_activity["created_at"] - current_activity["created_at"]).total_seconds() / 3600
-                        
-                        if from_status in stage_times:
-                            stage_times[from_status].append(time_diff)
-                except:
-                    continue
-    
-    # Calculate average times
+    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
+        # Activities carry the owning agent, so filter on it directly
+        base_filter["assigned_agent_id"] = current_user["_id"]
+    
+    # The time spent in `from_status` is the gap since the lead's previous
+    # transition (the one that moved it into that status); a lead's first
+    # transition is measured from the lead's creation instead
+    pipeline = [
+        {"$match": base_filter},
+        {
+            "$setWindowFields": {
+                "partitionBy": "$lead_id",
+                "sortBy": {"created_at": 1},
+                "output": {
+                    "previous_change_at": {"$shift": {"output": "$created_at", "by": -1}}
+                }
+            }
+        },
+        {"$match": {"from_status": {"$in": stages}}},
+        {
+            "$lookup": {
+                "from": Collections.MAIN_DATA,
+                "localField": "lead_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"created_at": 1}}],
+                "as": "lead"
+            }
+        },
+        {
+            "$project": {
+                "stage": "$from_status",
+                "entered_at": {"$ifNull": ["$previous_change_at", {"$first": "$lead.created_at"}]},
+                "created_at": 1
+            }
+        },
+        # Leads purged since have nothing to measure the first transition from
+        {"$match": {"entered_at": {"$ne": None}}},
+        {
+            "$project": {
+                "stage": 1,
+                "hours": {
+                    "$divide": [
+                        {"$subtract": ["$created_at", "$entered_at"]},
+                        3600000  # Convert milliseconds to hours
+                    ]
+                }
+            }
+        },
+        {
+            "$group": {
+                "_id": "$stage",
+                "sample_size": {"$sum": 1},
+                "average_hours": {"$avg": "$hours"},
+                "min_hours": {"$min": "$hours"},
+                "max_hours": {"$max": "$hours"},
+                "percentiles": {
+                    "$percentile": {"input": "$hours", "p": [0.5, 0.9], "method": "approximate"}
+                }
+            }
+        }
+    ]
+    
+    cursor = activities_collection.aggregate(pipeline)
+    stage_stats = {doc["_id"]: doc async for doc in cursor}
+    
     velocity_data = []
-    for stage, times in stage_times.items():
-        if times:
-            avg_hours = sum(times) / len(times)
+    for stage in stages:
+        stats = stage_stats.get(stage)
+        if stats:
+            avg_hours = stats["average_hours"] or 0
+            percentiles = _percentiles(stats["percentiles"], ["p50", "p90"])
             velocity_data.append({
                 "stage": stage,
                 "average_time_hours": round(avg_hours, 2),
                 "average_time_days": round(avg_hours / 24, 2),
-                "sample_size": len(times),
-                "min_time_hours": round(min(times), 2),
-                "max_time_hours": round(max(times), 2)
+                "median_time_hours": percentiles["p50"],
+                "p90_time_hours": percentiles["p90"],
+                "sample_size": stats["sample_size"],
+                "min_time_hours": round(stats["min_hours"], 2),
+                "max_time_hours": round(stats["max_hours"], 2)
             })
         else:
             velocity_data.append({
                 "stage": stage,
                 "average_time_hours": 0,
                 "average_time_days": 0,
+                "median_time_hours": 0,
+                "p90_time_hours": 0,
                 "sample_size": 0,
                 "min_time_hours": 0,
                 "max_time_hours": 0
@@ -689,17 +992,22 @@ async def get_pipeline_velocity(
     return {"velocity_data": velocity_data}
 
 @router.get("/performance-trends")
+@register_report("performance-trends")
 async def get_performance_trends(
     days: int = Query(30, description="Number of days to analyze"),
+    run_async: bool = Query(False, alias="async", description="Compute in the background and return a job id"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get performance trends over time"""
     
+    if run_async:
+        return await queue_report("performance-trends", {"days": days}, current_user)
+    
     start_date = datetime.now(timezone.utc) - timedelta(days=days)
     collection = get_collection(Collections.MAIN_DATA)
     
     # Base filter
-    base_filter = {"created_at": {"$gte": start_date}}
+    base_filter = {"created_at": {"$gte": start_date}, "deleted_at": {"$exists": False}}
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
         base_filter["assigned_agent_id"] = current_user["_id"]
     
@@ -0,0 +1,233 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+from urllib.parse import quote as url_quote
+from bson import ObjectId
+
+from database import get_collection, Collections
+import models
+from auth_utils import get_current_active_user
+from pagination import fetch_page
+from attachments import (
+    AttachmentTooLarge,
+    ATTACHMENT_LIST_PROJECTION,
+    MAX_ATTACHMENT_BYTES,
+    store_attachment,
+    delete_attachments,
+    download_url,
+    parse_range,
+    stream_range,
+)
+
+router = APIRouter()
+
+# Helper function to convert ObjectId to string
+def serialize_doc(doc):
+    """Convert MongoDB document to JSON-serializable format"""
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [serialize_doc(item) for item in doc]
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, (dict, list)):
+                result[key] = serialize_doc(value)
+            else:
+                result[key] = value
+
+        # Convert _id to id
+        if "_id" in result:
+            result["id"] = result.pop("_id")
+
+        return result
+    return doc
+
+def serialize_attachment(attachment):
+    result = serialize_doc(attachment)
+    result.pop("file_id", None)
+    result["url"] = download_url(result["id"])
+    return result
+
+async def resolve_owner(lead_id: Optional[str], quote_id: Optional[str], current_user: dict) -> dict:
+    """Owner filter for a lead or quote the user may access ({lead_id} or {lead_id, quote_id})"""
+    if (lead_id is None) == (quote_id is None):
+        raise HTTPException(status_code=400, detail="Provide either lead_id or quote_id")
+
+    owner = {}
+    if quote_id is not None:
+        if not ObjectId.is_valid(quote_id):
+            raise HTTPException(status_code=400, detail="Invalid quote ID format")
+        quote = await get_collection(Collections.QUOTES).find_one({"_id": ObjectId(quote_id)}, {"lead_id": 1})
+        if not quote:
+            raise HTTPException(status_code=404, detail="Quote not found")
+        owner["quote_id"] = quote["_id"]
+        lead_id = str(quote["lead_id"])
+
+    if not ObjectId.is_valid(lead_id):
+        raise HTTPException(status_code=400, detail="Invalid lead ID format")
+    lead = await get_collection(Collections.MAIN_DATA).find_one(
+        {"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}}, {"assigned_agent_id": 1}
+    )
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+
+    # Check permissions
+    if (current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value] and
+        lead.get("assigned_agent_id") != current_user["_id"]):
+        raise HTTPException(status_code=403, detail="Not authorized to access this lead")
+
+    owner["lead_id"] = lead["_id"]
+    return owner
+
+async def get_accessible_attachment(attachment_id: str, current_user: dict) -> dict:
+    if not ObjectId.is_valid(attachment_id):
+        raise HTTPException(status_code=400, detail="Invalid attachment ID format")
+
+    attachment = await get_collection(Collections.ATTACHMENTS).find_one({"_id": ObjectId(attachment_id)})
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    await resolve_owner(str(attachment["lead_id"]), None, current_user)
+    return attachment
+
+# Upload an attachment
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def upload_attachment(
+    request: Request,
+    filename: str = Query(..., min_length=1, max_length=255),
+    lead_id: Optional[str] = None,
+    quote_id: Optional[str] = None,
+    content_type: str = Header("application/octet-stream"),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Attach a file to a lead or quote.
+
+    The request body is the raw file (not multipart); it is streamed into
+    storage chunk by chunk. Identical files are stored once.
+    """
+
+    owner = await resolve_owner(lead_id, quote_id, current_user)
+
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_ATTACHMENT_BYTES:
+        raise HTTPException(status_code=413, detail="Attachment is too large")
+
+    try:
+        attachment = await store_attachment(
+            request.stream(), filename, content_type,
+            owner["lead_id"], owner.get("quote_id"), current_user["_id"]
+        )
+    except AttachmentTooLarge:
+        raise HTTPException(status_code=413, detail="Attachment is too large")
+
+    # Quotes keep their attachment URLs alongside the other quote fields
+    if owner.get("quote_id"):
+        await get_collection(Collections.QUOTES).update_one(
+            {"_id": owner["quote_id"]}, {"$push": {"attachments": download_url(attachment["_id"])}}
+        )
+
+    return serialize_attachment(attachment)
+
+# List attachments of a lead or quote
+@router.get("/")
+async def get_attachments(
+    lead_id: Optional[str] = None,
+    quote_id: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="Continuation cursor from a previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """List attachment metadata newest first, with keyset paging (file contents are not read)"""
+
+    owner = await resolve_owner(lead_id, quote_id, current_user)
+    # A lead's listing covers files attached to its quotes too
+    query_filter = {"quote_id": owner["quote_id"]} if "quote_id" in owner else {"lead_id": owner["lead_id"]}
+
+    collection = get_collection(Collections.ATTACHMENTS)
+    attachments, next_cursor = await fetch_page(collection, query_filter, limit, cursor, projection=ATTACHMENT_LIST_PROJECTION)
+
+    return {"attachments": [serialize_attachment(attachment) for attachment in attachments], "next_cursor": next_cursor}
+
+# Get attachment metadata
+@router.get("/{attachment_id}")
+async def get_attachment(
+    attachment_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get an attachment's metadata"""
+
+    attachment = await get_accessible_attachment(attachment_id, current_user)
+    return serialize_attachment(attachment)
+
+# Download an attachment
+@router.get("/{attachment_id}/download")
+async def download_attachment(
+    attachment_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Stream an attachment; supports single byte ranges and ETag revalidation"""
+
+    attachment = await get_accessible_attachment(attachment_id, current_user)
+
+    length = attachment["length"]
+    etag = f'"{attachment["sha256"]}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{url_quote(attachment['filename'])}"
+    }
+
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(range_header, length)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{length}"})
+
+    if byte_range is None:
+        start, end, status_code = 0, length - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    return StreamingResponse(
+        stream_range(attachment["file_id"], start, end),
+        status_code=status_code,
+        media_type=attachment.get("content_type") or "application/octet-stream",
+        headers=headers
+    )
+
+# Delete an attachment
+@router.delete("/{attachment_id}")
+async def delete_attachment(
+    attachment_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Delete an attachment (uploader or manager+); the file is removed once nothing references it"""
+
+    attachment = await get_accessible_attachment(attachment_id, current_user)
+
+    if (current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value] and
+        attachment.get("uploaded_by") != current_user["_id"]):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    await delete_attachments({"_id": attachment["_id"]})
+
+    if attachment.get("quote_id"):
+        await get_collection(Collections.QUOTES).update_one(
+            {"_id": attachment["quote_id"]}, {"$pull": {"attachments": download_url(attachment["_id"])}}
+        )
+
+    return {"message": "Attachment deleted successfully"}
@@ -15,6 +15,9 @@ from auth_utils import (
     require_role,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from jobs import enqueue_job
+from cascade import REDISTRIBUTE_LEADS_JOB
+from routing import lead_router
 
 router = APIRouter()
 
@@ -205,6 +208,11 @@ async def update_user(
             {"$set": update_data}
         )
     
+    # Hand a deactivated user's open leads to the active agents
+    if update_data.get("is_active") is False and user.get("is_active", True):
+        lead_router.invalidate()
+        await enqueue_job(REDISTRIBUTE_LEADS_JOB, {"agent_id": user_id, "user_id": current_user["_id"]}, user_id=current_user["_id"])
+    
     # Get updated user
     updated_user = await users_collection.find_one({"_id": ObjectId(user_id)})
     return serialize_doc(updated_user)
@@ -237,7 +245,11 @@ async def delete_user(
         {"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc)}}
     )
     
-    return {"message": "User deactivated successfully"}
+    # Stop routing new leads to them and hand their open leads to the active agents
+    lead_router.invalidate()
+    job_id = await enqueue_job(REDISTRIBUTE_LEADS_JOB, {"agent_id": user_id, "user_id": current_user["_id"]}, user_id=current_user["_id"])
+    
+    return {"message": "User deactivated successfully", "job_id": str(job_id)}
 
 @router.post("/create-admin")
 async def create_admin_user():
@@ -0,0 +1,166 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Optional
+from datetime import datetime, timezone
+from bson import ObjectId
+
+from database import get_collection, Collections
+import models
+import schemas
+from auth_utils import require_role
+from jobs import enqueue_job
+from email_templates import template_engine
+from campaigns import SEND_CAMPAIGN_JOB, build_segment_filter, campaign_metrics
+
+router = APIRouter()
+
+# Helper function to convert ObjectId to string
+def serialize_doc(doc):
+    """Convert MongoDB document to JSON-serializable format"""
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [serialize_doc(item) for item in doc]
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, (dict, list)):
+                result[key] = serialize_doc(value)
+            else:
+                result[key] = value
+
+        # Convert _id to id
+        if "_id" in result:
+            result["id"] = result.pop("_id")
+
+        return result
+    return doc
+
+def serialize_campaign(campaign):
+    campaign["stats"] = campaign_metrics(campaign)
+    return serialize_doc(campaign)
+
+async def get_campaign_or_404(campaign_id: str) -> dict:
+    if not ObjectId.is_valid(campaign_id):
+        raise HTTPException(status_code=400, detail="Invalid campaign ID format")
+    campaign = await get_collection(Collections.CAMPAIGNS).find_one({"_id": ObjectId(campaign_id)})
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+# Count the leads a segment would reach
+@router.post("/segment/count")
+async def count_segment(
+    segment: schemas.CampaignSegment,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Number of leads with an email address matching a segment (manager+ only)"""
+
+    query_filter = build_segment_filter(segment.dict(), current_user)
+    count = await get_collection(Collections.MAIN_DATA).count_documents(query_filter)
+
+    return {"count": count}
+
+# List campaigns
+@router.get("/")
+async def get_campaigns(
+    status: Optional[models.CampaignStatus] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """List campaigns, newest first (manager+ only)"""
+
+    query_filter = {"status": status.value} if status else {}
+    collection = get_collection(Collections.CAMPAIGNS)
+    campaigns = await collection.find(query_filter).sort("created_at", -1).limit(limit).to_list(length=limit)
+
+    return [serialize_campaign(campaign) for campaign in campaigns]
+
+# Create campaign
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def create_campaign(
+    campaign: schemas.CampaignCreate,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Create a draft campaign for a segment and template (manager+ only)"""
+
+    if template_engine.get(campaign.template_name) is None:
+        raise HTTPException(status_code=400, detail="Unknown email template")
+
+    now = datetime.now(timezone.utc)
+    campaign_data = {
+        "name": campaign.name,
+        "template_name": campaign.template_name,
+        "segment": campaign.segment.dict(),
+        "status": models.CampaignStatus.DRAFT.value,
+        "stats": {"recipients": 0, "sent": 0, "failed": 0, "interrupted": 0, "send_seconds": 0},
+        "job_id": None,
+        "created_by": current_user["_id"],
+        "created_at": now,
+        "updated_at": now
+    }
+    collection = get_collection(Collections.CAMPAIGNS)
+    result = await collection.insert_one(campaign_data)
+
+    created = await collection.find_one({"_id": result.inserted_id})
+    return serialize_campaign(created)
+
+# Get campaign with delivery metrics
+@router.get("/{campaign_id}")
+async def get_campaign(
+    campaign_id: str,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Get a campaign with its delivery counts and throughput"""
+
+    campaign = await get_campaign_or_404(campaign_id)
+    return serialize_campaign(campaign)
+
+# Start sending a campaign
+@router.post("/{campaign_id}/send", status_code=status.HTTP_202_ACCEPTED)
+async def send_campaign(
+    campaign_id: str,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Snapshot the segment and send in a background job; poll the campaign or job for progress"""
+
+    await get_campaign_or_404(campaign_id)
+
+    # Only one request can move a draft to sending
+    collection = get_collection(Collections.CAMPAIGNS)
+    now = datetime.now(timezone.utc)
+    claimed = await collection.find_one_and_update(
+        {"_id": ObjectId(campaign_id), "status": models.CampaignStatus.DRAFT.value},
+        {"$set": {"status": models.CampaignStatus.SENDING.value, "started_at": now, "updated_at": now}}
+    )
+    if not claimed:
+        raise HTTPException(status_code=400, detail="Only draft campaigns can be sent")
+
+    job_id = await enqueue_job(SEND_CAMPAIGN_JOB, {"campaign_id": campaign_id}, current_user["_id"])
+    await collection.update_one({"_id": ObjectId(campaign_id)}, {"$set": {"job_id": job_id}})
+
+    return {"campaign_id": campaign_id, "job_id": str(job_id), "status": models.CampaignStatus.SENDING.value}
+
+# Stop a campaign that is sending
+@router.post("/{campaign_id}/cancel")
+async def cancel_campaign(
+    campaign_id: str,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Stop sending after the batch in flight; recipients not yet reached stay pending"""
+
+    await get_campaign_or_404(campaign_id)
+
+    now = datetime.now(timezone.utc)
+    cancelled = await get_collection(Collections.CAMPAIGNS).find_one_and_update(
+        {"_id": ObjectId(campaign_id), "status": {"$in": [models.CampaignStatus.DRAFT.value, models.CampaignStatus.SENDING.value]}},
+        {"$set": {"status": models.CampaignStatus.CANCELLED.value, "finished_at": now, "updated_at": now}},
+        return_document=True
+    )
+    if not cancelled:
+        raise HTTPException(status_code=400, detail="Campaign has already finished")
+
+    return serialize_campaign(cancelled)
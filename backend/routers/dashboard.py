@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta, timezone
 from bson import ObjectId
+import asyncio
 
 from database import get_collection, Collections
 import models
 import schemas
-from auth_utils import get_current_active_user
+from auth_utils import get_current_active_user, get_stream_user, require_role
+from aggregations import group_by_dimension, grand_total
+from streaming import ndjson_response
+from settings_service import get_follow_up_statuses, get_upcoming_follow_up_days
+from live_events import live_events, user_scope
+from lead_utils import build_lead_filter
 
 router = APIRouter()
 
@@ -33,101 +40,240 @@ def serialize_doc(doc):
         return result
     return doc
 
-@router.get("/stats")
-async def get_dashboard_stats(
-    current_user: dict = Depends(get_current_active_user)
-):
-    """Get comprehensive dashboard statistics"""
+# Panels of /overview, each shaped like the endpoint of the same name
+OVERVIEW_PANELS = ["stats", "leads_by_status", "leads_by_source", "notifications", "recent_leads", "upcoming_followups"]
+
+def lead_scope_filter(current_user: dict) -> dict:
+    """Live leads the user may see (agents only see their own)"""
+    return build_lead_filter(current_user, full_access_roles=(models.UserRole.ADMIN.value, models.UserRole.MANAGER.value))
+
+async def status_breakdown(collection, base_filter: dict, now: datetime) -> dict:
+    """Per-status lead counts with every /stats and /notifications metric, in one pass"""
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    collection = get_collection(Collections.MAIN_DATA)
+    return await group_by_dimension(
+        collection,
+        base_filter,
+        "status",
+        buckets=[status.value for status in models.LeadStatus],
+        counts={
+            "this_week": {"$gte": ["$created_at", week_ago]},
+            "this_month": {"$gte": ["$created_at", month_ago]},
+            "today": {"$gte": ["$created_at", today_start]},
+            # A missing date would otherwise compare as earlier than now
+            "overdue": {"$and": [
+                {"$eq": [{"$type": "$next_follow_up_date"}, "date"]},
+                {"$lt": ["$next_follow_up_date", now]}
+            ]},
+            "high_priority": {"$gte": ["$priority", 3]}
+        },
+        sums={"estimated_value": "estimated_value"}
+    )
+
+def build_stats(groups: dict) -> dict:
+    total_leads = grand_total(groups)
     
-    # Base filter for user role
-    base_filter = {}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+    # Calculate conversion rate
+    closed_won = groups["closed_won"]["total"]
+    total_closed = closed_won + groups["closed_lost"]["total"]
+    conversion_rate = (closed_won / total_closed * 100) if total_closed > 0 else 0
     
-    # Get current date ranges
-    now = datetime.now(timezone.utc)
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
+    return {
+        "total_leads": total_leads,
+        "new_leads": groups["new"]["total"],
+        "qualified_leads": groups["qualified"]["total"],
+        "closed_won": closed_won,
+        "closed_lost": groups["closed_lost"]["total"],
+        "conversion_rate": round(conversion_rate, 2),
+        "total_estimated_value": sum(group["estimated_value"] or 0 for group in groups.values()),
+        "leads_this_week": sum(group["this_week"] for group in groups.values()),
+        "leads_this_month": sum(group["this_month"] for group in groups.values())
+    }
+
+def build_distribution(groups: dict, values, label: str) -> dict:
+    """Counts and percentages per status or source, largest first"""
+    total_leads = grand_total(groups)
     
-    # Total leads
-    total_leads = await collection.count_documents(base_filter)
+    distribution = []
+    for value in values:
+        count = groups[value.value]["total"]
+        percentage = (count / total_leads * 100) if total_leads > 0 else 0
+        
+        distribution.append({
+            label: value.value.title().replace("_", " "),
+            "count": count,
+            "percentage": round(percentage, 2)
+        })
     
-    # Leads by status
-    status_counts = {}
-    for status in models.LeadStatus:
-        count = await collection.count_documents({**base_filter, "status": status.value})
-        status_counts[status.value] = count
+    # Sort by count descending
+    distribution.sort(key=lambda x: x["count"], reverse=True)
     
-    # Recent leads (this week and month)
-    leads_this_week = await collection.count_documents({
-        **base_filter,
-        "created_at": {"$gte": week_ago}
-    })
+    return {f"{label}_distribution": distribution, "total_leads": total_leads}
+
+def build_notifications(groups: dict) -> dict:
+    notifications = []
     
-    leads_this_month = await collection.count_documents({
-        **base_filter,
-        "created_at": {"$gte": month_ago}
-    })
+    # Overdue follow-ups
+    overdue_count = sum(groups[status]["overdue"] for status in get_follow_up_statuses() if status in groups)
     
-    # Calculate conversion rate
-    total_closed = status_counts.get("closed_won", 0) + status_counts.get("closed_lost", 0)
-    conversion_rate = (status_counts.get("closed_won", 0) / total_closed * 100) if total_closed > 0 else 0
+    if overdue_count > 0:
+        notifications.append({
+            "type": "warning",
+            "title": "Overdue Follow-ups",
+            "message": f"You have {overdue_count} overdue follow-up{'s' if overdue_count > 1 else ''}",
+            "count": overdue_count,
+            "priority": "high"
+        })
     
-    # Total estimated value
-    pipeline = [
-        {"$match": base_filter},
-        {"$group": {"_id": None, "total_value": {"$sum": "$estimated_value"}}}
-    ]
-    cursor = collection.aggregate(pipeline)
-    value_result = await cursor.to_list(length=1)
-    total_estimated_value = value_result[0]["total_value"] if value_result else 0
+    # New leads today
+    new_today = groups["new"]["today"]
     
+    if new_today > 0:
+        notifications.append({
+            "type": "info",
+            "title": "New Leads Today",
+            "message": f"{new_today} new lead{'s' if new_today > 1 else ''} received today",
+            "count": new_today,
+            "priority": "medium"
+        })
+    
+    # Hot prospects (high priority qualified leads)
+    hot_prospects = groups["qualified"]["high_priority"]
+    
+    if hot_prospects > 0:
+        notifications.append({
+            "type": "success",
+            "title": "Hot Prospects",
+            "message": f"{hot_prospects} high-priority qualified lead{'s' if hot_prospects > 1 else ''}",
+            "count": hot_prospects,
+            "priority": "high"
+        })
+    
+    # Sort by priority
+    priority_order = {"high": 3, "medium": 2, "low": 1}
+    notifications.sort(key=lambda x: priority_order.get(x["priority"], 0), reverse=True)
+    
+    return {"notifications": notifications}
+
+def upcoming_followups_filter(current_user: dict, now: datetime, days: Optional[int]) -> dict:
+    future_date = now + timedelta(days=days or get_upcoming_follow_up_days())
     return {
-        "total_leads": total_leads,
-        "new_leads": status_counts.get("new", 0),
-        "qualified_leads": status_counts.get("qualified", 0),
-        "closed_won": status_counts.get("closed_won", 0),
-        "closed_lost": status_counts.get("closed_lost", 0),
-        "conversion_rate": round(conversion_rate, 2),
-        "total_estimated_value": total_estimated_value or 0,
-        "leads_this_week": leads_this_week,
-        "leads_this_month": leads_this_month
+        **lead_scope_filter(current_user),
+        "next_follow_up_date": {"$gte": now, "$lte": future_date},
+        "status": {"$in": get_follow_up_statuses()}
     }
 
-@router.get("/leads-by-status")
-async def get_leads_by_status(
+@router.get("/overview")
+async def get_dashboard_overview(
+    panels: Optional[str] = Query(None, description=f"Comma-separated panels to include (default all): {', '.join(OVERVIEW_PANELS)}"),
+    recent_limit: int = Query(10, ge=1, le=100, description="Number of recent leads to return"),
+    followup_days: Optional[int] = Query(None, ge=1, description="Number of days ahead to check (default from settings)"),
     current_user: dict = Depends(get_current_active_user)
 ):
-    """Get leads distribution by status"""
+    """Several dashboard panels in one request.
+
+    Panels sharing a query share its result (stats, leads_by_status and
+    notifications all come from one pass over the leads), and the queries
+    that are needed run concurrently.
+    """
+    
+    requested = OVERVIEW_PANELS
+    if panels:
+        requested = [panel.strip().replace("-", "_") for panel in panels.split(",") if panel.strip()]
+        unknown = [panel for panel in requested if panel not in OVERVIEW_PANELS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown panels: {', '.join(unknown)}")
     
     collection = get_collection(Collections.MAIN_DATA)
+    base_filter = lead_scope_filter(current_user)
+    now = datetime.now(timezone.utc)
     
-    # Base filter for user role
-    base_filter = {}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+    queries = {}
+    if {"stats", "leads_by_status", "notifications"} & set(requested):
+        queries["statuses"] = status_breakdown(collection, base_filter, now)
+    if "leads_by_source" in requested:
+        queries["sources"] = group_by_dimension(
+            collection, base_filter, "source", buckets=[source.value for source in models.LeadSource]
+        )
+    if "recent_leads" in requested:
+        queries["recent_leads"] = collection.find(base_filter).sort("created_at", -1).limit(recent_limit).to_list(length=recent_limit)
+    if "upcoming_followups" in requested:
+        queries["upcoming_followups"] = collection.find(
+            upcoming_followups_filter(current_user, now, followup_days)
+        ).sort("next_follow_up_date", 1).to_list(length=None)
+    
+    results = dict(zip(queries, await asyncio.gather(*queries.values())))
+    
+    overview = {}
+    for panel in requested:
+        if panel == "stats":
+            overview[panel] = build_stats(results["statuses"])
+        elif panel == "leads_by_status":
+            overview[panel] = build_distribution(results["statuses"], models.LeadStatus, "status")
+        elif panel == "leads_by_source":
+            overview[panel] = build_distribution(results["sources"], models.LeadSource, "source")
+        elif panel == "notifications":
+            overview[panel] = build_notifications(results["statuses"])
+        elif panel == "recent_leads":
+            overview[panel] = {"recent_leads": [serialize_doc(lead) for lead in results["recent_leads"]]}
+        elif panel == "upcoming_followups":
+            overview[panel] = {"upcoming_followups": [serialize_doc(lead) for lead in results["upcoming_followups"]]}
+    
+    return overview
+
+@router.get("/stats")
+async def get_dashboard_stats(
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get comprehensive dashboard statistics"""
     
-    # Get total count first
-    total_leads = await collection.count_documents(base_filter)
+    collection = get_collection(Collections.MAIN_DATA)
+    groups = await status_breakdown(collection, lead_scope_filter(current_user), datetime.now(timezone.utc))
+    return build_stats(groups)
+
+@router.get("/events")
+async def stream_dashboard_events(
+    current_user: dict = Depends(get_stream_user)
+):
+    """Server-Sent Events for the user's scope, replacing polling of /stats and /leads/.
+
+    Load /stats once, then apply `counters` deltas as they arrive. `lead.*`
+    and `activity.created` events carry the changed document; on `resync`
+    reload everything. Browsers' EventSource can pass `?access_token=`.
+    """
+    
+    return StreamingResponse(
+        live_events.stream(user_scope(current_user)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/events/stats")
+async def get_dashboard_event_stats(
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Connected clients and relay counters for this worker (manager+ only)"""
+    return live_events.stats()
+
+@router.get("/leads-by-status")
+async def get_leads_by_status(
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get leads distribution by status"""
     
-    # Get counts by status
-    status_data = []
-    for status in models.LeadStatus:
-        count = await collection.count_documents({**base_filter, "status": status.value})
-        percentage = (count / total_leads * 100) if total_leads > 0 else 0
-        
-        status_data.append({
-            "status": status.value.title().replace("_", " "),
-            "count": count,
-            "percentage": round(percentage, 2)
-        })
+    collection = get_collection(Collections.MAIN_DATA)
     
-    # Sort by count descending
-    status_data.sort(key=lambda x: x["count"], reverse=True)
+    # Get counts for every status in one pass
+    groups = await group_by_dimension(
+        collection,
+        lead_scope_filter(current_user),
+        "status",
+        buckets=[status.value for status in models.LeadStatus]
+    )
     
-    return {"status_distribution": status_data, "total_leads": total_leads}
+    return build_distribution(groups, models.LeadStatus, "status")
 
 @router.get("/leads-by-source")
 async def get_leads_by_source(
@@ -137,30 +283,15 @@ async def get_leads_by_source(
     
     collection = get_collection(Collections.MAIN_DATA)
     
-    # Base filter for user role
-    base_filter = {}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
-    
-    # Get total count first
-    total_leads = await collection.count_documents(base_filter)
+    # Get counts for every source in one pass
+    groups = await group_by_dimension(
+        collection,
+        lead_scope_filter(current_user),
+        "source",
+        buckets=[source.value for source in models.LeadSource]
+    )
     
-    # Get counts by source
-    source_data = []
-    for source in models.LeadSource:
-        count = await collection.count_documents({**base_filter, "source": source.value})
-        percentage = (count / total_leads * 100) if total_leads > 0 else 0
-        
-        source_data.append({
-            "source": source.value.title().replace("_", " "),
-            "count": count,
-            "percentage": round(percentage, 2)
-        })
-    
-    # Sort by count descending
-    source_data.sort(key=lambda x: x["count"], reverse=True)
-    
-    return {"source_distribution": source_data, "total_leads": total_leads}
+    return build_distribution(groups, models.LeadSource, "source")
 
 @router.get("/activity-summary")
 async def get_activity_summary(
@@ -177,14 +308,8 @@ async def get_activity_summary(
     
     # Filter by user role
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        # Get only activities for leads assigned to this user
-        leads_collection = get_collection(Collections.MAIN_DATA)
-        user_leads_cursor = leads_collection.find(
-            {"assigned_agent_id": current_user["_id"]},
-            {"_id": 1}
-        )
-        user_lead_ids = [lead["_id"] async for lead in user_leads_cursor]
-        base_filter["lead_id"] = {"$in": user_lead_ids}
+        # Activities carry the owning agent, so filter on it directly
+        base_filter["assigned_agent_id"] = current_user["_id"]
     
     # Group by activity type
     pipeline = [
@@ -238,9 +363,7 @@ async def get_recent_leads(
     collection = get_collection(Collections.MAIN_DATA)
     
     # Base filter for user role
-    base_filter = {}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+    base_filter = lead_scope_filter(current_user)
     
     # Get recent leads
     cursor = collection.find(base_filter).sort("created_at", -1).limit(limit)
@@ -250,34 +373,28 @@ async def get_recent_leads(
 
 @router.get("/upcoming-followups")
 async def get_upcoming_followups(
-    days: int = Query(7, description="Number of days ahead to check"),
+    days: Optional[int] = Query(None, ge=1, description="Number of days ahead to check (default from settings)"),
+    stream: bool = Query(False, description="Stream leads as NDJSON"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get upcoming follow-ups"""
     
     collection = get_collection(Collections.MAIN_DATA)
     
-    # Date range for upcoming follow-ups
-    now = datetime.now(timezone.utc)
-    future_date = now + timedelta(days=days)
-    
-    # Base filter
-    base_filter = {
-        "next_follow_up_date": {"$gte": now, "$lte": future_date},
-        "status": {"$in": ["new", "contacted", "qualified", "follow_up"]}
-    }
+    # Upcoming follow-ups within the window
+    base_filter = upcoming_followups_filter(current_user, datetime.now(timezone.utc), days)
+    cursor = collection.find(base_filter).sort("next_follow_up_date", 1)
     
-    # Filter by user role
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+    if stream:
+        return ndjson_response(cursor, serialize_doc)
     
-    cursor = collection.find(base_filter).sort("next_follow_up_date", 1)
     followups = await cursor.to_list(length=None)
     
     return {"upcoming_followups": [serialize_doc(lead) for lead in followups]}
 
 @router.get("/overdue-followups")
 async def get_overdue_followups(
+    stream: bool = Query(False, description="Stream leads as NDJSON"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get overdue follow-ups"""
@@ -289,15 +406,16 @@ async def get_overdue_followups(
     
     # Base filter
     base_filter = {
+        **lead_scope_filter(current_user),
         "next_follow_up_date": {"$lt": now},
-        "status": {"$in": ["new", "contacted", "qualified", "follow_up"]}
+        "status": {"$in": get_follow_up_statuses()}
     }
     
-    # Filter by user role
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
-    
     cursor = collection.find(base_filter).sort("next_follow_up_date", 1)
+    
+    if stream:
+        return ndjson_response(cursor, serialize_doc)
+    
     overdue = await cursor.to_list(length=None)
     
     return {"overdue_followups": [serialize_doc(lead) for lead in overdue]}
@@ -313,9 +431,7 @@ async def get_top_performing_sources(
     collection = get_collection(Collections.MAIN_DATA)
     
     # Base filter
-    base_filter = {"created_at": {"$gte": start_date}}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+    base_filter = {**lead_scope_filter(current_user), "created_at": {"$gte": start_date}}
     
     # Aggregate by source with conversion metrics
     pipeline = [
@@ -374,9 +490,7 @@ async def get_performance_metrics(
     activities_collection = get_collection(Collections.ACTIVITIES)
     
     # Base filter
-    base_filter = {"created_at": {"$gte": start_date}}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+    base_filter = {**lead_scope_filter(current_user), "created_at": {"$gte": start_date}}
     
     # Total leads in period
     total_leads = await collection.count_documents(base_filter)
@@ -402,13 +516,8 @@ async def get_performance_metrics(
     # Activity count
     activity_filter = {"created_at": {"$gte": start_date}}
     if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        # Get only activities for leads assigned to this user
-        user_leads_cursor = collection.find(
-            {"assigned_agent_id": current_user["_id"]},
-            {"_id": 1}
-        )
-        user_lead_ids = [lead["_id"] async for lead in user_leads_cursor]
-        activity_filter["lead_id"] = {"$in": user_lead_ids}
+        # Activities carry the owning agent, so filter on it directly
+        activity_filter["assigned_agent_id"] = current_user["_id"]
     
     total_activities = await activities_collection.count_documents(activity_filter)
     
@@ -436,9 +545,7 @@ async def get_leads_trend_chart_data(
     collection = get_collection(Collections.MAIN_DATA)
     
     # Base filter
-    base_filter = {"created_at": {"$gte": start_date}}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+    base_filter = {**lead_scope_filter(current_user), "created_at": {"$gte": start_date}}
     
     # Group by day
     pipeline = [
@@ -477,9 +584,7 @@ async def get_conversion_funnel_chart_data(
     collection = get_collection(Collections.MAIN_DATA)
     
     # Base filter
-    base_filter = {}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
+    base_filter = lead_scope_filter(current_user)
     
     # Define stages in order
     stages = [
@@ -512,66 +617,5 @@ async def get_dashboard_notifications(
     """Get important notifications for the dashboard"""
     
     collection = get_collection(Collections.MAIN_DATA)
-    now = datetime.now(timezone.utc)
-    
-    notifications = []
-    
-    # Base filter for user role
-    base_filter = {}
-    if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
-        base_filter["assigned_agent_id"] = current_user["_id"]
-    
-    # Overdue follow-ups
-    overdue_count = await collection.count_documents({
-        **base_filter,
-        "next_follow_up_date": {"$lt": now},
-        "status": {"$in": ["new", "contacted", "qualified", "follow_up"]}
-    })
-    
-    if overdue_count > 0:
-        notifications.append({
-            "type": "warning",
-            "title": "Overdue Follow-ups",
-            "message": f"You have {overdue_count} overdue follow-up{'s' if overdue_count > 1 else ''}",
-            "count": overdue_count,
-            "priority": "high"
-        })
-    
-    # New leads today
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    new_today = await collection.count_documents({
-        **base_filter,
-        "created_at": {"$gte": today_start},
-        "status": "new"
-    })
-    
-    if new_today > 0:
-        notifications.append({
-            "type": "info",
-            "title": "New Leads Today",
-            "message": f"{new_today} new lead{'s' if new_today > 1 else ''} received today",
-            "count": new_today,
-            "priority": "medium"
-        })
-    
-    # Hot prospects (high priority qualified leads)
-    hot_prospects = await collection.count_documents({
-        **base_filter,
-        "status": "qualified",
-        "priority": {"$gte": 3}
-    })
-    
-    if hot_prospects > 0:
-        notifications.append({
-            "type": "success",
-            "title": "Hot Prospects",
-            "message": f"{hot_prospects} high-priority qualified lead{'s' if hot_prospects > 1 else ''}",
-            "count": hot_prospects,
-            "priority": "high"
-        })
-    
-    # Sort by priority
-    priority_order = {"high": 3, "medium": 2, "low": 1}
-    notifications.sort(key=lambda x: priority_order.get(x["priority"], 0), reverse=True)
-    
-    return {"notifications": notifications}
\ No newline at end of file
+    groups = await status_breakdown(collection, lead_scope_filter(current_user), datetime.now(timezone.utc))
+    return build_notifications(groups)
\ No newline at end of file
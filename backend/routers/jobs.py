@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from datetime import datetime
+from bson import ObjectId
+
+from database import get_collection, Collections
+import models
+from auth_utils import get_current_active_user, require_role
+
+router = APIRouter()
+
+# Helper function to convert ObjectId to string
+def serialize_doc(doc):
+    """Convert MongoDB document to JSON-serializable format"""
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [serialize_doc(item) for item in doc]
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, (dict, list)):
+                result[key] = serialize_doc(value)
+            else:
+                result[key] = value
+
+        # Convert _id to id
+        if "_id" in result:
+            result["id"] = result.pop("_id")
+
+        return result
+    return doc
+
+# List recent background jobs
+@router.get("/")
+async def get_jobs(
+    job_type: Optional[str] = None,
+    status: Optional[models.JobStatus] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """List background jobs, newest first (manager+ only)"""
+
+    query_filter = {}
+    if job_type:
+        query_filter["job_type"] = job_type
+    if status:
+        query_filter["status"] = status.value
+
+    collection = get_collection(Collections.JOBS)
+    jobs = await collection.find(query_filter).sort("created_at", -1).limit(limit).to_list(length=limit)
+
+    return serialize_doc(jobs)
+
+# Get job status and progress
+@router.get("/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get a background job's status, progress and result"""
+
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
+
+    collection = get_collection(Collections.JOBS)
+    job = await collection.find_one({"_id": ObjectId(job_id)})
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # Check permissions
+    if (current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value] and
+        job.get("created_by") != current_user["_id"]):
+        raise HTTPException(status_code=403, detail="Not authorized to view this job")
+
+    return serialize_doc(job)
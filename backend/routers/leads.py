@@ -1,14 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, UploadFile, File
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 from bson import ObjectId
 import uuid
+from fastapi.responses import StreamingResponse
 
 from database import get_collection, Collections
 import models
 import schemas
 from auth_utils import get_current_active_user, require_role
 from email_utils import send_new_lead_notification
+from streaming import ndjson_response
+from lead_utils import build_lead_document, lead_interests, build_lead_filter
+from lead_import import import_leads, iter_rows
+from lead_export import stream_csv, write_xlsx, stream_file
+from lead_bulk import run_bulk_operation
+from jobs import enqueue_job
+from cascade import PURGE_LEAD_JOB
+from routing import lead_router
+from settings_service import get_follow_up_statuses
+from attachments import ATTACHMENT_LIST_PROJECTION, download_url
+from assignment_alerts import assignment_alerts
+from live_events import live_events
+from dedupe import (
+    CLUSTER_DUPLICATES_JOB,
+    blocking_keys,
+    email_key,
+    find_duplicate_candidates,
+    merge_leads
+)
+from pagination import fetch_page, keyset_filter, merge_newest_first, encode_cursor, KEYSET_SORT
+from activity_utils import (
+    is_contact_activity,
+    record_first_contact,
+    build_status_change_activity,
+    restamp_lead_activities
+)
 
 router = APIRouter()
 
@@ -63,7 +90,11 @@ async def create_lead(
     collection = get_collection(Collections.MAIN_DATA)
     
     # Check if lead with same email already exists
-    existing_lead = await collection.find_one({"email": lead.email})
+    # Matched on the normalized email key too, so casing differences still dedupe
+    existing_lead = await collection.find_one({
+        "$or": [{"email": lead.email}, {"dedupe_keys": email_key(lead.email)}],
+        "deleted_at": {"$exists": False}
+    })
     
     if existing_lead:
         # Update existing lead with new information
@@ -83,6 +114,7 @@ async def create_lead(
         activity = {
             "lead_id": existing_lead["_id"],
             "user_id": None,  # System user
+            "assigned_agent_id": existing_lead.get("assigned_agent_id"),
             "activity_type": "note",
             "title": "Lead Updated",
             "description": f"Lead information updated via website form",
@@ -90,51 +122,38 @@ async def create_lead(
         }
         await activity_collection.insert_one(activity)
         
-        return serialize_doc(updated_doc)
-    
-    # Create new lead
-    lead_data = lead.dict()
-    # Map camelCase to snake_case for database storage
-    snake_case_data = {
-        "_id": ObjectId(),
-        "first_name": lead_data.get("firstName"),
-        "last_name": lead_data.get("lastName"),
-        "email": lead_data.get("email"),
-        "phone_number": lead_data.get("phoneNumber"),
-        "country": lead_data.get("country", "United States"),
-        "address_line1": lead_data.get("addressLine1"),
-        "address_line2": lead_data.get("addressLine2", ""),
-        "city": lead_data.get("city"),
-        "state": lead_data.get("state"),
-        "zip_code": lead_data.get("zipCode"),
-        "personal_lines": lead_data.get("personalLines", False),
-        "commercial_lines": lead_data.get("commercialLines", False),
-        "life_and_health": lead_data.get("lifeAndHealth", False),
-        "source": lead_data.get("source", models.LeadSource.WEBSITE),
-        "status": models.LeadStatus.NEW,
-        "created_at": datetime.now(timezone.utc),
-        "updated_at": datetime.now(timezone.utc),
-        "priority": 3,  # Default priority
-        "notes": ""
-    }
-    lead_data = snake_case_data
+        serialized = serialize_doc(updated_doc)
+        live_events.lead_changed("lead.updated", existing_lead, updated_doc, serialized)
+        live_events.activity_created(activity, serialize_doc(activity))
+        return serialized
+    
+    # Create new lead, mapped to snake_case for database storage
+    lead_data = build_lead_document(lead)
+    
+    # Flag same phone / same household candidates for review (indexed lookup)
+    candidates = await find_duplicate_candidates(lead_data, limit=10)
+    if candidates:
+        lead_data["possible_duplicate_ids"] = [candidate["_id"] for candidate in candidates]
+    
+    # Route to an agent in memory so the assignment is part of the insert
+    lead_data["assigned_agent_id"] = await lead_router.route(lead_data)
     
     # Insert into MongoDB
-    result = await collection.insert_one(lead_data)
+    try:
+        result = await collection.insert_one(lead_data)
+    except Exception:
+        await lead_router.release(lead_data["assigned_agent_id"])
+        raise
+    assignment_alerts.emit(lead_data["assigned_agent_id"], lead_data)
     
     # Create initial activity
     activity_collection = get_collection(Collections.ACTIVITIES)
-    interests = []
-    if lead.personalLines:
-        interests.append("Personal Lines")
-    if lead.commercialLines:
-        interests.append("Commercial Lines")
-    if lead.lifeAndHealth:
-        interests.append("Life & Health")
+    interests = lead_interests(lead)
     
     activity = {
         "lead_id": result.inserted_id,
         "user_id": None,  # System user
+        "assigned_agent_id": lead_data.get("assigned_agent_id"),
         "activity_type": "note",
         "title": "Lead Created",
         "description": f"New lead created via website form. Interested in: {', '.join(interests)}",
@@ -147,7 +166,82 @@ async def create_lead(
     
     # Get the created document and return
     created_doc = await collection.find_one({"_id": result.inserted_id})
-    return serialize_doc(created_doc)
+    serialized = serialize_doc(created_doc)
+    live_events.lead_changed("lead.created", None, created_doc, serialized)
+    live_events.activity_created(activity, serialize_doc(activity))
+    return serialized
+
+# Bulk import leads from a spreadsheet
+@router.post("/import")
+async def import_leads_file(
+    file: UploadFile = File(..., description="CSV or XLSX file with one lead per row"),
+    source: Optional[models.LeadSource] = Query(None, description="Source for rows without a source column"),
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Import leads from CSV/XLSX, deduplicated by email (manager+ only)"""
+    
+    filename = file.filename or "upload.csv"
+    if not filename.lower().endswith((".csv", ".xlsx", ".xlsm")):
+        raise HTTPException(status_code=400, detail="Only .csv and .xlsx files are supported")
+    
+    report = await import_leads(
+        iter_rows(file.file, filename),
+        source_label=filename,
+        default_source=source,
+        user_id=current_user["_id"]
+    )
+    
+    live_events.resync("import")
+    return report
+
+# Apply one operation to many leads
+@router.post("/bulk", response_model=schemas.BulkLeadResponse)
+async def bulk_update_leads(
+    request: schemas.BulkLeadRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Set status, assign, set priority, set follow-up date or log an activity on many leads"""
+    
+    if (request.lead_ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either lead_ids or filter")
+    
+    # Validate the operation's parameters up front
+    operation = request.operation
+    if operation == models.BulkLeadOperation.SET_STATUS and request.status is None:
+        raise HTTPException(status_code=400, detail="status is required for set_status")
+    if operation == models.BulkLeadOperation.SET_PRIORITY and request.priority not in (1, 2, 3):
+        raise HTTPException(status_code=400, detail="priority must be 1, 2 or 3 for set_priority")
+    if operation == models.BulkLeadOperation.SET_FOLLOW_UP_DATE and request.next_follow_up_date is None:
+        raise HTTPException(status_code=400, detail="next_follow_up_date is required for set_follow_up_date")
+    if operation == models.BulkLeadOperation.ADD_ACTIVITY and request.activity is None:
+        raise HTTPException(status_code=400, detail="activity is required for add_activity")
+    
+    agent = None
+    if operation == models.BulkLeadOperation.ASSIGN_AGENT:
+        # Reassignment is manager+ only, as for a single lead
+        if current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        if not request.assigned_agent_id or not ObjectId.is_valid(request.assigned_agent_id):
+            raise HTTPException(status_code=400, detail="A valid assigned_agent_id is required for assign_agent")
+        users_collection = get_collection(Collections.USERS)
+        agent = await users_collection.find_one({"_id": ObjectId(request.assigned_agent_id)}, {"full_name": 1})
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+    
+    # Agents may only touch their own leads; the restriction lives in the filter
+    full_access_roles = (models.UserRole.ADMIN.value, models.UserRole.MANAGER.value)
+    if request.filter is not None:
+        query_filter = build_lead_filter(
+            current_user, request.filter.status, request.filter.source, request.filter.assigned_agent_id,
+            request.filter.priority, request.filter.search, full_access_roles=full_access_roles
+        )
+    else:
+        query_filter = build_lead_filter(current_user, full_access_roles=full_access_roles)
+        query_filter["_id"] = {"$in": [ObjectId(lead_id) for lead_id in request.lead_ids if ObjectId.is_valid(lead_id)]}
+    
+    response = await run_bulk_operation(query_filter, request, current_user, agent=agent, requested_ids=request.lead_ids)
+    live_events.resync("bulk")
+    return response
 
 # Get all leads with filtering and pagination
 @router.get("/", response_model=schemas.LeadListResponse)
@@ -166,30 +260,7 @@ async def get_leads(
     collection = get_collection(Collections.MAIN_DATA)
     
     # Build query filter
-    query_filter = {}
-    
-    if status:
-        query_filter["status"] = status
-    if source:
-        query_filter["source"] = source
-    if assigned_agent_id and ObjectId.is_valid(assigned_agent_id):
-        query_filter["assigned_agent_id"] = ObjectId(assigned_agent_id)
-    if priority:
-        query_filter["priority"] = priority
-    
-    # Search functionality
-    if search:
-        query_filter["$or"] = [
-            {"first_name": {"$regex": search, "$options": "i"}},
-            {"last_name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}},
-            {"phone_number": {"$regex": search, "$options": "i"}},
-            {"city": {"$regex": search, "$options": "i"}}
-        ]
-    
-# If user is not admin, only show their assigned leads
-    if current_user.get("role") != models.UserRole.ADMIN.value:
-        query_filter["assigned_agent_id"] = current_user["_id"]
+    query_filter = build_lead_filter(current_user, status, source, assigned_agent_id, priority, search)
     
     # Get total count
     total = await collection.count_documents(query_filter)
@@ -209,19 +280,86 @@ async def get_leads(
         "total_pages": (total + limit - 1) // limit
     }
 
+# Export leads matching the list filters
+@router.get("/export")
+async def export_leads(
+    format: str = Query("csv", pattern="^(csv|xlsx)$", description="csv or xlsx"),
+    include_activities: bool = Query(False, description="One row per activity, joined to its lead"),
+    status: Optional[models.LeadStatus] = None,
+    source: Optional[models.LeadSource] = None,
+    assigned_agent_id: Optional[str] = None,
+    priority: Optional[int] = None,
+    search: Optional[str] = None,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Export leads as CSV (streamed) or XLSX (built in full, then sent), with the same filters as the list"""
+    
+    query_filter = build_lead_filter(current_user, status, source, assigned_agent_id, priority, search)
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    
+    if format == "xlsx":
+        path = await write_xlsx(query_filter, include_activities)
+        return StreamingResponse(
+            stream_file(path),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": f'attachment; filename="leads-{timestamp}.xlsx"'}
+        )
+    
+    return StreamingResponse(
+        stream_csv(query_filter, include_activities),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="leads-{timestamp}.csv"'}
+    )
+
+# Assignment alert buffer counters
+@router.get("/assignment-alerts/stats")
+async def get_assignment_alert_stats(
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Alerts emitted vs. emails sent by the coalescing alert buffer (manager+ only)"""
+    
+    return assignment_alerts.stats()
+
+# List duplicate clusters found by the last scan
+@router.get("/duplicates")
+async def get_duplicate_clusters(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """List duplicate lead clusters, largest first (manager+ only)"""
+    
+    clusters_collection = get_collection(Collections.DUPLICATE_CLUSTERS)
+    total = await clusters_collection.count_documents({})
+    clusters = await clusters_collection.find({}).sort("size", -1).skip(skip).limit(limit).to_list(length=limit)
+    
+    return {"clusters": serialize_doc(clusters), "total": total}
+
+# Start a duplicate clustering scan
+@router.post("/duplicates/scan")
+async def scan_duplicates(
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Cluster all live leads by shared blocking keys in a background job"""
+    
+    job_id = await enqueue_job(CLUSTER_DUPLICATES_JOB, {}, user_id=current_user["_id"])
+    return {"message": "Duplicate scan started", "job_id": str(job_id)}
+
 # Get single lead with full details
 @router.get("/{lead_id}", response_model=schemas.LeadWithActivities)
 async def get_lead(
     lead_id: str,
+    activities_limit: int = Query(20, ge=0, le=100, description="Most recent activities to embed"),
+    quotes_limit: int = Query(20, ge=0, le=100, description="Most recent quotes to embed"),
     current_user: dict = Depends(get_current_active_user)
 ):
-    """Get a specific lead with all activities and quotes"""
+    """Get a specific lead with its most recent activities and quotes"""
     
     if not ObjectId.is_valid(lead_id):
         raise HTTPException(status_code=400, detail="Invalid lead ID format")
     
     collection = get_collection(Collections.MAIN_DATA)
-    lead = await collection.find_one({"_id": ObjectId(lead_id)})
+    lead = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}})
     
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
@@ -231,23 +369,142 @@ async def get_lead(
         lead.get("assigned_agent_id") != current_user["_id"]):
         raise HTTPException(status_code=403, detail="Not authorized to view this lead")
     
-    # Get activities for this lead
+    lead_filter = {"lead_id": ObjectId(lead_id)}
     activities_collection = get_collection(Collections.ACTIVITIES)
-    activities_cursor = activities_collection.find({"lead_id": ObjectId(lead_id)}).sort("created_at", -1)
-    activities = await activities_cursor.to_list(length=None)
-    
-    # Get quotes for this lead
     quotes_collection = get_collection(Collections.QUOTES)
-    quotes_cursor = quotes_collection.find({"lead_id": ObjectId(lead_id)}).sort("created_at", -1)
-    quotes = await quotes_cursor.to_list(length=None)
+    
+    # Embed only the newest page of each; older ones are paged via /timeline
+    activities, activities_cursor = await fetch_page(activities_collection, lead_filter, activities_limit)
+    quotes, quotes_cursor = await fetch_page(quotes_collection, lead_filter, quotes_limit)
+    
+    activities_total = await activities_collection.count_documents(lead_filter)
+    quotes_total = await quotes_collection.count_documents(lead_filter)
+    
+    # Attachment metadata only; file contents are downloaded separately
+    attachments_collection = get_collection(Collections.ATTACHMENTS)
+    attachments, _ = await fetch_page(attachments_collection, lead_filter, 50, projection=ATTACHMENT_LIST_PROJECTION)
     
     # Serialize and combine data
     result = serialize_doc(lead)
     result["activities"] = serialize_doc(activities)
     result["quotes"] = serialize_doc(quotes)
+    result["activities_total"] = activities_total
+    result["quotes_total"] = quotes_total
+    result["activities_next_cursor"] = activities_cursor
+    result["quotes_next_cursor"] = quotes_cursor
+    result["attachments"] = [
+        {**serialize_doc(attachment), "url": download_url(attachment["_id"])} for attachment in attachments
+    ]
     
     return result
 
+# Get merged activity/quote timeline for a lead
+@router.get("/{lead_id}/timeline")
+async def get_lead_timeline(
+    lead_id: str,
+    cursor: Optional[str] = Query(None, description="Continuation cursor from a previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    include: List[str] = Query(["activity", "quote"], description="Entry types to include"),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get a lead's activities and quotes merged newest first, with keyset paging"""
+    
+    if not ObjectId.is_valid(lead_id):
+        raise HTTPException(status_code=400, detail="Invalid lead ID format")
+    
+    collection = get_collection(Collections.MAIN_DATA)
+    lead = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}}, {"assigned_agent_id": 1})
+    
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    
+    # Check permissions
+    if (current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value] and 
+        lead.get("assigned_agent_id") != current_user["_id"]):
+        raise HTTPException(status_code=403, detail="Not authorized to view this lead")
+    
+    page_filter = {"lead_id": ObjectId(lead_id), **keyset_filter(cursor)}
+    
+    # Each source reads at most one page past the cursor; the merge pulls lazily
+    sources = []
+    if "activity" in include:
+        activities_collection = get_collection(Collections.ACTIVITIES)
+        sources.append(("activity", activities_collection.find(page_filter).sort(KEYSET_SORT).limit(limit + 1)))
+    if "quote" in include:
+        quotes_collection = get_collection(Collections.QUOTES)
+        sources.append(("quote", quotes_collection.find(page_filter).sort(KEYSET_SORT).limit(limit + 1)))
+    
+    entries = []
+    next_cursor = None
+    last_doc = None
+    async for entry_type, doc in merge_newest_first(*sources):
+        if len(entries) == limit:
+            next_cursor = encode_cursor(last_doc)
+            break
+        entries.append({"type": entry_type, **serialize_doc(doc)})
+        last_doc = doc
+    
+    return {"entries": entries, "next_cursor": next_cursor}
+
+# Get duplicate candidates for a lead
+@router.get("/{lead_id}/duplicates", response_model=List[schemas.Lead])
+async def get_lead_duplicates(
+    lead_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Leads sharing an email, phone or last name + zip with this lead"""
+    
+    if not ObjectId.is_valid(lead_id):
+        raise HTTPException(status_code=400, detail="Invalid lead ID format")
+    
+    collection = get_collection(Collections.MAIN_DATA)
+    lead = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}})
+    
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    
+    # Check permissions
+    if (current_user.get("role") not in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value] and 
+        lead.get("assigned_agent_id") != current_user["_id"]):
+        raise HTTPException(status_code=403, detail="Not authorized to view this lead")
+    
+    candidates = await find_duplicate_candidates(lead, limit=limit)
+    return [serialize_doc(candidate) for candidate in candidates]
+
+# Merge duplicate leads into this lead
+@router.post("/{lead_id}/merge")
+async def merge_duplicate_leads(
+    lead_id: str,
+    merge_request: schemas.LeadMergeRequest,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Merge duplicates into a lead, moving their activities and quotes (manager+ only)"""
+    
+    duplicate_ids = [duplicate_id for duplicate_id in merge_request.duplicate_ids if duplicate_id != lead_id]
+    if not ObjectId.is_valid(lead_id) or not all(ObjectId.is_valid(duplicate_id) for duplicate_id in duplicate_ids):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    if not duplicate_ids:
+        raise HTTPException(status_code=400, detail="No duplicate leads given")
+    
+    collection = get_collection(Collections.MAIN_DATA)
+    primary = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}})
+    
+    if not primary:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    
+    duplicates = await collection.find({
+        "_id": {"$in": [ObjectId(duplicate_id) for duplicate_id in duplicate_ids]},
+        "deleted_at": {"$exists": False}
+    }).to_list(length=None)
+    
+    if len(duplicates) != len(set(duplicate_ids)):
+        raise HTTPException(status_code=404, detail="One or more duplicate leads not found")
+    
+    response = await merge_leads(primary, duplicates, current_user["_id"])
+    live_events.resync("merge")
+    return response
+
 # Update lead
 @router.put("/{lead_id}", response_model=schemas.Lead)
 async def update_lead(
@@ -261,7 +518,7 @@ async def update_lead(
         raise HTTPException(status_code=400, detail="Invalid lead ID format")
     
     collection = get_collection(Collections.MAIN_DATA)
-    lead = await collection.find_one({"_id": ObjectId(lead_id)})
+    lead = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}})
     
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
@@ -278,21 +535,26 @@ async def update_lead(
     update_data = lead_update.dict(exclude_unset=True)
     update_data["updated_at"] = datetime.now(timezone.utc)
     
+    # The schema validates the agent id but hands it back as a string
+    if update_data.get("assigned_agent_id") is not None:
+        update_data["assigned_agent_id"] = ObjectId(update_data["assigned_agent_id"])
+    
+    # Keep the duplicate blocking keys in step with the identifying fields
+    if any(field in update_data for field in ["email", "phone_number", "last_name", "zip_code"]):
+        update_data["dedupe_keys"] = blocking_keys({**lead, **update_data})
+    
     # Update last contact date if status changed
     if "status" in update_data and old_status != update_data["status"]:
         update_data["last_contact_date"] = datetime.now(timezone.utc)
         
         # Log status change activity
         activity_collection = get_collection(Collections.ACTIVITIES)
-        activity = {
-            "lead_id": ObjectId(lead_id),
-            "user_id": current_user["_id"],
-            "activity_type": "status_change",
-            "title": "Status Changed",
-            "description": f"Status changed from {old_status} to {update_data['status']}",
-            "created_at": datetime.now(timezone.utc)
-        }
+        activity = build_status_change_activity(
+            ObjectId(lead_id), current_user["_id"], old_status, update_data["status"],
+            assigned_agent_id=update_data.get("assigned_agent_id", lead.get("assigned_agent_id"))
+        )
         await activity_collection.insert_one(activity)
+        live_events.activity_created(activity, serialize_doc(activity))
     
     # Update the document
     await collection.update_one(
@@ -300,15 +562,23 @@ async def update_lead(
         {"$set": update_data}
     )
     
+    # Keep the owning agent stamped on the lead's activities
+    if "assigned_agent_id" in update_data and update_data["assigned_agent_id"] != lead.get("assigned_agent_id"):
+        await restamp_lead_activities([ObjectId(lead_id)], update_data["assigned_agent_id"])
+        assignment_alerts.emit(update_data["assigned_agent_id"], lead)
+    
     # Get updated document
-    updated_lead = await collection.find_one({"_id": ObjectId(lead_id)})
-    return serialize_doc(updated_lead)
+    updated_lead = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}})
+    serialized = serialize_doc(updated_lead)
+    if updated_lead:
+        live_events.lead_changed("lead.updated", lead, updated_lead, serialized)
+    return serialized
 
 # Delete lead
 @router.delete("/{lead_id}")
 async def delete_lead(
     lead_id: str,
-    current_user: dict = Depends(require_role(models.UserRole.ADMIN.value))
+    current_user: dict = Depends(require_role(models.UserRole.ADMIN))
 ):
     """Delete a lead (admin only)"""
     
@@ -316,30 +586,31 @@ async def delete_lead(
         raise HTTPException(status_code=400, detail="Invalid lead ID format")
     
     collection = get_collection(Collections.MAIN_DATA)
-    lead = await collection.find_one({"_id": ObjectId(lead_id)})
+    
+    # Soft-delete now so the lead disappears from every query immediately
+    now = datetime.now(timezone.utc)
+    lead = await collection.find_one_and_update(
+        {"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}},
+        {"$set": {"deleted_at": now, "deleted_by": current_user["_id"], "updated_at": now}}
+    )
     
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    # Delete lead and related data
-    await collection.delete_one({"_id": ObjectId(lead_id)})
+    # Soft-deleted leads drop out of /dashboard/stats right away
+    live_events.lead_changed("lead.deleted", lead, None, {"id": lead_id})
     
-    # Delete related activities
-    activities_collection = get_collection(Collections.ACTIVITIES)
-    await activities_collection.delete_many({"lead_id": ObjectId(lead_id)})
+    # Purge related activities and quotes, then the lead, in the background
+    job_id = await enqueue_job(PURGE_LEAD_JOB, {"lead_id": lead_id}, user_id=current_user["_id"])
     
-    # Delete related quotes
-    quotes_collection = get_collection(Collections.QUOTES)
-    await quotes_collection.delete_many({"lead_id": ObjectId(lead_id)})
-    
-    return {"message": "Lead deleted successfully"}
+    return {"message": "Lead deleted successfully", "job_id": str(job_id)}
 
 # Assign lead to agent
 @router.post("/{lead_id}/assign/{agent_id}")
 async def assign_lead(
     lead_id: str,
     agent_id: str,
-    current_user: dict = Depends(require_role(models.UserRole.MANAGER.value))
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
 ):
     """Assign a lead to an agent (manager+ only)"""
     
@@ -347,7 +618,7 @@ async def assign_lead(
         raise HTTPException(status_code=400, detail="Invalid ID format")
     
     collection = get_collection(Collections.MAIN_DATA)
-    lead = await collection.find_one({"_id": ObjectId(lead_id)})
+    lead = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}})
     
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
@@ -360,25 +631,36 @@ async def assign_lead(
         raise HTTPException(status_code=404, detail="Agent not found")
     
     # Update lead assignment
+    assignment = {
+        "assigned_agent_id": ObjectId(agent_id),
+        "updated_at": datetime.now(timezone.utc)
+    }
     await collection.update_one(
         {"_id": ObjectId(lead_id)},
-        {"$set": {
-            "assigned_agent_id": ObjectId(agent_id),
-            "updated_at": datetime.now(timezone.utc)
-        }}
+        {"$set": assignment}
     )
+    assigned_lead = {**lead, **assignment}
+    live_events.lead_changed("lead.assigned", lead, assigned_lead, serialize_doc(assigned_lead))
+    
+    # Re-stamp the lead's existing activities with the new owner
+    await restamp_lead_activities([ObjectId(lead_id)], ObjectId(agent_id))
+    
+    # Coalesced into one email per agent per alert window
+    assignment_alerts.emit(ObjectId(agent_id), lead)
     
     # Log assignment activity
     activity_collection = get_collection(Collections.ACTIVITIES)
     activity = {
         "lead_id": ObjectId(lead_id),
         "user_id": current_user["_id"],
+        "assigned_agent_id": ObjectId(agent_id),
         "activity_type": "note",
         "title": "Lead Assigned",
         "description": f"Lead assigned to {agent.get('full_name', 'Unknown')}",
         "created_at": datetime.now(timezone.utc)
     }
     await activity_collection.insert_one(activity)
+    live_events.activity_created(activity, serialize_doc(activity))
     
     return {"message": f"Lead assigned to {agent.get('full_name', 'agent')}"}
 
@@ -395,7 +677,7 @@ async def add_activity(
         raise HTTPException(status_code=400, detail="Invalid lead ID format")
     
     collection = get_collection(Collections.MAIN_DATA)
-    lead = await collection.find_one({"_id": ObjectId(lead_id)})
+    lead = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}})
     
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
@@ -410,6 +692,7 @@ async def add_activity(
     activity_data["_id"] = ObjectId()
     activity_data["lead_id"] = ObjectId(lead_id)
     activity_data["user_id"] = current_user["_id"]
+    activity_data["assigned_agent_id"] = lead.get("assigned_agent_id")
     activity_data["created_at"] = datetime.now(timezone.utc)
     
     activity_collection = get_collection(Collections.ACTIVITIES)
@@ -421,14 +704,21 @@ async def add_activity(
         {"$set": {"last_contact_date": datetime.now(timezone.utc)}}
     )
     
+    # Denormalize the first response onto the lead for response-time analytics
+    if is_contact_activity(activity_data["activity_type"]) and not lead.get("first_contact_at"):
+        await record_first_contact(ObjectId(lead_id), result.inserted_id, activity_data["created_at"])
+    
     # Get the created activity and return
     created_activity = await activity_collection.find_one({"_id": result.inserted_id})
-    return serialize_doc(created_activity)
+    serialized = serialize_doc(created_activity)
+    live_events.activity_created(created_activity, serialized)
+    return serialized
 
 # Get lead activities
 @router.get("/{lead_id}/activities", response_model=List[schemas.Activity])
 async def get_lead_activities(
     lead_id: str,
+    stream: bool = Query(False, description="Stream activities as NDJSON"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get all activities for a lead"""
@@ -437,7 +727,7 @@ async def get_lead_activities(
         raise HTTPException(status_code=400, detail="Invalid lead ID format")
     
     collection = get_collection(Collections.MAIN_DATA)
-    lead = await collection.find_one({"_id": ObjectId(lead_id)})
+    lead = await collection.find_one({"_id": ObjectId(lead_id), "deleted_at": {"$exists": False}})
     
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
@@ -449,6 +739,10 @@ async def get_lead_activities(
     
     activity_collection = get_collection(Collections.ACTIVITIES)
     cursor = activity_collection.find({"lead_id": ObjectId(lead_id)}).sort("created_at", -1)
+    
+    if stream:
+        return ndjson_response(cursor, serialize_doc)
+    
     activities = await cursor.to_list(length=None)
     
     return [serialize_doc(activity) for activity in activities]
@@ -456,6 +750,7 @@ async def get_lead_activities(
 # Get leads requiring follow-up
 @router.get("/followup/pending", response_model=List[schemas.Lead])
 async def get_pending_followups(
+    stream: bool = Query(False, description="Stream leads as NDJSON"),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Get leads that require follow-up"""
@@ -466,7 +761,8 @@ async def get_pending_followups(
     
     query_filter = {
         "next_follow_up_date": {"$lte": today},
-        "status": {"$in": ["new", "contacted", "qualified", "follow_up"]}
+        "status": {"$in": get_follow_up_statuses()},
+        "deleted_at": {"$exists": False}
     }
     
     # If not admin/manager, only show assigned leads
@@ -474,6 +770,10 @@ async def get_pending_followups(
         query_filter["assigned_agent_id"] = current_user["_id"]
     
     cursor = collection.find(query_filter).sort("next_follow_up_date", 1)
+    
+    if stream:
+        return ndjson_response(cursor, serialize_doc)
+    
     leads = await cursor.to_list(length=None)
     
     return [serialize_doc(lead) for lead in leads]
\ No newline at end of file
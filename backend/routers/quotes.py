@@ -0,0 +1,238 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response, status
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime, timezone
+from bson import ObjectId
+
+from database import get_collection, Collections
+import models
+import schemas
+from auth_utils import get_current_active_user, require_role
+from pagination import fetch_page
+from quote_utils import next_quote_number
+from quote_pdf import build_pdf_payload, payload_hash, get_quote_pdf, discard_cached_pdf
+from lead_export import stream_file
+from attachments import delete_attachments
+
+router = APIRouter()
+
+# Helper function to convert ObjectId to string
+def serialize_doc(doc):
+    """Convert MongoDB document to JSON-serializable format"""
+    if doc is None:
+        return None
+    if isinstance(doc, list):
+        return [serialize_doc(item) for item in doc]
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, (dict, list)):
+                result[key] = serialize_doc(value)
+            else:
+                result[key] = value
+
+        # Convert _id to id
+        if "_id" in result:
+            result["id"] = result.pop("_id")
+
+        return result
+    return doc
+
+def is_manager(current_user: dict) -> bool:
+    return current_user.get("role") in [models.UserRole.ADMIN.value, models.UserRole.MANAGER.value]
+
+async def get_accessible_lead(lead_id, current_user: dict) -> dict:
+    """Fetch a live lead, enforcing that agents only reach their own leads"""
+    if not ObjectId.is_valid(str(lead_id)):
+        raise HTTPException(status_code=400, detail="Invalid lead ID format")
+
+    collection = get_collection(Collections.MAIN_DATA)
+    lead = await collection.find_one({"_id": ObjectId(str(lead_id)), "deleted_at": {"$exists": False}}, {"assigned_agent_id": 1})
+
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+
+    # Check permissions
+    if not is_manager(current_user) and lead.get("assigned_agent_id") != current_user["_id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to access this lead")
+
+    return lead
+
+async def get_accessible_quote(quote_id: str, current_user: dict) -> dict:
+    if not ObjectId.is_valid(quote_id):
+        raise HTTPException(status_code=400, detail="Invalid quote ID format")
+
+    collection = get_collection(Collections.QUOTES)
+    quote = await collection.find_one({"_id": ObjectId(quote_id)})
+
+    if not quote:
+        raise HTTPException(status_code=404, detail="Quote not found")
+
+    await get_accessible_lead(quote["lead_id"], current_user)
+    return quote
+
+# Create quote
+@router.post("/", response_model=schemas.Quote, status_code=status.HTTP_201_CREATED)
+async def create_quote(
+    quote: schemas.QuoteCreate,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Create a quote for a lead; the quote number is assigned by the server"""
+
+    lead = await get_accessible_lead(quote.lead_id, current_user)
+
+    now = datetime.now(timezone.utc)
+    quote_data = quote.dict()
+    quote_data.update({
+        "lead_id": lead["_id"],
+        "quote_number": await next_quote_number(),
+        "is_active": True,
+        "is_accepted": False,
+        "created_by": current_user["_id"],
+        "created_at": now,
+        "updated_at": now
+    })
+
+    collection = get_collection(Collections.QUOTES)
+    result = await collection.insert_one(quote_data)
+
+    created = await collection.find_one({"_id": result.inserted_id})
+    return serialize_doc(created)
+
+# List a lead's quotes
+@router.get("/lead/{lead_id}")
+async def get_lead_quotes(
+    lead_id: str,
+    cursor: Optional[str] = Query(None, description="Continuation cursor from a previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    active_only: bool = False,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """List a lead's quotes newest first, with keyset paging"""
+
+    await get_accessible_lead(lead_id, current_user)
+
+    query_filter = {"lead_id": ObjectId(lead_id)}
+    if active_only:
+        query_filter["is_active"] = True
+
+    quotes, next_cursor = await fetch_page(get_collection(Collections.QUOTES), query_filter, limit, cursor)
+
+    return {"quotes": serialize_doc(quotes), "next_cursor": next_cursor}
+
+# List quotes written by an agent
+@router.get("/agent/{agent_id}")
+async def get_agent_quotes(
+    agent_id: str,
+    cursor: Optional[str] = Query(None, description="Continuation cursor from a previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    active_only: bool = False,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """List quotes created by an agent newest first, with keyset paging (agents: own quotes only)"""
+
+    if not ObjectId.is_valid(agent_id):
+        raise HTTPException(status_code=400, detail="Invalid agent ID format")
+    if not is_manager(current_user) and ObjectId(agent_id) != current_user["_id"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    query_filter = {"created_by": ObjectId(agent_id)}
+    if active_only:
+        query_filter["is_active"] = True
+
+    quotes, next_cursor = await fetch_page(get_collection(Collections.QUOTES), query_filter, limit, cursor)
+
+    return {"quotes": serialize_doc(quotes), "next_cursor": next_cursor}
+
+# Get single quote
+@router.get("/{quote_id}", response_model=schemas.Quote)
+async def get_quote(
+    quote_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get a specific quote"""
+
+    quote = await get_accessible_quote(quote_id, current_user)
+    return serialize_doc(quote)
+
+# Download the quote as a PDF
+@router.get("/{quote_id}/pdf")
+async def get_quote_pdf_document(
+    quote_id: str,
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Render (or reuse) the quote document; the ETag is the hash of its contents"""
+
+    quote = await get_accessible_quote(quote_id, current_user)
+    lead = await get_collection(Collections.MAIN_DATA).find_one({"_id": quote["lead_id"]})
+
+    payload = build_pdf_payload(quote, lead)
+    etag = f'"{payload_hash(payload)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    # Unchanged since the client's copy: no rendering and no disk I/O
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    path, digest = await get_quote_pdf(payload)
+
+    if quote.get("document_hash") != digest:
+        await get_collection(Collections.QUOTES).update_one(
+            {"_id": quote["_id"]},
+            {"$set": {"document_hash": digest, "quote_document_url": f"/api/quotes/{quote_id}/pdf"}}
+        )
+        discard_cached_pdf(quote.get("document_hash"))
+
+    headers["Content-Disposition"] = f'inline; filename="{quote["quote_number"]}.pdf"'
+    return StreamingResponse(stream_file(path, delete=False), media_type="application/pdf", headers=headers)
+
+# Update quote
+@router.put("/{quote_id}", response_model=schemas.Quote)
+async def update_quote(
+    quote_id: str,
+    quote_update: schemas.QuoteUpdate,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Update a quote"""
+
+    quote = await get_accessible_quote(quote_id, current_user)
+
+    update_data = quote_update.dict(exclude_unset=True)
+    now = datetime.now(timezone.utc)
+    update_data["updated_at"] = now
+    update_ops = {"$set": update_data}
+
+    # Moving the expiry into the future (or reactivating) revives an expired quote
+    expires_at = update_data.get("expires_at")
+    if expires_at is not None and expires_at.tzinfo is None:
+        expires_at = update_data["expires_at"] = expires_at.replace(tzinfo=timezone.utc)
+    if quote.get("expired_at") and (update_data.get("is_active") or (expires_at and expires_at > now)):
+        update_data.setdefault("is_active", True)
+        update_ops["$unset"] = {"expired_at": ""}
+
+    collection = get_collection(Collections.QUOTES)
+    updated = await collection.find_one_and_update(
+        {"_id": quote["_id"]}, update_ops, return_document=True
+    )
+
+    return serialize_doc(updated)
+
+# Delete quote
+@router.delete("/{quote_id}")
+async def delete_quote(
+    quote_id: str,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Delete a quote (manager+ only)"""
+
+    quote = await get_accessible_quote(quote_id, current_user)
+
+    await get_collection(Collections.QUOTES).delete_one({"_id": quote["_id"]})
+    await delete_attachments({"quote_id": quote["_id"]})
+
+    return {"message": "Quote deleted successfully"}
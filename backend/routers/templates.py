@@ -0,0 +1,162 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from datetime import datetime, timezone
+from bson import ObjectId
+from jinja2 import TemplateError
+
+from database import get_collection, Collections
+import models
+import schemas
+from auth_utils import require_role
+from email_templates import template_engine, compile_source, DEFAULT_TEMPLATES
+
+router = APIRouter()
+
+# Helper function to convert ObjectId to string
+def serialize_doc(doc):
+    """Convert MongoDB document to JSON-serializable format"""
+    if doc is None:
+        return None
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            else:
+                result[key] = value
+
+        # Convert _id to id
+        if "_id" in result:
+            result["id"] = result.pop("_id")
+
+        return result
+    return doc
+
+def validate_template(subject: Optional[str], body: Optional[str]):
+    """Reject templates that do not compile, before they are stored"""
+    try:
+        if subject is not None:
+            compile_source(subject)
+        if body is not None:
+            compile_source(body)
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=f"Template does not compile: {e}")
+
+# List email templates
+@router.get("/", response_model=List[schemas.EmailTemplate])
+async def get_templates(
+    include_inactive: bool = False,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """List stored email templates (manager+ only)"""
+
+    query_filter = {} if include_inactive else {"is_active": True}
+    collection = get_collection(Collections.EMAIL_TEMPLATES)
+    templates = await collection.find(query_filter).sort("name", 1).to_list(length=None)
+
+    return [serialize_doc(template) for template in templates]
+
+# Names of the built-in templates that stored templates can override
+@router.get("/defaults")
+async def get_default_templates(
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Built-in templates, overridden by an active stored template of the same name"""
+
+    return [{"name": name, **template} for name, template in DEFAULT_TEMPLATES.items()]
+
+# Create email template
+@router.post("/", response_model=schemas.EmailTemplate, status_code=status.HTTP_201_CREATED)
+async def create_template(
+    template: schemas.EmailTemplateCreate,
+    current_user: dict = Depends(require_role(models.UserRole.ADMIN))
+):
+    """Create an email template (admin only)"""
+
+    validate_template(template.subject, template.body)
+
+    collection = get_collection(Collections.EMAIL_TEMPLATES)
+    if await collection.find_one({"name": template.name, "is_active": True}):
+        raise HTTPException(status_code=400, detail="An active template with this name already exists")
+
+    now = datetime.now(timezone.utc)
+    template_data = template.dict()
+    template_data.update({"is_active": True, "version": 1, "created_at": now, "updated_at": now})
+    result = await collection.insert_one(template_data)
+
+    await template_engine.reload(template.name)
+
+    created = await collection.find_one({"_id": result.inserted_id})
+    return serialize_doc(created)
+
+# Update email template
+@router.put("/{template_id}", response_model=schemas.EmailTemplate)
+async def update_template(
+    template_id: str,
+    template_update: schemas.EmailTemplateUpdate,
+    current_user: dict = Depends(require_role(models.UserRole.ADMIN))
+):
+    """Update an email template; every edit bumps its version (admin only)"""
+
+    if not ObjectId.is_valid(template_id):
+        raise HTTPException(status_code=400, detail="Invalid template ID format")
+
+    update_data = template_update.dict(exclude_unset=True)
+    validate_template(update_data.get("subject"), update_data.get("body"))
+    update_data["updated_at"] = datetime.now(timezone.utc)
+
+    collection = get_collection(Collections.EMAIL_TEMPLATES)
+    template = await collection.find_one_and_update(
+        {"_id": ObjectId(template_id)},
+        {"$set": update_data, "$inc": {"version": 1}},
+        return_document=True
+    )
+
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    # Invalidate the compiled cache for this name
+    await template_engine.reload(template["name"])
+
+    return serialize_doc(template)
+
+# Delete email template
+@router.delete("/{template_id}")
+async def delete_template(
+    template_id: str,
+    current_user: dict = Depends(require_role(models.UserRole.ADMIN))
+):
+    """Delete an email template; built-in copy is used again if one exists (admin only)"""
+
+    if not ObjectId.is_valid(template_id):
+        raise HTTPException(status_code=400, detail="Invalid template ID format")
+
+    collection = get_collection(Collections.EMAIL_TEMPLATES)
+    template = await collection.find_one_and_delete({"_id": ObjectId(template_id)})
+
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    await template_engine.reload(template["name"])
+
+    return {"message": "Template deleted successfully"}
+
+# Preview a template with sample data
+@router.post("/{name}/preview")
+async def preview_template(
+    name: str,
+    preview: schemas.EmailTemplatePreview,
+    current_user: dict = Depends(require_role(models.UserRole.MANAGER))
+):
+    """Render the template currently in force for a name"""
+
+    try:
+        rendered = template_engine.render(name, preview.context)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Template not found")
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=f"Template failed to render: {e}")
+
+    return {"subject": rendered.subject, "body": rendered.body, "is_html": rendered.is_html}
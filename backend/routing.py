@@ -0,0 +1,228 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from database import get_collection, Collections
+import models
+from settings_service import get_lead_routing_strategy, get_max_leads_per_agent, get_lead_routing_rules
+
+# Seconds between re-seeding the in-memory counts (and each agent's stored
+# `open_leads`) from the database. Counts are incremented on every assignment;
+# the re-seed absorbs changes made elsewhere (closed leads, manual reassignments).
+ROUTING_REFRESH_SECONDS = 300
+
+# Seconds a reserved slot may take to show up as an inserted lead. The re-seed
+# only lowers an agent's stored `open_leads` once their last reservation is
+# older than this, so slots reserved by other processes are not discarded.
+ROUTING_RESERVATION_GRACE_SECONDS = 60
+
+# Statuses that no longer count towards an agent's open workload
+CLOSED_STATUSES = [models.LeadStatus.CLOSED_WON.value, models.LeadStatus.CLOSED_LOST.value]
+
+# Lead flags that make up the line-of-business rules
+LINE_FIELDS = ["personal_lines", "commercial_lines", "life_and_health"]
+
+
+def _rule_matches(rule: dict, lead: dict) -> bool:
+    """A rule matches when the lead's state and any line of business fit.
+
+    Rules come from the `lead_routing_rules` setting, e.g.
+    `[{"states": ["CA", "NV"], "lines": ["commercial_lines"], "agent_ids": ["..."]}]`;
+    omitted conditions match everything. When every agent in the pool is at
+    capacity the lead overflows to the general pool unless `"overflow": false`.
+    """
+    states = rule.get("states")
+    if states and str(lead.get("state") or "").upper() not in {str(state).upper() for state in states}:
+        return False
+    lines = rule.get("lines")
+    if lines and not any(lead.get(line) for line in lines if line in LINE_FIELDS):
+        return False
+    return True
+
+
+class LeadRouter:
+    """Picks an owner for new leads from in-memory workload counts.
+
+    Holds the active agents and their open-lead counts in memory. Round-robin
+    rotates a deque; least-open-leads pops a lazily invalidated min-heap.
+    Both are O(1)/O(log n) per lead. The in-memory counts are only a hint
+    shared by this process: when a lead cap is set, the chosen agent's slot
+    is reserved with a conditional `$inc` on `open_leads` in their user
+    document, so API processes routing at the same time never push an agent
+    past the cap. Without a cap no round trip is made.
+    """
+
+    def __init__(self):
+        self._counts: Dict[ObjectId, int] = {}
+        self._ring: deque = deque()
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+        self._rule_cursors: Dict[int, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Force a re-seed on the next routing call (e.g. after deactivating a user)"""
+        self._loaded_at = None
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= ROUTING_REFRESH_SECONDS
+
+    async def _refresh(self):
+        async with self._lock:
+            if not self._stale():
+                return
+            users_collection = get_collection(Collections.USERS)
+            leads_collection = get_collection(Collections.MAIN_DATA)
+
+            agents = await users_collection.find(
+                {"role": models.UserRole.AGENT.value, "is_active": True},
+                {"_id": 1}
+            ).sort("_id", 1).to_list(length=None)
+            counts = {agent["_id"]: 0 for agent in agents}
+
+            pipeline = [
+                {"$match": {
+                    "assigned_agent_id": {"$in": list(counts)},
+                    "status": {"$nin": CLOSED_STATUSES},
+                    "deleted_at": {"$exists": False}
+                }},
+                {"$group": {"_id": "$assigned_agent_id", "count": {"$sum": 1}}}
+            ]
+            async for row in leads_collection.aggregate(pipeline):
+                counts[row["_id"]] = row["count"]
+
+            # Re-seed the stored counters that slot reservations are checked against.
+            # Raising a counter is always safe; lowering it to the aggregate is
+            # only done when no reservation is recent enough to still be pending.
+            if counts:
+                settled = datetime.utcnow() - timedelta(seconds=ROUTING_RESERVATION_GRACE_SECONDS)
+                operations = []
+                for agent_id, count in counts.items():
+                    operations.append(UpdateOne({"_id": agent_id}, {"$max": {"open_leads": count}}))
+                    operations.append(UpdateOne(
+                        {"_id": agent_id, "$or": [
+                            {"open_leads_reserved_at": {"$lt": settled}},
+                            {"open_leads_reserved_at": {"$exists": False}}
+                        ]},
+                        {"$set": {"open_leads": count}}
+                    ))
+                await users_collection.bulk_write(operations, ordered=False)
+
+            # Keep the round-robin position across refreshes where possible
+            current = self._ring[0] if self._ring else None
+            ring = deque(counts)
+            if current in counts:
+                ring.rotate(-list(ring).index(current))
+
+            self._counts = counts
+            self._ring = ring
+            self._heap = [(count, next(self._sequence), agent_id) for agent_id, count in counts.items()]
+            heapq.heapify(self._heap)
+            self._loaded_at = time.monotonic()
+
+    def _assign(self, agent_id: ObjectId) -> ObjectId:
+        self._counts[agent_id] += 1
+        heapq.heappush(self._heap, (self._counts[agent_id], next(self._sequence), agent_id))
+        return agent_id
+
+    async def release(self, agent_id: Optional[ObjectId]):
+        """Give back a slot taken for a lead that was never written"""
+        if agent_id in self._counts and self._counts[agent_id] > 0:
+            self._counts[agent_id] -= 1
+            heapq.heappush(self._heap, (self._counts[agent_id], next(self._sequence), agent_id))
+        if agent_id is not None:
+            await get_collection(Collections.USERS).update_one(
+                {"_id": agent_id, "open_leads": {"$gt": 0}}, {"$inc": {"open_leads": -1}}
+            )
+
+    async def _reserve(self, agent_id: ObjectId, capacity: int) -> bool:
+        """Take one of the agent's slots in the database, unless they are already at the cap"""
+        result = await get_collection(Collections.USERS).update_one(
+            {"_id": agent_id, "open_leads": {"$lt": capacity}},
+            {"$inc": {"open_leads": 1}, "$set": {"open_leads_reserved_at": datetime.utcnow()}}
+        )
+        return result.modified_count == 1
+
+    def _mark_full(self, agent_id: ObjectId, capacity: int):
+        self._counts[agent_id] = capacity
+        heapq.heappush(self._heap, (capacity, next(self._sequence), agent_id))
+
+    def _least_open(self, capacity: Optional[int]) -> Optional[ObjectId]:
+        while self._heap:
+            count, _, agent_id = self._heap[0]
+            # Skip entries made stale by a later increment or a refresh
+            if self._counts.get(agent_id) != count:
+                heapq.heappop(self._heap)
+                continue
+            if capacity and count >= capacity:
+                return None
+            heapq.heappop(self._heap)
+            return self._assign(agent_id)
+        return None
+
+    def _round_robin(self, capacity: Optional[int]) -> Optional[ObjectId]:
+        for _ in range(len(self._ring)):
+            agent_id = self._ring[0]
+            self._ring.rotate(-1)
+            if not capacity or self._counts[agent_id] < capacity:
+                return self._assign(agent_id)
+        return None
+
+    def _from_pool(self, rule_index: int, pool: List[ObjectId], strategy: str, capacity: Optional[int]) -> Optional[ObjectId]:
+        """Pick within a rule's (small) agent pool"""
+        available = [agent_id for agent_id in pool if not capacity or self._counts[agent_id] < capacity]
+        if not available:
+            return None
+        if strategy == models.RoutingStrategy.LEAST_OPEN_LEADS.value:
+            return self._assign(min(available, key=lambda agent_id: self._counts[agent_id]))
+        position = self._rule_cursors.get(rule_index, 0)
+        self._rule_cursors[rule_index] = position + 1
+        return self._assign(available[position % len(available)])
+
+    async def route(self, lead: dict) -> Optional[ObjectId]:
+        """Choose the agent for a new lead document, or None if nobody has capacity"""
+        if self._stale():
+            await self._refresh()
+        if not self._counts:
+            return None
+
+        strategy = get_lead_routing_strategy()
+        capacity = get_max_leads_per_agent()
+
+        while True:
+            agent_id = self._pick(lead, strategy, capacity)
+            if agent_id is None or not capacity or await self._reserve(agent_id, capacity):
+                return agent_id
+            # Another process filled the agent's last slot; treat them as full until the next refresh
+            self._mark_full(agent_id, capacity)
+
+    def _pick(self, lead: dict, strategy: str, capacity: Optional[int]) -> Optional[ObjectId]:
+        # The first matching rule with an active agent decides the pool
+        for index, rule in enumerate(get_lead_routing_rules()):
+            if not _rule_matches(rule, lead):
+                continue
+            pool = [
+                ObjectId(agent_id) for agent_id in rule.get("agent_ids", [])
+                if ObjectId.is_valid(agent_id) and ObjectId(agent_id) in self._counts
+            ]
+            if pool:
+                agent_id = self._from_pool(index, pool, strategy, capacity)
+                if agent_id or not rule.get("overflow", True):
+                    return agent_id
+                break
+
+        if strategy == models.RoutingStrategy.LEAST_OPEN_LEADS.value:
+            return self._least_open(capacity)
+        return self._round_robin(capacity)
+
+
+# Process-wide router used at intake
+lead_router = LeadRouter()
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from models import LeadStatus, LeadSource, ActivityType, UserRole, PyObjectId
+from models import LeadStatus, LeadSource, ActivityType, UserRole, BulkLeadOperation, PyObjectId
 
 # Base schemas
 class BaseSchema(BaseModel):
@@ -104,6 +104,11 @@ class Lead(LeadBase):
 class LeadWithActivities(Lead):
     activities: List['Activity'] = []
     quotes: List['Quote'] = []
+    activities_total: int = 0
+    quotes_total: int = 0
+    activities_next_cursor: Optional[str] = None
+    quotes_next_cursor: Optional[str] = None
+    attachments: List[Dict[str, Any]] = []
 
 # Activity schemas
 class ActivityBase(BaseSchema):
@@ -236,19 +241,65 @@ class LeadListResponse(BaseSchema):
     per_page: int
     total_pages: int
 
+# Bulk lead operation schemas
+class BulkLeadFilter(BaseSchema):
+    status: Optional[LeadStatus] = None
+    source: Optional[LeadSource] = None
+    assigned_agent_id: Optional[str] = None
+    priority: Optional[int] = None
+    search: Optional[str] = None
+
+class BulkLeadRequest(BaseSchema):
+    operation: BulkLeadOperation
+    lead_ids: Optional[List[str]] = None
+    filter: Optional[BulkLeadFilter] = None
+    status: Optional[LeadStatus] = None
+    assigned_agent_id: Optional[str] = None
+    priority: Optional[int] = None
+    next_follow_up_date: Optional[datetime] = None
+    activity: Optional[ActivityBase] = None
+
+class BulkLeadItemResult(BaseSchema):
+    id: str
+    result: str  # updated, unchanged, not_found, invalid_id or failed
+    error: Optional[str] = None
+
+class BulkLeadResponse(BaseSchema):
+    operation: BulkLeadOperation
+    matched: int
+    updated: int
+    unchanged: int
+    failed: int
+    results: List[BulkLeadItemResult]
+
+class LeadMergeRequest(BaseSchema):
+    duplicate_ids: List[str]
+
 # Email template schemas
 class EmailTemplateBase(BaseSchema):
     name: str
     subject: str
     body: str
     template_type: str
+    is_html: bool = False
 
 class EmailTemplateCreate(EmailTemplateBase):
     pass
 
+class EmailTemplateUpdate(BaseSchema):
+    subject: Optional[str] = None
+    body: Optional[str] = None
+    template_type: Optional[str] = None
+    is_html: Optional[bool] = None
+    is_active: Optional[bool] = None
+
+class EmailTemplatePreview(BaseSchema):
+    context: Dict[str, Any] = {}
+
 class EmailTemplate(EmailTemplateBase):
     id: Optional[PyObjectId] = None
     is_active: bool
+    version: int = 1
     created_at: datetime
     updated_at: datetime
     
@@ -258,6 +309,17 @@ class EmailTemplate(EmailTemplateBase):
         "json_encoders": {PyObjectId: str}
     }
 
+# Campaign schemas
+class CampaignSegment(BulkLeadFilter):
+    state: Optional[str] = None
+    # Any of personal_lines, commercial_lines, life_and_health
+    lines: Optional[List[str]] = None
+
+class CampaignCreate(BaseSchema):
+    name: str
+    template_name: str
+    segment: CampaignSegment = CampaignSegment()
+
 # Forward references for relationships
 LeadWithActivities.model_rebuild()
 Activity.model_rebuild()
\ No newline at end of file
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import get_collection, Collections
+import models
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reloads when change streams are unavailable (standalone mongod)
+SETTINGS_POLL_SECONDS = 60
+
+# Default win probabilities for open pipeline stages
+DEFAULT_FORECAST_PROBABILITIES = {
+    "new": 0.1,
+    "contacted": 0.2,
+    "qualified": 0.5,
+    "proposal_sent": 0.8
+}
+
+# Statuses that still need a follow-up
+DEFAULT_FOLLOW_UP_STATUSES = ["new", "contacted", "qualified", "follow_up"]
+
+# Days ahead the dashboard looks for upcoming follow-ups
+DEFAULT_UPCOMING_FOLLOW_UP_DAYS = 7
+
+# Change streams need a replica set; this is the error code a standalone returns
+_CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+def parse_setting_value(raw: Optional[str]) -> Any:
+    """Settings are stored as strings; decode JSON values when possible"""
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return raw
+
+
+class SettingsSnapshot:
+    """One consistent, read-only view of the settings collection"""
+
+    __slots__ = ("values", "loaded_at")
+
+    def __init__(self, values: Dict[str, Any], loaded_at: Optional[datetime] = None):
+        self.values: Mapping[str, Any] = MappingProxyType(dict(values))
+        self.loaded_at = loaded_at
+
+
+class SettingsService:
+    """Settings held in memory as an immutable snapshot.
+
+    The whole collection is read at startup and whenever it changes; a reload
+    builds a new snapshot and swaps the reference, so lookups are plain dict
+    reads with no I/O and never see a half-applied update. Changes arrive
+    through a change stream on a replica set, or by polling every
+    SETTINGS_POLL_SECONDS on a standalone server.
+    """
+
+    def __init__(self):
+        self.snapshot = SettingsSnapshot({})
+        self.mode: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self) -> SettingsSnapshot:
+        collection = get_collection(Collections.SETTINGS)
+        values = {doc["key"]: parse_setting_value(doc.get("value")) async for doc in collection.find({}, {"key": 1, "value": 1})}
+        self.snapshot = SettingsSnapshot(values, datetime.now(timezone.utc))
+        return self.snapshot
+
+    async def _watch(self):
+        collection = get_collection(Collections.SETTINGS)
+        while True:
+            try:
+                async with collection.watch() as stream:
+                    self.mode = "change_stream"
+                    # Reload after opening the stream so no change falls in between
+                    await self.load()
+                    async for _ in stream:
+                        await self.load()
+            except OperationFailure as e:
+                if e.code != _CHANGE_STREAMS_UNSUPPORTED:
+                    logger.error(f"Settings change stream failed: {e}")
+                await self._poll(forever=e.code == _CHANGE_STREAMS_UNSUPPORTED)
+            except PyMongoError as e:
+                logger.error(f"Settings change stream failed: {e}")
+                await self._poll(forever=False)
+
+    async def _poll(self, forever: bool):
+        self.mode = "polling"
+        while True:
+            await asyncio.sleep(SETTINGS_POLL_SECONDS)
+            try:
+                await self.load()
+            except PyMongoError as e:
+                logger.error(f"Settings reload failed: {e}")
+            if not forever:
+                return
+
+    async def start(self):
+        await self.load()
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # Typed accessors; a missing or malformed value falls back to the default
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.snapshot.values.get(key)
+        return default if value is None else value
+
+    def get_int(self, key: str, default: int) -> int:
+        try:
+            return int(self.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key: str, default: float) -> float:
+        try:
+            return float(self.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_list(self, key: str, default: list) -> list:
+        value = self.get(key, default)
+        return list(value) if isinstance(value, list) else list(default)
+
+    def get_dict(self, key: str, default: dict) -> dict:
+        value = self.get(key, default)
+        return dict(value) if isinstance(value, dict) else dict(default)
+
+
+# Process-wide settings; call settings.load() first in standalone scripts
+settings = SettingsService()
+
+
+def get_setting(key: str, default: Any = None) -> Any:
+    """Get a setting value from the in-memory snapshot"""
+    return settings.get(key, default)
+
+
+def get_forecast_probabilities() -> Dict[str, float]:
+    """Win probability per open status, overridable via `forecast_probabilities`"""
+    probabilities = dict(DEFAULT_FORECAST_PROBABILITIES)
+    for status, probability in settings.get_dict("forecast_probabilities", {}).items():
+        if status in probabilities:
+            try:
+                probabilities[status] = min(max(float(probability), 0.0), 1.0)
+            except (TypeError, ValueError):
+                pass
+    return probabilities
+
+
+def get_follow_up_statuses() -> List[str]:
+    """Lead statuses that still need a follow-up, via `follow_up_statuses`"""
+    valid = {status.value for status in models.LeadStatus}
+    statuses = [status for status in settings.get_list("follow_up_statuses", DEFAULT_FOLLOW_UP_STATUSES) if status in valid]
+    return statuses or list(DEFAULT_FOLLOW_UP_STATUSES)
+
+
+def get_upcoming_follow_up_days() -> int:
+    """Default dashboard look-ahead for follow-ups, via `upcoming_follow_up_days`"""
+    return max(settings.get_int("upcoming_follow_up_days", DEFAULT_UPCOMING_FOLLOW_UP_DAYS), 1)
+
+
+def get_max_leads_per_agent() -> Optional[int]:
+    """Open-lead cap per agent for routing, via `max_leads_per_agent` (0 or unset = no cap)"""
+    return settings.get_int("max_leads_per_agent", 0) or None
+
+
+def get_lead_routing_strategy() -> str:
+    strategy = settings.get("lead_routing_strategy", models.RoutingStrategy.ROUND_ROBIN.value)
+    valid = {choice.value for choice in models.RoutingStrategy}
+    return strategy if strategy in valid else models.RoutingStrategy.ROUND_ROBIN.value
+
+
+def get_lead_routing_rules() -> List[dict]:
+    return [rule for rule in settings.get_list("lead_routing_rules", []) if isinstance(rule, dict)]
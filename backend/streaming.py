@@ -0,0 +1,35 @@
+import json
+from typing import Callable
+
+from fastapi.responses import StreamingResponse
+
+# Documents fetched per round trip and written per chunk when streaming
+STREAM_BATCH_SIZE = 500
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def ndjson_response(cursor, serializer: Callable, batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse:
+    """Stream a Motor cursor as newline-delimited JSON.
+
+    Documents are serialized and written as they arrive, one cursor batch at a
+    time, so worker memory stays bounded by the batch size no matter how many
+    documents match.
+    """
+    cursor = cursor.batch_size(batch_size)
+
+    async def generate():
+        lines = []
+        try:
+            async for doc in cursor:
+                lines.append(json.dumps(serializer(doc), default=str))
+                if len(lines) >= batch_size:
+                    yield "\n".join(lines) + "\n"
+                    lines = []
+            if lines:
+                yield "\n".join(lines) + "\n"
+        finally:
+            # Release the server-side cursor if the client disconnects early
+            await cursor.close()
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
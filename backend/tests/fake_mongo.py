@@ -0,0 +1,350 @@
+"""In-memory stand-in for the Motor collection methods the tests exercise.
+
+Supports the query operators, update operators and aggregation stages the
+backend actually uses in the code under test; anything else raises so a
+test never passes against a silently ignored operator.
+"""
+import copy
+import math
+from datetime import datetime
+from types import SimpleNamespace
+
+from pymongo import ReturnDocument
+
+_MISSING = object()
+
+
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, list):
+            # A path through an array resolves to the values of its elements
+            return [element[part] for element in value if isinstance(element, dict) and part in element]
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _compare(value, operator, operand):
+    if operator == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if value is _MISSING:
+        value = None
+    if isinstance(value, list) and operator in ("$eq", "$in"):
+        # Array fields match when any element does
+        return value == operand or any(_compare(element, operator, operand) for element in value)
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None or operand is None:
+        return False
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    raise NotImplementedError(operator)
+
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            value = _get(doc, key)
+            if not all(_compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif not _compare(_get(doc, key), "$eq", condition):
+            return False
+    return True
+
+
+def apply_update(doc, update):
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            *parents, leaf = path.split(".")
+            target = doc
+            for part in parents:
+                target = target.setdefault(part, {})
+            if operator == "$set":
+                target[leaf] = value
+            elif operator == "$unset":
+                target.pop(leaf, None)
+            elif operator == "$inc":
+                target[leaf] = target.get(leaf, 0) + value
+            elif operator == "$max":
+                target[leaf] = value if target.get(leaf) is None else max(target[leaf], value)
+            else:
+                raise NotImplementedError(operator)
+
+
+def _evaluate(doc, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict):
+        (operator, args), = expression.items()
+        if operator == "$eq":
+            return _evaluate(doc, args[0]) == _evaluate(doc, args[1])
+        if operator == "$cond":
+            return _evaluate(doc, args[1] if _evaluate(doc, args[0]) else args[2])
+        if operator == "$ifNull":
+            value = _evaluate(doc, args[0])
+            return _evaluate(doc, args[1]) if value is None else value
+        if operator == "$dateTrunc" and args["unit"] == "day":
+            value = _evaluate(doc, args["date"])
+            return value.replace(hour=0, minute=0, second=0, microsecond=0) if value is not None else None
+        if operator == "$first":
+            values = _evaluate(doc, args)
+            return values[0] if values else None
+        if operator in ("$subtract", "$divide"):
+            left, right = _evaluate(doc, args[0]), _evaluate(doc, args[1])
+            if left is None or right is None:
+                return None
+            if operator == "$divide":
+                return left / right
+            if isinstance(left, datetime):
+                # Date differences are milliseconds
+                return (left - right).total_seconds() * 1000
+            return left - right
+        raise NotImplementedError(operator)
+    return expression
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p * len(ordered)) - 1, 0)] if ordered else None
+
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = _evaluate(doc, spec["_id"])
+        groups.setdefault(key, []).append(doc)
+    results = []
+    for key, members in groups.items():
+        row = {"_id": key}
+        for name, accumulator in spec.items():
+            if name == "_id":
+                continue
+            (operator, expression), = accumulator.items()
+            if operator == "$percentile":
+                expression = expression["input"]
+            values = [_evaluate(doc, expression) for doc in members]
+            numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+            if operator == "$sum":
+                row[name] = sum(numbers)
+            elif operator == "$avg":
+                row[name] = sum(numbers) / len(numbers) if numbers else None
+            elif operator == "$min":
+                row[name] = min(numbers) if numbers else None
+            elif operator == "$max":
+                row[name] = max(numbers) if numbers else None
+            elif operator == "$percentile":
+                row[name] = [_percentile(numbers, p) for p in accumulator[operator]["p"]]
+            else:
+                raise NotImplementedError(operator)
+        results.append(row)
+    return results
+
+
+def _project(doc, spec):
+    projected = {} if spec.get("_id", 1) == 0 else {"_id": doc.get("_id")}
+    for name, expression in spec.items():
+        if name == "_id":
+            continue
+        if expression in (1, True):
+            value = _get(doc, name)
+            if value is not _MISSING:
+                projected[name] = value
+        else:
+            projected[name] = _evaluate(doc, expression)
+    return projected
+
+
+def _shift_window(docs, spec):
+    partitions = {}
+    for doc in docs:
+        partitions.setdefault(repr(_evaluate(doc, spec["partitionBy"])), []).append(doc)
+    (sort_key, direction), = spec["sortBy"].items()
+    results = []
+    for members in partitions.values():
+        members.sort(key=lambda doc: _get(doc, sort_key), reverse=direction == -1)
+        for index, doc in enumerate(members):
+            for name, window in spec["output"].items():
+                shift = window["$shift"]
+                target = index + shift["by"]
+                in_range = 0 <= target < len(members)
+                doc[name] = _evaluate(members[target], shift["output"]) if in_range else shift.get("default")
+        results.extend(members)
+    return results
+
+
+def run_pipeline(docs, pipeline, database=None):
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$project":
+            docs = [_project(doc, spec) for doc in docs]
+        elif name == "$sort":
+            for field, direction in reversed(list(spec.items())):
+                docs.sort(key=lambda doc: _get(doc, field), reverse=direction == -1)
+        elif name == "$setWindowFields":
+            docs = _shift_window(docs, spec)
+        elif name == "$lookup":
+            foreign = database[spec["from"]].docs
+            for doc in docs:
+                joined = [copy.deepcopy(other) for other in foreign
+                          if _get(other, spec["foreignField"]) == _get(doc, spec["localField"])]
+                doc[spec["as"]] = run_pipeline(joined, spec.get("pipeline", []), database)
+        else:
+            raise NotImplementedError(name)
+    return docs
+
+
+class FakeDatabase(dict):
+    """Collections by name, created empty on first use"""
+
+    def __missing__(self, name):
+        self[name] = FakeCollection(database=self)
+        return self[name]
+
+    def get_collection(self, name):
+        return self[name]
+
+
+class FakeCursor:
+    def __init__(self, docs, batches=None):
+        self._docs = docs
+        self._batches = batches
+        self.closed = False
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        # Stable sorts applied from the last key back give a compound order
+        for field, field_direction in reversed(keys):
+            self._docs.sort(key=lambda doc: _get(doc, field), reverse=field_direction == -1)
+        return self
+
+    def limit(self, count):
+        self._docs = self._docs[:count]
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length=None):
+        return self._docs[:length] if length else list(self._docs)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._docs:
+            yield doc
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    def __init__(self, docs=(), database=None):
+        self.docs = [copy.deepcopy(doc) for doc in docs]
+        self.database = database
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([copy.deepcopy(doc) for doc in self.docs if matches(doc, query or {})])
+
+    async def find_one(self, query=None, projection=None):
+        for doc in self.docs:
+            if matches(doc, query or {}):
+                return copy.deepcopy(doc)
+        return None
+
+    async def count_documents(self, query):
+        return sum(1 for doc in self.docs if matches(doc, query))
+
+    async def insert_one(self, doc):
+        self.docs.append(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc.get("_id"))
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(copy.deepcopy(doc) for doc in docs)
+        return SimpleNamespace(inserted_ids=[doc.get("_id") for doc in docs])
+
+    def _update_one(self, query, update, upsert):
+        """Apply an update to the first match, or insert it; returns the upserted id"""
+        changes = {key: value for key, value in update.items() if key != "$setOnInsert"}
+        for doc in self.docs:
+            if matches(doc, query):
+                apply_update(doc, changes)
+                return None
+        if not upsert:
+            return None
+        doc = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+        apply_update(doc, {"$set": update.get("$setOnInsert", {})})
+        apply_update(doc, changes)
+        self.docs.append(doc)
+        return doc.get("_id")
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted_ids = {}
+        for index, operation in enumerate(operations):
+            before = len(self.docs)
+            upserted_id = self._update_one(operation._filter, operation._doc, operation._upsert)
+            if len(self.docs) > before:
+                upserted_ids[index] = upserted_id
+        return SimpleNamespace(upserted_ids=upserted_ids)
+
+    async def update_one(self, query, update, upsert=False):
+        matched = await self.count_documents(query) > 0
+        self._update_one(query, update, upsert)
+        return SimpleNamespace(matched_count=int(matched), modified_count=int(matched))
+
+    async def update_many(self, query, update):
+        modified = 0
+        for doc in self.docs:
+            if matches(doc, query):
+                apply_update(doc, update)
+                modified += 1
+        return SimpleNamespace(matched_count=modified, modified_count=modified)
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=ReturnDocument.BEFORE):
+        for doc in self.docs:
+            if matches(doc, query):
+                before = copy.deepcopy(doc)
+                apply_update(doc, update)
+                return copy.deepcopy(doc) if return_document == ReturnDocument.AFTER else before
+        return None
+
+    async def find_one_and_delete(self, query, projection=None):
+        for index, doc in enumerate(self.docs):
+            if matches(doc, query):
+                return self.docs.pop(index)
+        return None
+
+    async def delete_one(self, query):
+        for index, doc in enumerate(self.docs):
+            if matches(doc, query):
+                del self.docs[index]
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    def aggregate(self, pipeline):
+        return FakeCursor(run_pipeline([copy.deepcopy(doc) for doc in self.docs], pipeline, self.database))
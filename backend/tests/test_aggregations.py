@@ -0,0 +1,51 @@
+import asyncio
+
+from bson import ObjectId
+
+import models
+from aggregations import group_by_dimension, grand_total, status_equals
+from fake_mongo import FakeCollection
+
+SOURCES = [source.value for source in models.LeadSource]
+
+
+def leads():
+    docs = []
+    for index, source in enumerate(["website", "website", "referral", "legacy_partner", None]):
+        lead = {"_id": ObjectId(), "status": "qualified" if index % 2 else "new", "estimated_value": 100 * index}
+        if source is not None:
+            lead["source"] = source
+        docs.append(lead)
+    docs.append({"_id": ObjectId(), "source": "website", "status": "new", "deleted_at": "2024-01-01"})
+    return docs
+
+
+def test_group_by_dimension_matches_count_documents_per_value():
+    collection = FakeCollection(leads())
+    match = {"deleted_at": {"$exists": False}}
+
+    groups = asyncio.run(group_by_dimension(
+        collection, match, "source", buckets=SOURCES,
+        counts={"qualified": status_equals("qualified")}, sums={"value": "estimated_value"}
+    ))
+
+    for source in SOURCES:
+        expected = asyncio.run(collection.count_documents({**match, "source": source}))
+        assert groups[source]["total"] == expected
+        qualified = asyncio.run(collection.count_documents({**match, "source": source, "status": "qualified"}))
+        assert groups[source]["qualified"] == qualified
+    # Leads without the field and values outside the buckets keep their own groups
+    assert groups[None]["total"] == asyncio.run(collection.count_documents({**match, "source": None}))
+    assert groups["legacy_partner"]["total"] == 1
+    assert grand_total(groups) == asyncio.run(collection.count_documents(match))
+
+
+def test_missing_buckets_are_zero_filled():
+    groups = asyncio.run(group_by_dimension(
+        FakeCollection(), {}, "source", buckets=SOURCES,
+        counts={"qualified": status_equals("qualified")}, sums={"value": "estimated_value"},
+        averages={"average_value": "estimated_value"}
+    ))
+
+    assert set(groups) == set(SOURCES)
+    assert all(group == {"total": 0, "qualified": 0, "value": 0, "average_value": None} for group in groups.values())
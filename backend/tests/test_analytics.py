@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+import models
+from activity_utils import build_status_change_activity
+from database import Collections
+from fake_mongo import FakeDatabase
+from routers import analytics
+
+ADMIN = {"_id": ObjectId(), "role": models.UserRole.ADMIN.value}
+
+
+def status_change(lead_id, from_status, to_status, at):
+    activity = build_status_change_activity(lead_id, ADMIN["_id"], from_status, to_status)
+    activity["created_at"] = at
+    return activity
+
+
+def velocity(monkeypatch, database):
+    monkeypatch.setattr(analytics, "get_collection", database.get_collection)
+    result = asyncio.run(analytics.get_pipeline_velocity(run_async=False, current_user=ADMIN))
+    return {row["stage"]: row for row in result["velocity_data"]}
+
+
+def test_first_transition_is_measured_from_lead_creation(monkeypatch):
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    lead_id = ObjectId()
+    database = FakeDatabase()
+    database[Collections.MAIN_DATA].docs.append({"_id": lead_id, "created_at": created})
+    database[Collections.ACTIVITIES].docs.extend([
+        status_change(lead_id, "new", "contacted", created + timedelta(hours=6)),
+        status_change(lead_id, "contacted", "qualified", created + timedelta(hours=30)),
+    ])
+
+    stages = velocity(monkeypatch, database)
+
+    assert stages["new"]["sample_size"] == 1
+    assert stages["new"]["average_time_hours"] == 6
+    assert stages["contacted"]["average_time_hours"] == 24
+
+
+def test_first_transition_of_purged_lead_is_skipped(monkeypatch):
+    database = FakeDatabase()
+    database[Collections.ACTIVITIES].docs.append(
+        status_change(ObjectId(), "new", "contacted", datetime(2024, 1, 1, tzinfo=timezone.utc))
+    )
+
+    assert velocity(monkeypatch, database)["new"]["sample_size"] == 0
@@ -0,0 +1,84 @@
+import asyncio
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo.errors import DuplicateKeyError
+import pytest
+
+import attachments
+from database import Collections
+from fake_mongo import FakeCollection, FakeDatabase
+
+FILES = f"{Collections.ATTACHMENT_FILES}.files"
+
+
+class UniqueHashFiles(FakeCollection):
+    """GridFS files collection enforcing the unique metadata.sha256 index"""
+
+    async def update_one(self, query, update, upsert=False):
+        sha256 = update.get("$set", {}).get("metadata.sha256")
+        if sha256 and any(doc.get("metadata", {}).get("sha256") == sha256 for doc in self.docs):
+            raise DuplicateKeyError("metadata.sha256")
+        return await super().update_one(query, update, upsert)
+
+
+class FakeBucket:
+    def __init__(self, files):
+        self.files = files
+
+    async def delete(self, file_id):
+        if (await self.files.delete_one({"_id": file_id})).deleted_count == 0:
+            raise NoFile(file_id)
+
+
+def setup(monkeypatch, files=()):
+    database = FakeDatabase()
+    database[FILES] = UniqueHashFiles(files, database=database)
+    monkeypatch.setattr(attachments, "get_collection", database.get_collection)
+    monkeypatch.setattr(attachments, "get_bucket", lambda: FakeBucket(database[FILES]))
+    return database
+
+
+def test_file_is_deleted_with_its_last_reference(monkeypatch):
+    file_id = ObjectId()
+    database = setup(monkeypatch, [{"_id": file_id, "metadata": {"sha256": "abc", "ref_count": 2}}])
+    first, second = ObjectId(), ObjectId()
+    database[Collections.ATTACHMENTS].docs.extend([{"_id": first, "file_id": file_id}, {"_id": second, "file_id": file_id}])
+
+    assert asyncio.run(attachments.delete_attachments({"_id": first})) == 1
+    assert database[FILES].docs[0]["metadata"]["ref_count"] == 1
+
+    assert asyncio.run(attachments.delete_attachments({"_id": second})) == 1
+    assert database[FILES].docs == []
+
+
+def test_upload_references_a_live_copy(monkeypatch):
+    stored, uploaded = ObjectId(), ObjectId()
+    database = setup(monkeypatch, [
+        {"_id": stored, "metadata": {"sha256": "abc", "ref_count": 1}},
+        {"_id": uploaded, "metadata": {}}
+    ])
+
+    assert asyncio.run(attachments._dedupe(uploaded, "abc")) == stored
+    assert [doc["_id"] for doc in database[FILES].docs] == [stored]
+    assert database[FILES].docs[0]["metadata"]["ref_count"] == 2
+
+
+def test_upload_never_reuses_a_copy_that_is_being_deleted(monkeypatch):
+    dying, uploaded = ObjectId(), ObjectId()
+    database = setup(monkeypatch, [
+        # Last reference already released; its deleter has not removed it yet
+        {"_id": dying, "metadata": {"sha256": "abc", "ref_count": 0}},
+        {"_id": uploaded, "metadata": {}}
+    ])
+
+    assert asyncio.run(attachments._dedupe(uploaded, "abc")) == uploaded
+    by_id = {doc["_id"]: doc for doc in database[FILES].docs}
+    assert by_id[uploaded]["metadata"] == {"sha256": "abc", "ref_count": 1}
+    assert "sha256" not in by_id[dying]["metadata"]
+
+
+def test_suffix_range_of_an_empty_file_is_unsatisfiable():
+    with pytest.raises(ValueError):
+        attachments.parse_range("bytes=-500", 0)
+    assert attachments.parse_range("bytes=-500", 100) == (0, 99)
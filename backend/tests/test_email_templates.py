@@ -0,0 +1,40 @@
+from email import message_from_string
+
+import pytest
+
+from email_templates import TemplateEngine, build_mime_message
+
+
+def test_crlf_in_subject_cannot_add_headers():
+    raw = build_mime_message("agent@example.com", "New Lead Assigned: Jo\r\nBcc: x@evil", "Hello")
+    message = message_from_string(raw)
+
+    assert message["Bcc"] is None
+    assert message["Subject"] == "New Lead Assigned: Jo Bcc: x@evil"
+    assert raw.count("\r\nBcc:") == 0
+
+
+def test_non_ascii_subject_with_line_break_is_encoded_on_one_header():
+    raw = build_mime_message("agent@example.com", "Nouveau prospect: Zoé\nBcc: x@evil", "Hello")
+
+    assert message_from_string(raw)["Bcc"] is None
+
+
+def test_crlf_in_recipient_is_rejected():
+    with pytest.raises(ValueError):
+        build_mime_message("agent@example.com\r\nBcc: x@evil", "Subject", "Hello")
+
+
+def test_html_template_escapes_inserted_values():
+    engine = TemplateEngine()
+    engine._store("promo", 1, "Hi {{ first_name }}", "<p>Hi {{ first_name }}</p>", True)
+    engine._store("plain", 1, "Hi {{ first_name }}", "Hi {{ first_name }}", False)
+    engine._active.update({"promo": 1, "plain": 1})
+    context = {"first_name": "<script>alert(1)</script>"}
+
+    html = engine.render("promo", context)
+    plain = engine.render("plain", context)
+
+    assert html.body == "<p>Hi &lt;script&gt;alert(1)&lt;/script&gt;</p>"
+    assert html.subject == "Hi <script>alert(1)</script>"
+    assert plain.body == "Hi <script>alert(1)</script>"
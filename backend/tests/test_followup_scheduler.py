@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+import followup_scheduler
+from database import Collections
+from fake_mongo import FakeDatabase
+
+NOW = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+
+
+def setup(monkeypatch, failing_agents):
+    database = FakeDatabase()
+    agents = [{"_id": ObjectId(), "email": f"agent{index}@example.com", "full_name": "Agent", "is_active": True}
+              for index in range(2)]
+    database[Collections.USERS].docs.extend(agents)
+    for offset, agent in enumerate(agents):
+        database[Collections.MAIN_DATA].docs.append({
+            "_id": ObjectId(), "first_name": "Lead", "email": "lead@example.com", "status": "contacted",
+            "assigned_agent_id": agent["_id"], "next_follow_up_date": NOW - timedelta(hours=2 - offset)
+        })
+    failing = {agents[index]["email"] for index in failing_agents}
+    monkeypatch.setattr(followup_scheduler, "get_collection", database.get_collection)
+    monkeypatch.setattr(followup_scheduler, "get_follow_up_statuses", lambda: ["contacted"])
+    monkeypatch.setattr(followup_scheduler, "send_follow_up_reminder", lambda email, *args: email not in failing)
+    return database
+
+
+def test_failed_digest_leaves_leads_unstamped_and_holds_the_mark(monkeypatch):
+    database = setup(monkeypatch, failing_agents=[0])
+
+    result = asyncio.run(followup_scheduler.sweep_follow_ups(NOW))
+
+    failed_lead, sent_lead = database[Collections.MAIN_DATA].docs
+    assert "follow_up_reminded_for" not in failed_lead
+    assert sent_lead["follow_up_reminded_for"] == sent_lead["next_follow_up_date"]
+    assert result["emails_failed"] == 1
+    state = database[Collections.SCHEDULER_STATE].docs[0]
+    assert state["high_water_mark"] < failed_lead["next_follow_up_date"]
+
+
+def test_retry_sends_only_the_failed_lead(monkeypatch):
+    database = setup(monkeypatch, failing_agents=[0])
+    asyncio.run(followup_scheduler.sweep_follow_ups(NOW))
+    database[Collections.SCHEDULER_STATE].docs[0]["last_run_at"] = NOW - timedelta(hours=1)
+    monkeypatch.setattr(followup_scheduler, "send_follow_up_reminder", lambda *args: True)
+
+    result = asyncio.run(followup_scheduler.sweep_follow_ups(NOW + timedelta(minutes=15)))
+
+    assert result["leads"] == 1
+    assert result["emails_sent"] == 1
+    assert database[Collections.SCHEDULER_STATE].docs[0]["high_water_mark"] == NOW + timedelta(minutes=15)
+
+
+def test_inactive_agent_leaves_leads_unstamped_and_holds_the_mark(monkeypatch):
+    database = setup(monkeypatch, failing_agents=[])
+    database[Collections.USERS].docs[0]["is_active"] = False
+
+    result = asyncio.run(followup_scheduler.sweep_follow_ups(NOW))
+
+    unsent_lead = database[Collections.MAIN_DATA].docs[0]
+    assert "follow_up_reminded_for" not in unsent_lead
+    assert unsent_lead["follow_up_attempts"] == 1
+    assert result["emails_sent"] == 1
+    state = database[Collections.SCHEDULER_STATE].docs[0]
+    assert state["high_water_mark"] < unsent_lead["next_follow_up_date"]
+
+
+def test_permanent_failure_stops_holding_the_mark(monkeypatch):
+    database = setup(monkeypatch, failing_agents=[0])
+    monkeypatch.setattr(followup_scheduler, "FOLLOW_UP_MAX_ATTEMPTS", 2)
+    state = database[Collections.SCHEDULER_STATE]
+
+    asyncio.run(followup_scheduler.sweep_follow_ups(NOW))
+    state.docs[0]["last_run_at"] = NOW - timedelta(hours=1)
+    result = asyncio.run(followup_scheduler.sweep_follow_ups(NOW + timedelta(minutes=15)))
+
+    failed_lead = database[Collections.MAIN_DATA].docs[0]
+    assert "follow_up_reminded_for" not in failed_lead
+    assert failed_lead["follow_up_attempts"] == 2
+    assert result["reminders_abandoned"] == 1
+    assert state.docs[0]["high_water_mark"] == NOW + timedelta(minutes=15)
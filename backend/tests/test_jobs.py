@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+import jobs
+import models
+from cascade import PURGE_LEAD_JOB
+from fake_mongo import FakeCollection
+
+
+def run_resume(monkeypatch, collection, worker_id):
+    started = []
+    monkeypatch.setattr(jobs, "get_collection", lambda name: collection)
+    monkeypatch.setattr(jobs, "_start", lambda job: started.append(job["_id"]))
+    monkeypatch.setattr(jobs, "WORKER_ID", worker_id)
+    asyncio.run(jobs.resume_jobs())
+    return started
+
+
+def running_job(lease_until):
+    job = {"_id": ObjectId(), "job_type": PURGE_LEAD_JOB, "status": models.JobStatus.RUNNING.value, "params": {}, "lease_owner": "gone"}
+    if lease_until is not None:
+        job["lease_until"] = lease_until
+    return job
+
+
+def test_job_with_a_live_lease_is_not_resumed(monkeypatch):
+    collection = FakeCollection([running_job(datetime.now(timezone.utc) + timedelta(minutes=1))])
+
+    assert run_resume(monkeypatch, collection, "worker-a") == []
+
+
+def test_orphaned_job_is_resumed_by_exactly_one_worker(monkeypatch):
+    job = running_job(datetime.now(timezone.utc) - timedelta(seconds=1))
+    collection = FakeCollection([job])
+
+    assert run_resume(monkeypatch, collection, "worker-a") == [job["_id"]]
+    assert run_resume(monkeypatch, collection, "worker-b") == []
+    assert collection.docs[0]["lease_owner"] == "worker-a"
+
+
+def test_job_released_on_shutdown_is_resumed_at_once(monkeypatch):
+    job = running_job(None)
+    collection = FakeCollection([job])
+
+    assert run_resume(monkeypatch, collection, "worker-a") == [job["_id"]]
@@ -0,0 +1,87 @@
+import asyncio
+import csv
+import io
+import os
+import threading
+
+from openpyxl import load_workbook
+
+import lead_export
+from fake_mongo import FakeCursor
+
+
+def test_xlsx_rows_are_appended_off_the_event_loop(monkeypatch):
+    loop_thread = threading.get_ident()
+    append_threads = set()
+    append_rows = lead_export._append_rows
+
+    def recording_append(worksheet, rows):
+        append_threads.add(threading.get_ident())
+        append_rows(worksheet, rows)
+
+    async def rows(query_filter, include_activities, xlsx=False):
+        for index in range(2500):
+            yield [index] + [""] * (len(lead_export.LEAD_EXPORT_FIELDS) - 1)
+
+    monkeypatch.setattr(lead_export, "iter_export_rows", rows)
+    monkeypatch.setattr(lead_export, "_append_rows", recording_append)
+
+    path = asyncio.run(lead_export.write_xlsx({}, False))
+    try:
+        sheet = load_workbook(path, read_only=True).worksheets[0]
+        values = [row[0] for row in sheet.iter_rows(values_only=True)]
+    finally:
+        os.remove(path)
+
+    assert values[0] == "_id"
+    assert values[1:] == list(range(2500))
+    assert append_threads and loop_thread not in append_threads
+
+
+HOSTILE_LEAD = {
+    "first_name": "=HYPERLINK(\"http://evil\",\"x\")",
+    "last_name": "+1+1",
+    "city": "-2",
+    "state": "@SUM(A1)",
+    "address_line1": "1 Main\x07 St\x1b",
+    "estimated_value": -500,
+}
+
+
+def export_from(monkeypatch, docs):
+    monkeypatch.setattr(lead_export, "_export_cursor", lambda query_filter, include_activities: FakeCursor(list(docs)))
+
+
+def column(field):
+    return lead_export.LEAD_EXPORT_FIELDS.index(field)
+
+
+def test_csv_export_neutralises_formulas(monkeypatch):
+    export_from(monkeypatch, [HOSTILE_LEAD])
+
+    async def read():
+        return "".join([chunk async for chunk in lead_export.stream_csv({}, False)])
+
+    row = next(csv.reader(io.StringIO(asyncio.run(read())).readlines()[1:]))
+
+    assert row[column("first_name")] == "'=HYPERLINK(\"http://evil\",\"x\")"
+    assert row[column("last_name")] == "'+1+1"
+    assert row[column("city")] == "'-2"
+    assert row[column("state")] == "'@SUM(A1)"
+    # Real numbers are left alone
+    assert row[column("estimated_value")] == "-500"
+
+
+def test_xlsx_export_neutralises_formulas_and_drops_control_characters(monkeypatch):
+    export_from(monkeypatch, [HOSTILE_LEAD])
+
+    path = asyncio.run(lead_export.write_xlsx({}, False))
+    try:
+        row = list(load_workbook(path, read_only=True).worksheets[0].iter_rows(values_only=True))[1]
+    finally:
+        os.remove(path)
+
+    assert row[column("first_name")] == "'=HYPERLINK(\"http://evil\",\"x\")"
+    assert row[column("state")] == "'@SUM(A1)"
+    assert row[column("address_line1")] == "1 Main St"
+    assert row[column("estimated_value")] == -500
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+import lead_import
+from dedupe import blocking_keys
+from fake_mongo import FakeCollection
+
+ROW = {
+    "firstName": "Ana", "lastName": "Silva", "email": "ana@example.com", "phoneNumber": "9165550100",
+    "addressLine1": "1 Main St", "city": "Sacramento", "state": "CA", "zipCode": "95814"
+}
+
+
+def run_import(monkeypatch, leads, rows):
+    activities = FakeCollection()
+    collections = {lead_import.Collections.MAIN_DATA: leads, lead_import.Collections.ACTIVITIES: activities}
+    monkeypatch.setattr(lead_import, "get_collection", lambda name: collections[name])
+    return asyncio.run(lead_import.import_leads(iter(rows), source_label="test.csv"))
+
+
+def stored_lead(email, **extra):
+    lead = {"_id": ObjectId(), "email": email, "last_name": "Silva", "zip_code": "95814", **extra}
+    lead["dedupe_keys"] = blocking_keys(lead)
+    return lead
+
+
+def test_import_updates_lead_stored_with_different_case(monkeypatch):
+    existing = stored_lead("Ana@Example.com")
+    leads = FakeCollection([existing])
+
+    report = run_import(monkeypatch, leads, [dict(ROW)])
+
+    assert (report["created"], report["updated"]) == (0, 1)
+    assert len(leads.docs) == 1
+    assert leads.docs[0]["_id"] == existing["_id"]
+
+
+def test_import_does_not_revive_soft_deleted_lead(monkeypatch):
+    deleted = stored_lead("ana@example.com", deleted_at=datetime.now(timezone.utc))
+    leads = FakeCollection([deleted])
+
+    report = run_import(monkeypatch, leads, [dict(ROW)])
+
+    assert (report["created"], report["updated"]) == (1, 0)
+    assert "first_name" not in leads.docs[0]
+    assert "deleted_at" not in leads.docs[1]
+
+
+def test_rows_differing_only_in_email_case_are_one_lead(monkeypatch):
+    report = run_import(monkeypatch, FakeCollection(), [dict(ROW), {**ROW, "email": "ANA@example.com"}])
+
+    assert report["duplicates_in_file"] == 1
+    assert report["created"] == 1
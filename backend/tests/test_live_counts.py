@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+import models
+from live_events import LiveEvents, ALL_SCOPE
+from routers.dashboard import lead_scope_filter
+
+
+def test_lead_scope_filter_excludes_soft_deleted_leads():
+    agent = {"_id": ObjectId(), "role": models.UserRole.AGENT.value}
+    manager = {"_id": ObjectId(), "role": models.UserRole.MANAGER.value}
+
+    assert lead_scope_filter(agent) == {"deleted_at": {"$exists": False}, "assigned_agent_id": agent["_id"]}
+    assert lead_scope_filter(manager) == {"deleted_at": {"$exists": False}}
+
+
+def test_delete_then_purge_subtracts_a_lead_once():
+    events = LiveEvents()
+    published = []
+    events.publish = published.append
+    lead = {"_id": ObjectId(), "status": "new", "estimated_value": 100, "created_at": datetime.now(timezone.utc)}
+
+    events.lead_changed("lead.deleted", lead, None, {})
+    events.lead_changed("lead.purged", lead, lead, {})
+
+    counters = [event for event in published if event["type"] == "counters"]
+    assert len(counters) == 1
+    assert counters[0]["deltas"][ALL_SCOPE]["total_leads"] == -1
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+import report_snapshots
+from database import Collections
+from fake_mongo import FakeDatabase
+
+NOW = datetime(2024, 3, 20, 12, tzinfo=timezone.utc)
+TODAY = datetime(2024, 3, 20, tzinfo=timezone.utc)
+
+
+def test_incremental_refresh_recomputes_days_of_changed_leads(monkeypatch):
+    database = FakeDatabase()
+    last_run = NOW - timedelta(minutes=15)
+    database[Collections.SCHEDULER_STATE].docs.append(
+        {"_id": report_snapshots.STATE_ID, "last_full_at": TODAY, "last_incremental_at": last_run}
+    )
+    database[Collections.MAIN_DATA].docs.extend([
+        # Created 20 days ago and closed since the last run
+        {"_id": ObjectId(), "created_at": NOW - timedelta(days=20), "updated_at": NOW - timedelta(minutes=5)},
+        # Created the day after, untouched since
+        {"_id": ObjectId(), "created_at": NOW - timedelta(days=19), "updated_at": NOW - timedelta(days=19)},
+        # Two consecutive changed days are recomputed as one range
+        {"_id": ObjectId(), "created_at": NOW - timedelta(days=10), "updated_at": NOW - timedelta(minutes=1)},
+        {"_id": ObjectId(), "created_at": NOW - timedelta(days=9), "updated_at": NOW - timedelta(minutes=1)},
+    ])
+    ranges = []
+
+    async def materialize(start, end):
+        ranges.append((start, end))
+        return {name: 0 for name in report_snapshots.SNAPSHOT_REPORTS}
+
+    monkeypatch.setattr(report_snapshots, "get_collection", database.get_collection)
+    monkeypatch.setattr(report_snapshots, "materialize", materialize)
+
+    result = asyncio.run(report_snapshots.refresh_snapshots(full=False, now=NOW))
+
+    assert result["changed_days"] == 3
+    assert ranges == [
+        (TODAY - timedelta(days=1), TODAY + timedelta(days=1)),
+        (TODAY - timedelta(days=20), TODAY - timedelta(days=19)),
+        (TODAY - timedelta(days=10), TODAY - timedelta(days=8)),
+    ]
+    assert database[Collections.SCHEDULER_STATE].docs[0]["last_incremental_at"] == NOW
@@ -0,0 +1,89 @@
+import asyncio
+
+from bson import ObjectId
+
+import models
+import routing
+from database import Collections
+from fake_mongo import FakeDatabase
+
+
+def setup(monkeypatch, agents, capacity):
+    database = FakeDatabase()
+    database[Collections.USERS].docs.extend(
+        {"_id": agent_id, "role": models.UserRole.AGENT.value, "is_active": True} for agent_id in agents
+    )
+    monkeypatch.setattr(routing, "get_collection", database.get_collection)
+    monkeypatch.setattr(routing, "get_lead_routing_strategy", lambda: models.RoutingStrategy.LEAST_OPEN_LEADS.value)
+    monkeypatch.setattr(routing, "get_max_leads_per_agent", lambda: capacity)
+    monkeypatch.setattr(routing, "get_lead_routing_rules", lambda: [])
+    return database
+
+
+def test_two_processes_cannot_both_fill_the_last_slot(monkeypatch):
+    agent_id = ObjectId()
+    database = setup(monkeypatch, [agent_id], capacity=1)
+    first, second = routing.LeadRouter(), routing.LeadRouter()
+
+    async def route_on_both():
+        # Both seed their hints while the agent is still empty
+        await first._refresh()
+        await second._refresh()
+        return await first.route({}), await second.route({})
+
+    assert asyncio.run(route_on_both()) == (agent_id, None)
+    assert database[Collections.USERS].docs[0]["open_leads"] == 1
+
+
+def test_full_agent_is_skipped_for_one_with_room(monkeypatch):
+    busy, free = ObjectId(), ObjectId()
+    database = setup(monkeypatch, [busy, free], capacity=2)
+    router = routing.LeadRouter()
+
+    async def route_after_other_process_fills_busy():
+        await router._refresh()
+        # Another process took both of busy's slots since the refresh
+        await database[Collections.USERS].update_one({"_id": busy}, {"$set": {"open_leads": 2}})
+        return [await router.route({}) for _ in range(3)]
+
+    assert asyncio.run(route_after_other_process_fills_busy()) == [free, free, None]
+
+
+def test_released_slot_can_be_reserved_again(monkeypatch):
+    agent_id = ObjectId()
+    database = setup(monkeypatch, [agent_id], capacity=1)
+    router = routing.LeadRouter()
+
+    async def route_release_route():
+        assigned = await router.route({})
+        await router.release(assigned)
+        return await router.route({})
+
+    assert asyncio.run(route_release_route()) == agent_id
+    assert database[Collections.USERS].docs[0]["open_leads"] == 1
+
+
+def test_refresh_keeps_slots_reserved_but_not_yet_inserted(monkeypatch):
+    agent_id = ObjectId()
+    database = setup(monkeypatch, [agent_id], capacity=2)
+    first, second = routing.LeadRouter(), routing.LeadRouter()
+
+    async def reserve_then_refresh_elsewhere():
+        # first reserves a slot; its lead is not inserted when second re-seeds
+        assert await first.route({}) == agent_id
+        await second._refresh()
+        return await second.route({}), await second.route({})
+
+    assert asyncio.run(reserve_then_refresh_elsewhere()) == (agent_id, None)
+    assert database[Collections.USERS].docs[0]["open_leads"] == 2
+
+
+def test_refresh_lowers_settled_counters_to_the_open_leads(monkeypatch):
+    agent_id = ObjectId()
+    database = setup(monkeypatch, [agent_id], capacity=2)
+    # Both leads were closed since their slots were reserved long ago
+    database[Collections.USERS].docs[0]["open_leads"] = 2
+    router = routing.LeadRouter()
+
+    assert asyncio.run(router.route({})) == agent_id
+    assert database[Collections.USERS].docs[0]["open_leads"] == 1
@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from streaming import ndjson_response
+
+
+class CountingCursor:
+    """Lazily produces `total` documents and records how many were read"""
+
+    def __init__(self, total):
+        self.total = total
+        self.read = 0
+        self.requested_batch_size = None
+        self.closed = False
+
+    def batch_size(self, size):
+        self.requested_batch_size = size
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.read >= self.total:
+            raise StopAsyncIteration
+        self.read += 1
+        return {"n": self.read}
+
+    async def close(self):
+        self.closed = True
+
+
+def test_stream_reads_one_batch_per_chunk_and_closes_on_disconnect():
+    cursor = CountingCursor(total=1_000_000)
+    response = ndjson_response(cursor, lambda doc: doc, batch_size=100)
+
+    async def read_two_chunks_then_disconnect():
+        body = response.body_iterator
+        chunks = [await body.__anext__(), await body.__anext__()]
+        await body.aclose()
+        return chunks
+
+    chunks = asyncio.run(read_two_chunks_then_disconnect())
+
+    assert cursor.requested_batch_size == 100
+    # Memory is bounded by the batch: two chunks out means two batches read
+    assert cursor.read == 200
+    assert [json.loads(line)["n"] for line in chunks[1].splitlines()] == list(range(101, 201))
+    assert cursor.closed
+
+
+def test_stream_writes_the_final_partial_batch():
+    cursor = CountingCursor(total=250)
+    response = ndjson_response(cursor, lambda doc: doc, batch_size=100)
+
+    async def read_all():
+        return [chunk async for chunk in response.body_iterator]
+
+    chunks = asyncio.run(read_all())
+
+    assert [len(chunk.splitlines()) for chunk in chunks] == [100, 100, 50]
+    assert cursor.closed